@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# On-disk caches (fonts index, sticker atlases, layers) go to a scratch
+# directory rather than the user's cache
+os.environ.setdefault('THUMBNAIL_CACHE_DIR', tempfile.mkdtemp(prefix='thumbnail-tests-'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,64 @@
+from PIL import Image, ImageChops, ImageEnhance
+import pytest
+
+from thumbnail_engine.adjustments import Adjustment, AdjustmentStack
+
+
+def photo():
+    base = Image.merge('RGB', [Image.linear_gradient('L'), Image.radial_gradient('L'),
+                               Image.linear_gradient('L').rotate(90)])
+    return base.resize((128, 128))
+
+
+def max_difference(a, b):
+    return max(high for _, high in ImageChops.difference(a, b).getextrema())
+
+
+def test_fused_stack_matches_enhancing_step_by_step():
+    image = photo()
+    stack = (AdjustmentStack().set('brightness', factor=1.2).set('contrast', factor=1.3)
+             .set('saturation', factor=0.6).set('gamma', value=1.4))
+    expected = ImageEnhance.Contrast(ImageEnhance.Brightness(image).enhance(1.2)).enhance(1.3)
+    expected = ImageEnhance.Color(expected).enhance(0.6)
+    expected = expected.point(lambda v: round(255 * (v / 255) ** (1 / 1.4)))
+    # The reference rounds to 8 bits after every step; the fused table only once
+    assert max_difference(stack.apply(image), expected) <= 4
+
+
+def test_levels_map_black_and_white_points():
+    ramp = Image.frombytes('L', (256, 1), bytes(range(256)))
+    out = AdjustmentStack().set('levels', black=50, white=200).apply(ramp)
+    assert out.getpixel((50, 0)) == 0 and out.getpixel((200, 0)) == 255
+    assert out.getpixel((125, 0)) in (127, 128)
+
+
+def test_identity_stack_is_empty_and_leaves_pixels():
+    image = photo()
+    stack = AdjustmentStack().set('brightness', factor=1.0).set('gamma')
+    assert not stack and stack == AdjustmentStack()
+    assert stack.apply(image).tobytes() == image.tobytes()
+
+
+def test_stacks_are_immutable_values():
+    stack = AdjustmentStack().set('contrast', factor=1.5)
+    edited = stack.set('contrast', factor=2.0).set('brightness', factor=0.8)
+    assert stack.get('contrast')['factor'] == 1.5
+    assert [adj.kind for adj in edited.adjustments] == ['contrast', 'brightness']
+    assert [adj.kind for adj in edited.move('brightness', 0).adjustments] == ['brightness', 'contrast']
+    assert edited.remove('contrast').get('contrast') is None
+    assert AdjustmentStack.from_list(edited.to_list()) == edited
+    assert hash(AdjustmentStack.from_list(edited.to_list())) == hash(edited)
+
+
+def test_order_matters():
+    image = photo()
+    a = AdjustmentStack().set('brightness', factor=1.5).set('contrast', factor=2.0)
+    b = a.move('contrast', 0)
+    assert a != b and a.apply(image).tobytes() != b.apply(image).tobytes()
+
+
+def test_invalid_adjustments():
+    with pytest.raises(ValueError):
+        Adjustment('sharpness', factor=2)
+    with pytest.raises(ValueError):
+        Adjustment('gamma', factor=2)
@@ -0,0 +1,47 @@
+from PIL import Image, ImageChops, ImageFilter
+import pytest
+
+from thumbnail_engine.blur import MIN_LEVEL_RADIUS, BlurPyramid, fast_blur, level_for_radius
+
+
+def photo(size=(480, 270)):
+    image = Image.new('RGB', size, '#000000')
+    image.paste('#FFFFFF', (size[0] // 3, size[1] // 3, 2 * size[0] // 3, 2 * size[1] // 3))
+    image.paste('#FF0000', (0, 0, size[0] // 6, size[1]))
+    return image
+
+
+def mean_difference(a, b):
+    histogram = ImageChops.difference(a, b).convert('L').histogram()
+    return sum(i * count for i, count in enumerate(histogram)) / (a.width * a.height)
+
+
+def test_small_radii_run_at_full_resolution():
+    assert level_for_radius(2) == (0, 2)
+    assert level_for_radius(MIN_LEVEL_RADIUS * 2) == (0, MIN_LEVEL_RADIUS * 2)
+
+
+def test_large_radii_use_a_reduced_level():
+    level, residual = level_for_radius(40)
+    assert level >= 2 and residual >= MIN_LEVEL_RADIUS
+    assert level_for_radius(10 ** 6)[0] == 5
+
+
+@pytest.mark.parametrize('radius', [8, 20, 45])
+def test_pyramid_blur_matches_gaussian_blur(radius):
+    image = photo()
+    reference = image.filter(ImageFilter.GaussianBlur(radius))
+    blurred = fast_blur(image, radius)
+    assert blurred.size == image.size
+    # A blur 25% too small is off by 1.8 to 8 levels on average here
+    assert mean_difference(blurred, reference) < 1.0
+
+
+def test_results_and_levels_are_reused():
+    pyramid = BlurPyramid(photo())
+    first = pyramid.blur(30)
+    assert pyramid.blur(30.04) is first
+    levels = len(pyramid.levels)
+    pyramid.blur(25)
+    assert len(pyramid.levels) == levels
+    assert pyramid.blur(0) is pyramid.image
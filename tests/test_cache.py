@@ -0,0 +1,73 @@
+import threading
+
+from PIL import Image
+
+from thumbnail_engine.cache import LRUCache, image_weight
+from thumbnail_engine.fonts import get_font
+from thumbnail_engine.text_effects import TextEffectsEngine, font_key
+
+
+def test_least_recently_used_entry_goes_first():
+    cache = LRUCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert cache.get('b', 'gone') == 'gone' and cache.misses == 1
+
+
+def test_weight_cap_keeps_the_newest_entry():
+    cache = LRUCache(max_entries=10, max_weight=100)
+    cache.put('a', 'A', 60)
+    cache.put('b', 'B', 30)
+    cache.put('c', 'C', 30)
+    assert list(cache._items) == ['b', 'c'] and cache.weight == 60
+    cache.put('huge', 'H', 500)
+    assert list(cache._items) == ['huge'] and cache.weight == 500
+
+
+def test_replacing_a_key_replaces_its_weight():
+    cache = LRUCache(max_weight=100)
+    cache.put('a', 1, 40)
+    cache.put('a', 2, 10)
+    assert cache.get('a') == 2 and cache.weight == 10 and len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0 and cache.weight == 0
+
+
+def test_get_or_create_builds_once():
+    cache = LRUCache()
+    calls = []
+    build = lambda: calls.append(1) or Image.new('RGBA', (10, 5))
+    first = cache.get_or_create('k', build, image_weight)
+    assert cache.get_or_create('k', build, image_weight) is first
+    assert len(calls) == 1 and cache.weight == 200
+
+
+def test_concurrent_puts_keep_the_weight_consistent():
+    cache = LRUCache(max_entries=50, max_weight=1000)
+
+    def worker(offset):
+        for i in range(500):
+            cache.put((offset, i % 80), i, 7)
+            cache.get((offset, (i * 7) % 80))
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) <= 50
+    assert cache.weight == 7 * len(cache) <= 1000
+
+
+def test_text_masks_are_reused_across_colors():
+    engine = TextEffectsEngine()
+    font = get_font('Arial', 48, bold=True)
+    red, _ = engine.render_tile((10, 10), "HELLO", font, fill='#FF0000', outline_width=4)
+    misses = engine.cache.misses
+    blue, _ = engine.render_tile((10, 10), "HELLO", font, fill='#0000FF', outline_width=4)
+    assert engine.cache.misses == misses and engine.cache.hits > 0
+    assert red.size == blue.size and red.tobytes() != blue.tobytes()
+    assert font_key(font) == font_key(get_font('Arial', 48, bold=True))
@@ -0,0 +1,84 @@
+from PIL import Image
+import pytest
+
+from thumbnail_engine import export
+from thumbnail_engine.export import (JPEG, PNG, WEBP, ExportEngine, ExportResult, export_image,
+                                     formats_for_path)
+
+
+@pytest.fixture(scope='module')
+def engine():
+    engine = ExportEngine()
+    yield engine
+    engine.close()
+
+
+def photo(size=(320, 180)):
+    noise = Image.effect_noise(size, 60).convert('RGB')
+    return Image.blend(Image.linear_gradient('L').resize(size).convert('RGB'), noise, 0.3)
+
+
+def test_everything_fits_a_large_budget(engine):
+    result = engine.export(photo(), 10 ** 7, (JPEG, PNG))
+    assert result.fits
+    # Lossless PNG beats any JPEG once both fit
+    assert (result.best.format, result.best.options) == (PNG, {'compress_level': 6})
+
+
+def test_quality_search_finds_the_highest_fitting_quality(engine):
+    image = photo()
+    sizes = {q: len(export.encode(image, JPEG, quality=q, optimize=True).data) for q in range(40, 96)}
+    budget = (sizes[60] + sizes[80]) // 2
+    result = engine.export(image, budget, (JPEG,))
+    quality = result.best.options['quality']
+    assert sizes[quality] <= budget < sizes[quality + 1]
+    # Interpolated, not a scan over every quality
+    assert len(result.candidates) < 8
+
+
+def test_png_falls_back_to_fewer_colors(engine):
+    image = photo()
+    lossless = len(export.encode(image, PNG).data)
+    result = engine.export(image, lossless // 3, (PNG,))
+    assert result.fits and 'colors' in result.best.options
+
+
+def test_nothing_fits_returns_the_smallest(engine):
+    result = engine.export(photo(), 100, (JPEG, PNG))
+    assert not result.fits
+    assert result.best.size == min(c.size for c in result.candidates)
+
+
+def test_formats_compete_on_psnr(engine):
+    result = engine.export(photo(), 40_000, (JPEG, PNG))
+    fitting = [c for c in result.candidates if c.psnr is not None]
+    assert len(fitting) == 2 and result.best.psnr == max(c.psnr for c in fitting)
+
+
+def test_export_image_names_and_writes(tmp_path):
+    result = export_image(photo(), str(tmp_path / 'thumb.jpg'))
+    assert result.path == str(tmp_path / 'thumb.jpg') and result.best.format == JPEG
+    with Image.open(result.path) as saved:
+        assert saved.format == JPEG and saved.size == (320, 180)
+    result = export_image(photo(), str(tmp_path / 'thumb'))
+    assert result.path == str(tmp_path / 'thumb') + result.best.extension
+
+
+def test_formats_for_path():
+    assert formats_for_path('a.JPEG') == (JPEG,)
+    assert formats_for_path('a.png') == (PNG,)
+    assert formats_for_path('a.thumb') == (JPEG, WEBP, PNG)
+
+
+def test_unsupported_format_is_an_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'available_formats', lambda formats: ())
+    with pytest.raises(ValueError, match="No supported format"):
+        export_image(photo(), str(tmp_path / 'thumb.webp'))
+    assert not list(tmp_path.iterdir())
+
+
+def test_save_refuses_an_empty_result(tmp_path):
+    result = ExportResult(None, [], 1000, 0.0)
+    assert not result.fits
+    with pytest.raises(ValueError):
+        result.save(str(tmp_path / 'thumb.jpg'))
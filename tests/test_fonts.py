@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+
+from PIL import ImageFont
+import pytest
+
+from thumbnail_engine import fonts
+from thumbnail_engine.fonts import FontRegistry, parse_style
+
+
+def installed_faces():
+    faces = {}
+    for path in fonts._walk_fonts(fonts.system_font_dirs()):
+        if path.lower().endswith(('.ttf', '.otf')):
+            try:
+                family, style = ImageFont.truetype(path, 12).getname()
+            except OSError:
+                continue
+            faces.setdefault(family, {})[parse_style(style)] = path
+    return faces
+
+
+def family_with_styles():
+    for family, styles in sorted(installed_faces().items()):
+        if (False, False) in styles and (True, False) in styles:
+            return family, styles
+    pytest.skip("needs an installed family with regular and bold faces")
+
+
+@pytest.fixture
+def registry(tmp_path):
+    family, styles = family_with_styles()
+    font_dir = tmp_path / 'fonts'
+    font_dir.mkdir()
+    for style in ((False, False), (True, False)):
+        shutil.copy(styles[style], font_dir)
+    return FontRegistry([str(font_dir)], index_path=str(tmp_path / 'index.json')), family
+
+
+def test_parse_style():
+    assert parse_style('Bold Oblique') == (True, True)
+    assert parse_style('Black') == (True, False)
+    assert parse_style('Regular') == (False, False)
+
+
+def test_find_prefers_the_requested_style(registry):
+    registry, family = registry
+    assert registry.families() == [family]
+    assert registry.find(family.upper()).bold is False
+    assert registry.find(family, bold=True).bold is True
+    # No italic face: the bold one still matches on weight
+    assert registry.find(family, bold=True, italic=True).bold is True
+
+
+def test_missing_family_falls_back(registry, monkeypatch):
+    registry, family = registry
+    monkeypatch.setattr(fonts, 'FALLBACK_FAMILIES', ['Not Installed', family])
+    assert registry.find('No Such Family').family == family
+    assert registry.find('No Such Family', fallback=False) is None
+
+
+def test_loaded_faces_are_shared(registry):
+    registry, family = registry
+    font = registry.get_font(family, 40, bold=True)
+    assert registry.get_font(family, 40.0, bold=True) is font
+    assert registry.get_font(family, 41, bold=True) is not font
+    assert font.getname()[0] == family
+
+
+def test_unknown_family_without_fallback_uses_the_default_font(tmp_path):
+    registry = FontRegistry([str(tmp_path)], index_path=str(tmp_path / 'index.json'))
+    assert registry.find('Anything') is None
+    assert registry.get_font('Anything', 30).getbbox('A')
+
+
+def test_index_is_reused_and_refreshed(registry, monkeypatch):
+    registry, family = registry
+    registry.scan()
+    with open(registry.index_path, encoding='utf-8') as f:
+        index = json.load(f)
+    assert len(index['files']) == 2
+
+    parsed = []
+    real = fonts._read_faces
+    monkeypatch.setattr(fonts, '_read_faces', lambda path: parsed.append(path) or real(path))
+    fresh = FontRegistry(registry.font_dirs, index_path=registry.index_path)
+    assert fresh.families() == [family] and parsed == []
+
+    path = sorted(index['files'])[0]
+    os.utime(path, (1, 1))
+    FontRegistry(registry.font_dirs, index_path=registry.index_path).scan()
+    assert parsed == [path]
@@ -0,0 +1,70 @@
+import math
+
+import pytest
+
+from thumbnail_engine.gradients import LINEAR, RADIAL, Gradient, GradientRenderer, ramp
+
+# Pixel centers sit half a pixel inside the canvas, so the ends fall
+# a level or so short of the stops
+NEAR = 4
+
+
+def close(color, expected):
+    return all(abs(a - b) <= NEAR for a, b in zip(color, expected))
+
+
+def test_horizontal_and_vertical_run_between_the_stops():
+    image = GradientRenderer().render(Gradient(['#000000', '#FFFFFF'], angle=0), (200, 50))
+    assert close(image.getpixel((0, 10)), (0, 0, 0)) and close(image.getpixel((199, 10)), (255, 255, 255))
+    row = [image.getpixel((x, 25))[0] for x in range(200)]
+    assert row == sorted(row)
+    down = GradientRenderer().render(Gradient(['#FF0000', '#0000FF']), (50, 100))
+    assert close(down.getpixel((0, 0)), (255, 0, 0)) and close(down.getpixel((49, 99)), (0, 0, 255))
+
+
+@pytest.mark.parametrize('angle', [30, 135, 250])
+def test_angled_ramp_is_affine(angle):
+    width, height = 160, 96
+    image = ramp(Gradient(['black', 'white'], angle=angle), (width, height))
+    dx, dy = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    # t runs along the direction vector across the extent of the canvas
+    span = abs(width * dx) + abs(height * dy)
+    for x, y in [(8, 8), (80, 48), (150, 90), (20, 80), (140, 10)]:
+        t = 0.5 + ((x + 0.5 - width / 2) * dx + (y + 0.5 - height / 2) * dy) / span
+        assert abs(image.getpixel((x, y)) - 255 * t) <= 6
+
+
+def test_radial_runs_from_the_center():
+    image = ramp(Gradient(['white', 'black'], kind=RADIAL), (200, 200))
+    assert image.getpixel((100, 100)) <= 2 * NEAR
+    assert image.getpixel((0, 0)) >= 255 - NEAR
+    assert image.getpixel((100, 150)) < image.getpixel((100, 190))
+
+
+def test_stops_and_alpha():
+    gradient = Gradient([(1, '#0000FF'), (0, '#FF000000'), (0.5, 'lime')])
+    assert gradient.mode == 'RGBA'
+    assert [pos for pos, _ in gradient.stops] == [0, 0.5, 1]
+    image = GradientRenderer().render(gradient, (10, 101))
+    assert close(image.getpixel((0, 0)), (255, 0, 0, 0)) and image.getpixel((0, 50))[1] >= 255 - NEAR
+
+
+def test_round_trip_and_equality():
+    for gradient in (Gradient(['#112233', '#445566'], angle=45),
+                     Gradient(['red', (0.3, 'blue'), 'white'], kind=RADIAL, center=(0.2, 0.7), radius=0.5)):
+        copy = Gradient.from_dict(gradient.to_dict())
+        assert copy == gradient and hash(copy) == hash(gradient)
+    assert Gradient(['red', 'blue'], angle=450) == Gradient(['red', 'blue'], angle=90)
+
+
+def test_renders_are_shared():
+    renderer = GradientRenderer()
+    gradient = Gradient(['red', 'blue'], kind=LINEAR, angle=20)
+    assert renderer.render(gradient, (64, 36)) is renderer.render(Gradient(['red', 'blue'], angle=20), (64, 36))
+
+
+def test_invalid_gradients():
+    with pytest.raises(ValueError):
+        Gradient(['red'])
+    with pytest.raises(ValueError):
+        Gradient(['red', 'blue'], kind='conic')
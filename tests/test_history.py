@@ -0,0 +1,91 @@
+import pytest
+
+from thumbnail_engine.history import History, SceneHistory
+from thumbnail_engine.scene import Scene, ShapeLayer
+
+
+def box(xy, fill='#FF0000'):
+    x, y = xy
+    return ShapeLayer('rectangle', [(x, y), (x + 100, y + 60)], fill=fill)
+
+
+@pytest.fixture
+def scene():
+    scene = Scene((640, 360), '#202020')
+    scene.add(box((20, 20), '#00FF00'))
+    scene.render()
+    return scene
+
+
+def pixels(scene):
+    return scene.render().tobytes()
+
+
+def test_undo_redo_restore_exact_pixels(scene):
+    history = SceneHistory(scene)
+    states = [pixels(scene)]
+    with history.record("Add box"):
+        scene.add(box((300, 200)))
+    states.append(pixels(scene))
+    with history.record("Move box"):
+        scene.move(scene.layers[-1], 40, -30)
+    states.append(pixels(scene))
+
+    assert history.undo() == "Move box" and pixels(scene) == states[1]
+    assert history.undo() == "Add box" and pixels(scene) == states[0]
+    assert history.undo() is None
+    assert history.redo() == "Add box" and pixels(scene) == states[1]
+    assert history.redo() == "Move box" and pixels(scene) == states[2]
+    assert history.redo() is None
+
+
+def test_steps_store_only_changed_tiles(scene):
+    history = SceneHistory(scene)
+    with history.record("Small"):
+        scene.move(scene.layers[0], 4, 0)
+    small = history.memory_used
+    with history.record("Background"):
+        scene.set_background('#FFFFFF')
+    assert 0 < small < history.memory_used - small
+
+
+def test_failed_operation_rolls_back(scene):
+    history = SceneHistory(scene)
+    before = pixels(scene)
+    layer = scene.layers[0]
+    with pytest.raises(AttributeError):
+        with history.record("Broken"):
+            scene.add(box((300, 200)))
+            scene.update(layer, fill='#0000FF', no_such_property=1)
+    assert scene.layers == [layer] and layer.fill == '#00FF00'
+    assert pixels(scene) == before
+    assert not history.history.can_undo()
+
+
+def test_no_op_records_nothing(scene):
+    history = SceneHistory(scene)
+    with history.record("Nothing"):
+        pass
+    assert not history.history.can_undo()
+
+
+def test_gesture_is_one_step(scene):
+    history = SceneHistory(scene)
+    before = pixels(scene)
+    history.begin("Drag")
+    for _ in range(5):
+        scene.move(scene.layers[0], 10, 5)
+        scene.render()
+    history.commit()
+    assert history.history.stats()['undo_steps'] == 1
+    assert history.undo() == "Drag" and pixels(scene) == before
+
+
+def test_budget_drops_oldest_but_keeps_latest(scene):
+    history = SceneHistory(scene, History(budget_bytes=1))
+    for color in ('#FFFFFF', '#000000', '#808080'):
+        with history.record(color):
+            scene.set_background(color)
+    stats = history.history.stats()
+    assert stats['undo_steps'] == 1 and stats['memory_used'] == history.history.undo_stack[0].nbytes
+    assert history.undo() == '#808080'
@@ -0,0 +1,84 @@
+import os
+
+from PIL import Image, ImageChops
+import pytest
+
+from thumbnail_engine.ingest import CONTAIN, COVER, CROP, ImageFile, ImageIngest, fit_key, load_image
+
+
+@pytest.fixture
+def halves(tmp_path):
+    """800x400 photo: red left half, blue right half, green band at the top."""
+    image = Image.new('RGB', (800, 400), '#FF0000')
+    image.paste('#0000FF', (400, 0, 800, 400))
+    image.paste('#00FF00', (0, 0, 800, 40))
+    path = str(tmp_path / 'photo.png')
+    image.save(path)
+    return path
+
+
+def test_cover_fills_and_crops_at_the_focus(halves):
+    image = load_image(halves, (200, 200), COVER)
+    assert image.size == (200, 200) and image.mode == 'RGB'
+    # The middle 400x400 of the photo, halved
+    assert image.getpixel((50, 100)) == (255, 0, 0) and image.getpixel((150, 100)) == (0, 0, 255)
+    left = load_image(halves, (200, 200), COVER, focus=(0, 0.5))
+    assert left.getpixel((150, 150)) == (255, 0, 0)
+
+
+def test_contain_pads_with_fill(halves):
+    image = load_image(halves, (400, 400), CONTAIN, fill='#FFFFFF')
+    assert image.getpixel((200, 10)) == (255, 255, 255)
+    assert image.getpixel((50, 200)) == (255, 0, 0) and image.getpixel((350, 200)) == (0, 0, 255)
+
+
+def test_crop_keeps_pixels_one_to_one(halves):
+    image = load_image(halves, (100, 100), CROP, focus=(0, 0))
+    with Image.open(halves) as source:
+        assert image.tobytes() == source.convert('RGB').crop((0, 0, 100, 100)).tobytes()
+    padded = load_image(halves, (1000, 500), CROP, fill='#123456')
+    assert padded.getpixel((0, 0)) == (0x12, 0x34, 0x56)
+
+
+def test_jpeg_draft_decode_is_close_to_a_full_decode(tmp_path):
+    photo = Image.radial_gradient('L').resize((2400, 1600)).convert('RGB')
+    path = str(tmp_path / 'big.jpg')
+    photo.save(path, quality=95)
+    fast = load_image(path, (300, 200))
+    with Image.open(path) as full:
+        reference = full.convert('RGB').resize((300, 200), Image.LANCZOS)
+    assert max(high for _, high in ImageChops.difference(fast, reference).getextrema()) <= 8
+
+
+def test_exif_orientation_is_applied(tmp_path):
+    image = Image.new('RGB', (200, 100), '#FF0000')
+    image.paste('#0000FF', (100, 0, 200, 100))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 clockwise on display
+    path = str(tmp_path / 'rotated.jpg')
+    image.save(path, exif=exif, quality=95)
+    loaded = load_image(path, (50, 100), COVER)
+    assert loaded.getpixel((25, 10))[0] > 200 and loaded.getpixel((25, 90))[2] > 200
+
+
+def test_transparency_is_flattened_onto_fill(tmp_path):
+    path = str(tmp_path / 'alpha.png')
+    Image.new('RGBA', (40, 40), (255, 0, 0, 0)).save(path)
+    assert load_image(path, (40, 40), fill='#00FF00').getpixel((5, 5)) == (0, 255, 0)
+
+
+def test_loads_are_memoized_until_the_file_changes(halves):
+    ingest = ImageIngest()
+    first = ingest.load(halves, (160, 90))
+    assert ingest.load(halves, (160, 90)) is first
+    key = fit_key(halves, (160, 90))
+    os.utime(halves, ns=(1, 1))
+    assert fit_key(halves, (160, 90)) != key
+
+
+def test_image_file_names_a_photo(halves):
+    a = ImageFile(halves, CONTAIN)
+    assert a == ImageFile(os.path.relpath(halves), CONTAIN) and a != ImageFile(halves)
+    assert a.load((80, 80)).size == (80, 80)
+    with pytest.raises(ValueError):
+        ImageFile(halves, 'stretch')
@@ -0,0 +1,89 @@
+import json
+import os
+import subprocess
+import sys
+
+from PIL import Image
+import pytest
+
+from thumbnail_engine.layercache import HEADER_SIZE, LayerCache
+
+
+def sample(mode, size=(40, 24)):
+    return Image.radial_gradient('L').resize(size).convert(mode)
+
+
+@pytest.mark.parametrize('mode, stored', [('RGB', 'RGBX'), ('RGBA', 'RGBA'), ('L', 'L')])
+def test_round_trip_is_mapped(tmp_path, mode, stored):
+    cache = LayerCache(str(tmp_path))
+    image = sample(mode)
+    cache.put('k', image)
+    mapped = cache.get('k')
+    assert (mapped.mode, mapped.size, mapped.readonly) == (stored, image.size, 1)
+    assert mapped.convert(mode).tobytes() == image.tobytes()
+    assert os.path.getsize(tmp_path / 'k.raw') == HEADER_SIZE + image.width * image.height * (1 if mode == 'L' else 4)
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_mapped_rgb_composites_like_rgb(tmp_path):
+    cache = LayerCache(str(tmp_path))
+    image = sample('RGB')
+    cache.put('k', image)
+    mapped = cache.get('k')
+    canvas = Image.new('RGB', image.size, '#123456')
+    canvas.paste(mapped.crop((4, 4, 20, 20)), (4, 4))
+    expected = Image.new('RGB', image.size, '#123456')
+    expected.paste(image.crop((4, 4, 20, 20)), (4, 4))
+    assert canvas.tobytes() == expected.tobytes()
+
+
+def test_other_modes_are_not_stored(tmp_path):
+    cache = LayerCache(str(tmp_path))
+    image = sample('P')
+    assert cache.put('k', image) is image
+    assert cache.get('k') is None and cache.size == 0
+
+
+def test_damaged_files_miss(tmp_path):
+    cache = LayerCache(str(tmp_path))
+    cache.put('short', sample('RGB'))
+    with open(tmp_path / 'short.raw', 'r+b') as f:
+        f.truncate(HEADER_SIZE + 10)
+    (tmp_path / 'junk.raw').write_bytes(b'not a layer' * 10)
+    assert cache.get('short') is None and cache.get('junk') is None and cache.get('absent') is None
+    assert cache.misses == 3
+
+
+def test_trim_drops_least_recently_used(tmp_path):
+    cache = LayerCache(str(tmp_path), max_bytes=10 ** 9)
+    for index, key in enumerate('abc'):
+        cache.put(key, sample('L'))
+        os.utime(tmp_path / f'{key}.raw', ns=(index * 10 ** 9, index * 10 ** 9))
+    cache.get('a')
+    each = os.path.getsize(tmp_path / 'a.raw')
+    assert cache.trim(2 * each) == 2 * each
+    assert sorted(os.listdir(tmp_path)) == ['a.raw', 'c.raw']
+    cache.clear()
+    assert cache.size == 0
+
+
+RENDER = """
+import hashlib, json, sys
+from thumbnail_engine.render import Renderer
+spec = json.loads(sys.argv[1])
+print(hashlib.sha256(Renderer().render(spec).tobytes()).hexdigest())
+"""
+
+
+def test_warm_render_matches_cold(tmp_path):
+    photo = tmp_path / 'photo.png'
+    sample('RGB', (300, 200)).save(photo)
+    spec = {'size': [320, 180], 'background': {'image': str(photo), 'blur': 6},
+            'layers': [{'type': 'text', 'text': 'WARM', 'position': 'bottom'}]}
+    env = dict(os.environ, THUMBNAIL_CACHE_DIR=str(tmp_path / 'cache'))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    run = lambda: subprocess.run([sys.executable, '-c', RENDER, json.dumps(spec)], env=env, cwd=root,
+                                 capture_output=True, text=True, check=True).stdout
+    cold = run()
+    assert os.listdir(tmp_path / 'cache' / 'layers')
+    assert run() == cold
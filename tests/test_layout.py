@@ -0,0 +1,73 @@
+from PIL import Image, ImageDraw
+import pytest
+
+from thumbnail_engine.fonts import default_registry
+from thumbnail_engine.layout import fit_text
+
+BOX = (60, 60, 1220, 660)
+TITLE = "I TRIED EVERY FAST FOOD BURGER IN TOKYO"
+
+
+def ink(fit, outline_width=0):
+    font = default_registry().get_font('Arial', fit.size, True, False)
+    draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+    return draw.textbbox(fit.xy, fit.text, font=font, spacing=fit.spacing, align=fit.align,
+                         stroke_width=outline_width)
+
+
+def inside(inner, outer):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+@pytest.mark.parametrize('box', [BOX, (0, 0, 400, 120), (100, 500, 1180, 700), (0, 0, 90, 400)])
+def test_fitted_ink_stays_in_the_box(box):
+    fit = fit_text(TITLE, box, max_size=200, min_size=8)
+    assert fit.fits
+    assert ink(fit) == fit.box
+    assert inside(fit.box, box)
+
+
+def test_outline_is_inside_the_box_too():
+    fit = fit_text(TITLE, (0, 0, 600, 200), outline_width=12)
+    assert fit.fits and inside(ink(fit, 12), (0, 0, 600, 200))
+
+
+def test_size_is_the_largest_that_fits():
+    box = (0, 0, 700, 300)
+    fit = fit_text(TITLE, box, max_size=300)
+    bigger = fit_text(TITLE, box, max_size=fit.size + 1, min_size=fit.size + 1)
+    assert not bigger.fits
+    assert fit_text(TITLE, (0, 0, 1400, 600), max_size=300).size > fit.size
+
+
+def test_lines_are_balanced_and_bounded():
+    fit = fit_text(TITLE, BOX, max_lines=2)
+    assert len(fit.lines) <= 2
+    widths = [len(line) for line in fit.lines]
+    assert max(widths) - min(widths) <= 8
+    assert fit_text(TITLE, BOX, max_lines=1).lines == [TITLE]
+
+
+def test_explicit_newlines_are_kept():
+    fit = fit_text("TOP\nBOTTOM LINE", BOX, max_size=100)
+    assert fit.lines == ["TOP", "BOTTOM LINE"]
+
+
+def test_overflow_at_min_size_is_reported():
+    fit = fit_text("SUPERCALIFRAGILISTIC", (0, 0, 50, 50), min_size=30)
+    assert not fit.fits and fit.size == 30
+
+
+def test_alignment_places_the_block():
+    box = (0, 0, 1200, 600)
+    left = fit_text("SHORT", box, max_size=100, align='left', valign=0)
+    right = fit_text("SHORT", box, max_size=100, align='right', valign=1)
+    assert (left.box[0], left.box[1]) == (0, 0)
+    assert (right.box[2], right.box[3]) == (1200, 600)
+
+
+def test_invalid_input():
+    with pytest.raises(ValueError, match="No words"):
+        fit_text(" \n ", BOX)
+    with pytest.raises(ValueError, match="alignment"):
+        fit_text(TITLE, BOX, align='justify')
@@ -0,0 +1,64 @@
+from PIL import Image, ImageChops
+
+from thumbnail_engine.mipmap import DISPLAY_SIZES, MipmapPyramid
+from thumbnail_engine.preview import FAST, FINAL
+from thumbnail_engine.scene import Scene, ShapeLayer, TextLayer
+
+
+def scene():
+    scene = Scene((1280, 720), '#204060')
+    scene.add(TextLayer("MIPMAP", (100, 100), size=120))
+    scene.add(ShapeLayer('ellipse', [(700, 300), (1001, 557)], fill='#FFCC00'))
+    scene.render()
+    return scene
+
+
+def test_levels_halve_down_to_the_minimum():
+    pyramid = MipmapPyramid(min_size=32).sync(scene())
+    # 40x22 would drop below 32
+    assert [level.size for level in pyramid.levels] == [(1280, 720), (640, 360), (320, 180), (160, 90), (80, 45)]
+
+
+def test_incremental_updates_match_a_rebuild():
+    editor = scene()
+    pyramid = MipmapPyramid().sync(editor)
+    text, blob = editor.layers
+    for edit in (lambda: editor.move(blob, 13, 7), lambda: editor.update(text, text="MOVED", fill='#FF0000'),
+                 lambda: editor.move(text, -31, 45)):
+        edit()
+        editor.render()
+        pyramid.sync(editor)
+        rebuilt = MipmapPyramid()
+        rebuilt.build(editor.canvas)
+        assert [level.tobytes() for level in pyramid.levels] == [level.tobytes() for level in rebuilt.levels]
+    assert pyramid.stats['builds'] == 1 and pyramid.stats['updates'] == 3
+
+
+def test_final_views_are_close_to_a_direct_resize():
+    editor = scene()
+    pyramid = MipmapPyramid().sync(editor)
+    for label, size in DISPLAY_SIZES:
+        view = pyramid.view(size, FINAL)
+        direct = editor.canvas.resize(size, Image.LANCZOS)
+        histogram = ImageChops.difference(view, direct).convert('L').histogram()
+        assert sum(i * n for i, n in enumerate(histogram)) / (size[0] * size[1]) < 2, label
+
+
+def test_views_are_shared_until_the_next_change():
+    editor = scene()
+    pyramid = MipmapPyramid().sync(editor)
+    fast = pyramid.view((320, 180), FAST)
+    assert pyramid.view((320, 180), FAST) is fast and pyramid.view((320, 180), FINAL) is not fast
+    pyramid.sync(editor)
+    assert pyramid.view((320, 180), FAST) is fast
+    editor.move(editor.layers[0], 5, 0)
+    editor.render()
+    pyramid.sync(editor)
+    assert pyramid.view((320, 180), FAST) is not fast
+    assert [label for label, _ in pyramid.views()] == [label for label, _ in DISPLAY_SIZES]
+
+
+def test_a_different_scene_is_rebuilt():
+    pyramid = MipmapPyramid().sync(scene())
+    pyramid.sync(scene())
+    assert pyramid.stats['builds'] == 2
@@ -0,0 +1,96 @@
+import time
+
+from PIL import Image
+
+from thumbnail_engine import preview
+from thumbnail_engine.preview import FAST, FINAL, PreviewPipeline, scale_fast, scale_final
+
+
+class Scheduler:
+    """Tk's ``after`` with a manual clock."""
+
+    def __init__(self):
+        self.now = 0
+        self.jobs = {}
+        self._ids = 0
+
+    def after(self, ms, callback):
+        self._ids += 1
+        self.jobs[self._ids] = (self.now + ms, callback)
+        return self._ids
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run(self, until=1000):
+        """Run due callbacks in time order, letting worker threads finish."""
+        deadline = time.monotonic() + 10
+        while self.jobs and time.monotonic() < deadline:
+            job, (when, callback) = min(self.jobs.items(), key=lambda item: (item[1][0], item[0]))
+            if when > until:
+                break
+            del self.jobs[job]
+            self.now = max(self.now, when)
+            callback()
+            time.sleep(0.001)
+
+
+def pipeline(**options):
+    frames, errors = [], []
+    scheduler = Scheduler()
+    pipe = PreviewPipeline(scheduler, lambda image, quality: frames.append((image, quality)), (64, 36),
+                           report=errors.append, **options)
+    return scheduler, pipe, frames, errors
+
+
+def canvas(color):
+    return Image.new('RGB', (256, 144), color)
+
+
+def test_requests_between_frames_coalesce():
+    scheduler, pipe, frames, _ = pipeline()
+    for color in ('red', 'green', 'blue'):
+        pipe.request(canvas(color))
+    scheduler.run()
+    assert [(image.getpixel((0, 0)), quality) for image, quality in frames] == [((0, 0, 255), FINAL)]
+    assert pipe.stats['frames'] == 1
+    pipe.close()
+
+
+def test_interactive_frames_settle_on_a_final_one():
+    scheduler, pipe, frames, _ = pipeline(idle_ms=150)
+    pipe.request(canvas('red'), interactive=True)
+    scheduler.run(until=100)
+    assert [quality for _, quality in frames] == [FAST]
+    scheduler.run()
+    assert [quality for _, quality in frames] == [FAST, FINAL]
+    assert frames[-1][0].size == (64, 36)
+    pipe.close()
+
+
+def test_failed_frame_is_reported_and_the_next_request_renders(monkeypatch):
+    scheduler, pipe, frames, errors = pipeline()
+
+    def broken(image, size):
+        raise MemoryError("scaler failed")
+    monkeypatch.setattr(preview, 'scale_final', broken)
+    pipe.request(canvas('red'))
+    scheduler.run(until=0)
+    pipe.request(canvas('green'))
+    scheduler.run()
+    assert [str(exc) for exc in errors] == ["scaler failed"] and not frames
+    assert pipe._pending is None and not pipe._busy
+
+    monkeypatch.setattr(preview, 'scale_final', scale_final)
+    pipe.request(canvas('blue'))
+    scheduler.run()
+    assert [image.getpixel((0, 0)) for image, _ in frames] == [(0, 0, 255)]
+    assert pipe.stats['errors'] == 1
+    pipe.close()
+
+
+def test_scalers_hit_the_size():
+    image = canvas('white')
+    assert scale_fast(image, (100, 57)).size == (100, 57)
+    assert scale_final(image, (100, 57)).size == (100, 57)
+    assert scale_fast(image, image.size) is image
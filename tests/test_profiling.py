@@ -0,0 +1,58 @@
+import json
+import threading
+import time
+
+from thumbnail_engine.profiling import Profiler
+
+
+def test_disabled_spans_record_nothing():
+    profiler = Profiler()
+    with profiler.operation('edit'), profiler.span('stage'):
+        pass
+    assert not profiler.events and profiler.last_operation is None
+    assert profiler.span('a') is profiler.span('b')
+
+
+def test_operation_summarizes_its_direct_stages():
+    profiler = Profiler(enabled=True)
+    with profiler.operation('Add text'):
+        for _ in range(2):
+            with profiler.span('text.rasterize'):
+                with profiler.span('font.load'):
+                    time.sleep(0.002)
+        with profiler.span('scene.compose'):
+            pass
+        time.sleep(0.002)
+    summary = profiler.last_operation
+    names = [name for name, _ in summary.stages]
+    assert summary.name == 'Add text' and names[0] == 'text.rasterize' and 'font.load' not in names
+    assert set(names) == {'text.rasterize', 'scene.compose', 'other'}
+    assert abs(sum(ms for _, ms in summary.stages) - summary.total_ms) < 0.01
+    assert summary.lines()[0].startswith('Add text')
+    assert len(profiler.events) == 6
+
+
+def test_chrome_trace_names_threads_and_nests_spans(tmp_path):
+    profiler = Profiler(enabled=True, max_events=3)
+
+    def work():
+        with profiler.span('worker.stage', size=7):
+            pass
+    thread = threading.Thread(target=work, name='preview-0')
+    thread.start()
+    thread.join()
+    with profiler.operation('op'):
+        with profiler.span('inner'):
+            pass
+    with open(profiler.export_chrome_trace(str(tmp_path / 'trace.json')), encoding='utf-8') as f:
+        trace = json.load(f)
+    events = trace['traceEvents']
+    assert {e['args']['name'] for e in events if e['ph'] == 'M'} >= {'preview-0'}
+    spans = {e['name']: e for e in events if e['ph'] == 'X'}
+    assert spans['worker.stage']['args'] == {'size': 7}
+    assert spans['op']['ts'] <= spans['inner']['ts'] and spans['inner']['dur'] <= spans['op']['dur']
+    assert spans['worker.stage']['tid'] != spans['op']['tid']
+    # The ring buffer keeps only the newest events
+    with profiler.operation('x'):
+        pass
+    assert len(profiler.events) == 3 and profiler.events[0][0] == 'inner'
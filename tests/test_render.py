@@ -0,0 +1,87 @@
+import json
+
+from PIL import Image
+import pytest
+
+from thumbnail_engine import batch
+from thumbnail_engine.render import Renderer, SpecError, resolve
+
+SPEC = {
+    'size': [640, 360],
+    'background': {'gradient': {'stops': ['#102030', '#C04020'], 'angle': 20}, 'blur': 4},
+    'layers': [
+        {'type': 'text', 'text': 'EPIC WIN', 'position': 'bottom', 'size': 60},
+        {'type': 'text', 'text': 'A much longer title that wraps', 'fit': True, 'position': 'top'},
+        {'type': 'shape', 'preset': 'arrow', 'anchor': 'bottom-right', 'size': [150, 60]},
+    ],
+}
+
+
+@pytest.fixture(scope='module')
+def renderer():
+    return Renderer()
+
+
+def test_render_is_deterministic(renderer):
+    image = renderer.render(SPEC)
+    assert image.size == (640, 360) and image.mode == 'RGB'
+    assert Renderer().render(SPEC).tobytes() == image.tobytes()
+
+
+def test_scale_rasterizes_the_same_layout(renderer):
+    small, large = renderer.scene(SPEC), renderer.scene(dict(SPEC, scale=2))
+    assert large.size == (1280, 720)
+    for a, b in zip(small.layers, large.layers):
+        # Drawn at the larger size, not upsampled: the same boxes to within hinting
+        assert all(abs(2 * p - q) <= 4 for p, q in zip(a.bbox(small), b.bbox(large)))
+
+
+def test_template_defaults_are_overridden_by_the_spec():
+    spec = resolve({'template': 'gaming', 'text': {'fill': '#123456'}, 'layers': [{'type': 'text', 'text': 'X'}]})
+    assert 'template' not in spec and spec['text']['fill'] == '#123456'
+    assert spec['layers'][-1] == {'type': 'text', 'text': 'X'} and len(spec['layers']) > 1
+
+
+def test_relative_paths_resolve_against_base_dir(tmp_path):
+    Image.new('RGBA', (40, 40), '#00FF00').save(tmp_path / 'dot.png')
+    renderer = Renderer(base_dir=str(tmp_path))
+    image = renderer.render({'size': [200, 100], 'background': '#000000',
+                             'layers': [{'type': 'image', 'path': 'dot.png', 'xy': [10, 10]}]})
+    assert image.getpixel((20, 20)) == (0, 255, 0) and image.getpixel((100, 80)) == (0, 0, 0)
+
+
+@pytest.mark.parametrize('layers, message', [
+    ([{'type': 'hologram'}], "Unknown layer type"),
+    ([{'type': 'sticker'}], "'path'"),
+    ([{'type': 'text', 'text': 'A', 'colour': 'red'}], "Unknown text option"),
+    ([{'type': 'text', 'text': 'A', 'xy': [0, 0], 'box': [0, 0, 10, 10]}], "not both"),
+    ([{'type': 'shape', 'preset': 'hexagon'}], "Unknown shape preset"),
+    ([{'type': 'text', 'text': ' ', 'fit': True}], "No words"),
+])
+def test_bad_layers_name_their_index(renderer, layers, message):
+    with pytest.raises(SpecError, match=message) as info:
+        renderer.render({'size': [320, 180], 'layers': [{'type': 'text', 'text': 'OK'}] + layers})
+    assert str(info.value).startswith("Layer 1: ")
+
+
+def test_unknown_template(renderer):
+    with pytest.raises(SpecError):
+        renderer.render({'template': 'no-such-template'})
+
+
+def test_batch_renders_a_manifest(tmp_path):
+    manifest = tmp_path / 'manifest.jsonl'
+    lines = [json.dumps(dict(SPEC, id='a')),
+             json.dumps({'id': 'b', 'template': 'vlog', 'output': 'nested/b.png'}),
+             '# comment', 'not json',
+             json.dumps({'id': 'c', 'layers': [{'type': 'hologram'}]})]
+    manifest.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    out = tmp_path / 'out'
+    records = {r['id']: r for r in batch.run(batch.read_manifest(str(manifest)), str(out), workers=2)}
+    assert sorted(records) == ['4', 'a', 'b', 'c']
+    assert records['a']['ok'] and records['a']['format'] == 'JPEG' and (out / 'a.jpg').exists()
+    assert records['b']['ok'] and records['b']['format'] == 'PNG' and (out / 'nested' / 'b.png').exists()
+    assert not records['4']['ok'] and 'line 4' in records['4']['error']
+    assert records['c']['error'].startswith('SpecError: Layer 0')
+    summary = batch.summarize(list(records.values()), 1.0)
+    assert (summary['jobs'], summary['ok'], summary['failed']) == (4, 2, 2)
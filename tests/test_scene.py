@@ -0,0 +1,82 @@
+from thumbnail_engine.gradients import Gradient
+from thumbnail_engine.scene import MAX_DIRTY_RECTS, Scene, ShapeLayer, TextLayer
+
+
+def full_render(scene):
+    """The same scene composed from scratch."""
+    fresh = Scene(scene.design_size, fonts=scene.fonts, text_effects=scene.text_effects, scale=scene.scale)
+    fresh.background = scene.background.detached()
+    fresh.layers = [layer.detached() for layer in scene.layers]
+    return fresh.render().tobytes()
+
+
+def shape(x, y, fill='#FF000080'):
+    return ShapeLayer('ellipse', [(x, y), (x + 120, y + 80)], fill=fill, outline='#FFFFFF', width=4)
+
+
+def test_incremental_renders_match_a_full_render():
+    scene = Scene((640, 360), Gradient(['#203040', '#804020'], angle=30), scale=0.75)
+    title = scene.add(TextLayer("HELLO", (40, 40), size=64))
+    blob = scene.add(shape(300, 150))
+    scene.render()
+    edits = [
+        lambda: scene.move(blob, 33, -20),
+        lambda: scene.update(title, text="HELLO AGAIN", fill='#FFFF00'),
+        lambda: scene.add(shape(100, 200, '#00FF00')),
+        lambda: scene.raise_layer(blob, -1),
+        lambda: scene.move(title, 0.5, 7),
+        lambda: scene.update(blob, visible=False),
+        lambda: scene.remove(title),
+        lambda: scene.set_blur(4),
+    ]
+    for edit in edits:
+        edit()
+        assert scene.render().tobytes() == full_render(scene)
+
+
+def test_render_recomposes_only_dirty_boxes():
+    scene = Scene((640, 360), '#101010')
+    layer = scene.add(shape(10, 10))
+    scene.render()
+    revision = scene.revision
+    scene.move(layer, 200, 0)
+    dirty = scene.dirty
+    assert len(dirty) == 2 and all(box[2] - box[0] < 200 for box in dirty)
+    scene.render()
+    assert scene.changes_since(revision) == dirty
+    assert scene.render() is scene.canvas and scene.changes_since(scene.revision) == []
+
+
+def test_dirty_boxes_are_merged_past_the_cap():
+    scene = Scene((1280, 720))
+    scene.render()
+    for i in range(MAX_DIRTY_RECTS + 1):
+        scene.mark_dirty((i * 100, 0, i * 100 + 10, 10))
+    assert scene.dirty == [(0, 0, MAX_DIRTY_RECTS * 100 + 10, 10)]
+    scene.mark_dirty((-50, -50, 5000, 5000))
+    assert scene.dirty == [(0, 0, 1280, 720)]
+
+
+def test_at_scale_draws_the_same_layout_without_touching_the_original():
+    scene = Scene((320, 180), '#000000', scale=0.5)
+    layer = scene.add(ShapeLayer('rectangle', [(80, 40), (240, 140)], fill='#FFFFFF'))
+    preview = scene.render().copy()
+    big = scene.at_scale(2)
+    assert big.size == (640, 360)
+    image = big.render()
+    assert image.getpixel((161, 81)) == (255, 255, 255) and image.getpixel((159, 79)) == (0, 0, 0)
+    assert scene.layers[0] is layer and scene.render().tobytes() == preview.tobytes()
+
+
+def test_snapshot_and_restore():
+    scene = Scene((320, 180))
+    layer = scene.add(shape(0, 0))
+    scene.render()
+    before = scene.render().tobytes()
+    state = scene.snapshot()
+    scene.update(layer, fill='#0000FF')
+    scene.add(shape(100, 50))
+    scene.render()
+    scene.restore(state)
+    assert scene.layers == [layer] and layer.fill == '#FF000080'
+    assert scene.render().tobytes() == before
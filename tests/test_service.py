@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import signal
+
+from thumbnail_engine.service import RenderService
+
+SPEC = {'template': 'vlog', 'text': {'text': 'SERVICE'}}
+
+
+def serve(test):
+    async def main():
+        service = await RenderService(port=0, workers=1).start()
+        try:
+            await asyncio.wait_for(test(service), 60)
+        finally:
+            await service.close()
+    asyncio.run(main())
+
+
+async def exchange(service, request, hang_up=False):
+    """Everything the server sends for ``request`` up to EOF."""
+    reader, writer = await asyncio.open_connection(service.host, service.port)
+    writer.write(request)
+    if hang_up:
+        writer.write_eof()
+    data = await reader.read()
+    writer.close()
+    return data
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict(line.split(': ', 1) for line in lines[1:] if line)
+    body = await reader.readexactly(int(headers['Content-Length']))
+    return int(lines[0].split()[1]), headers, body
+
+
+def post(spec, connection='close'):
+    body = json.dumps(spec).encode('utf-8')
+    return (f"POST /render HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {connection}\r\n\r\n").encode('latin-1') + body
+
+
+def test_render_then_eof_on_connection_close():
+    async def test(service):
+        data = await exchange(service, post(SPEC))
+        head, _, body = data.partition(b'\r\n\r\n')
+        assert head.startswith(b'HTTP/1.1 200 ')
+        assert b'Connection: close' in head
+        assert b'Content-Type: image/jpeg' in head
+        assert body[:2] == b'\xff\xd8'
+        assert f"Content-Length: {len(body)}".encode() in head
+    serve(test)
+
+
+def test_keep_alive_serves_several_requests():
+    async def test(service):
+        reader, writer = await asyncio.open_connection(service.host, service.port)
+        writer.write(post(SPEC, 'keep-alive'))
+        status, headers, _ = await read_response(reader)
+        assert (status, headers['X-Cache'], headers['Connection']) == (200, 'miss', 'keep-alive')
+        writer.write(post(SPEC, 'keep-alive'))
+        status, headers, _ = await read_response(reader)
+        assert (status, headers['X-Cache']) == (200, 'hit')
+        writer.write(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+        status, _, body = await read_response(reader)
+        assert (status, json.loads(body)) == (200, {'ok': True})
+        assert await reader.read() == b''
+        writer.close()
+    serve(test)
+
+
+def test_errors_are_framed():
+    async def test(service):
+        data = await exchange(service, post({'template': 'no-such-template'}))
+        assert data.startswith(b'HTTP/1.1 400 ')
+        assert 'error' in json.loads(data.partition(b'\r\n\r\n')[2])
+        data = await exchange(service, b"GET /render HTTP/1.1\r\nConnection: close\r\n\r\n")
+        assert data.startswith(b'HTTP/1.1 405 ') and b'Allow: POST' in data
+        data = await exchange(service, b"nonsense\r\n\r\n")
+        assert data.startswith(b'HTTP/1.1 400 ') and b'Connection: close' in data
+    serve(test)
+
+
+def test_truncated_body_hangs_up():
+    async def test(service):
+        data = await exchange(service, post(SPEC)[:-5], hang_up=True)
+        assert data == b''
+    serve(test)
+
+
+def test_broken_pool_is_replaced_and_shut_down():
+    async def test(service):
+        await exchange(service, post(SPEC))
+        broken = service.pool
+        for pid in list(broken._processes):
+            os.kill(pid, signal.SIGKILL)
+        data = await exchange(service, post(dict(SPEC, text={'text': 'AGAIN'})))
+        assert data.startswith(b'HTTP/1.1 500 ')
+        assert service.pool is not broken
+        assert broken._shutdown_thread
+        data = await exchange(service, post(dict(SPEC, text={'text': 'AGAIN'})))
+        assert data.startswith(b'HTTP/1.1 200 ')
+    serve(test)
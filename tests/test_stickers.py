@@ -0,0 +1,75 @@
+import os
+
+from PIL import Image
+
+from thumbnail_engine.stickers import AtlasSheet, StickerCache, size_bucket, sticker_packs
+
+
+def sticker(tmp_path, name='star.png', color='#FF8800', size=(300, 200)):
+    """An opaque rectangle with a transparent margin to trim."""
+    image = Image.new('RGBA', (size[0] + 40, size[1] + 40), (0, 0, 0, 0))
+    image.paste(color, (20, 20, 20 + size[0], 20 + size[1]))
+    path = tmp_path / name
+    image.save(path)
+    return str(path)
+
+
+def test_size_buckets():
+    assert [size_bucket(s) for s in (1, 32, 33, 150, 512, 900)] == [32, 32, 64, 256, 512, 512]
+
+
+def test_stickers_are_trimmed_and_fitted(tmp_path):
+    cache = StickerCache(directory=str(tmp_path / 'atlas'))
+    path = sticker(tmp_path)
+    tile = cache.image(path, 128)
+    assert tile.size == (128, 85) and tile.getpixel((0, 0)) == (255, 136, 0, 255)
+    between = cache.image(path, 100)
+    assert between.size == (100, 66) and cache.image(path, 100) is between
+
+
+def test_each_bucket_rasterizes_once_and_persists(tmp_path):
+    directory = str(tmp_path / 'atlas')
+    cache = StickerCache(directory=directory)
+    calls = []
+
+    def rasterize(bucket):
+        calls.append(bucket)
+        return Image.new('RGBA', (bucket, bucket), '#00FF00')
+    for size in (64, 60, 50, 200):
+        cache.sticker('dot', size, rasterize)
+    assert calls == [64, 256]
+    assert sorted(os.listdir(directory)) == ['atlas-256.png', 'atlas-64.png']
+
+    reopened = StickerCache(directory=directory)
+    assert reopened.sticker('dot', 64, rasterize).size == (64, 64) and calls == [64, 256]
+
+
+def test_memory_only_cache_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.setenv('THUMBNAIL_CACHE_DIR', str(tmp_path))
+    cache = StickerCache(directory=False)
+    cache.sticker('dot', 32, lambda bucket: Image.new('RGBA', (8, 8), 'red'))
+    assert not os.listdir(tmp_path)
+
+
+def test_atlas_sheet_packs_and_round_trips(tmp_path):
+    sheet = AtlasSheet(512)
+    for index in range(6):
+        sheet.add(f'k{index}', Image.new('RGBA', (512, 300 + index), (index, 0, 0, 255)))
+    assert sheet.get('k5').size == (512, 305) and sheet.get('k5').getpixel((0, 0)) == (5, 0, 0, 255)
+    path = str(tmp_path / 'atlas.png')
+    sheet.save(path)
+    loaded = AtlasSheet.load(path, 512)
+    assert len(loaded) == 6 and loaded.get('k3').tobytes() == sheet.get('k3').tobytes()
+    # A sheet saved for another cell size is ignored
+    assert len(AtlasSheet.load(path, 256)) == 0
+
+
+def test_sticker_packs(tmp_path):
+    sticker(tmp_path, 'loose.png')
+    (tmp_path / 'arrows').mkdir()
+    sticker(tmp_path / 'arrows', 'b.png')
+    sticker(tmp_path / 'arrows', 'a.webp')
+    (tmp_path / 'arrows' / 'notes.txt').write_text('not a sticker')
+    packs = sticker_packs([str(tmp_path)])
+    assert sorted(packs) == ['arrows', os.path.basename(tmp_path)]
+    assert [os.path.basename(p) for p in packs['arrows']] == ['a.webp', 'b.png']
@@ -0,0 +1,45 @@
+import pytest
+from PIL import ImageColor
+
+from thumbnail_engine.render import Renderer, resolve
+from thumbnail_engine.templates import TemplateLibrary
+
+NAMES = ('gaming', 'reaction', 'tutorial', 'vlog')
+
+
+@pytest.fixture(scope='module')
+def renderer():
+    return Renderer()
+
+
+def ink(image, box, color, tolerance=40):
+    """Fraction of pixels in ``box`` within ``tolerance`` of ``color``."""
+    target = ImageColor.getrgb(color)
+    data = image.crop(box).tobytes()
+    pixels = list(zip(data[0::3], data[1::3], data[2::3]))
+    close = sum(1 for p in pixels if all(abs(a - b) <= tolerance for a, b in zip(p, target)))
+    return close / len(pixels)
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_template_draws_its_title(renderer, name):
+    scene = renderer.scene({'template': name})
+    titles = scene.layers_of('text')
+    assert len(titles) == 1
+    title = titles[0]
+    text = resolve({'template': name}, renderer.library)['text']
+    assert title.text.replace('\n', ' ') == text['text']
+    assert ink(scene.flatten(), title.bbox(scene), text['fill']) > 0.05
+
+
+@pytest.mark.parametrize('layout', ('top', 'center', 'bottom'))
+def test_layout_moves_the_title(renderer, layout):
+    scene = renderer.scene({'template': 'vlog', 'params': {'layout': layout}})
+    top, bottom = scene.layers_of('text')[0].bbox(scene)[1::2]
+    middle = (top + bottom) / 2 / scene.size[1]
+    expected = {'top': (0, 0.5), 'center': (0.25, 0.75), 'bottom': (0.5, 1)}[layout]
+    assert expected[0] <= middle <= expected[1]
+
+
+def test_builtin_templates_are_listed():
+    assert set(NAMES) <= set(TemplateLibrary().names())
@@ -0,0 +1,57 @@
+import hashlib
+import json
+
+import pytest
+
+from thumbnail_engine.render import Renderer, SpecError
+from thumbnail_engine.variants import expand, load_variants, variant_jobs
+
+
+def digest(image):
+    return hashlib.sha256(image.tobytes()).hexdigest()
+
+
+def test_title_and_layout_variants_differ():
+    variants = list(expand({'template': 'vlog'}, {'title': ['MY DAY', '24 HOURS IN TOKYO'],
+                                                  'layout': ['top', 'bottom']}))
+    assert len(variants) == 4
+    renderer = Renderer()
+    assert len({digest(renderer.render(spec)) for _, spec in variants}) == 4
+
+
+def test_background_axis_is_outermost():
+    variants = list(expand({'template': 'vlog'}, {'title': ['A', 'B'], 'background': '*'}))
+    backgrounds = [values['background'] for values, _ in variants]
+    assert backgrounds[0] == backgrounds[1] and backgrounds[2] == backgrounds[3]
+
+
+def test_limit():
+    assert len(list(expand({'template': 'vlog'}, {'background': '*'}, limit=2))) == 2
+
+
+@pytest.mark.parametrize('spec, vary', [
+    ({'template': 'vlog'}, {'colour': ['#000000', '#FFFFFF']}),
+    ({'template': 'vlog'}, {'title': ['SAME', 'SAME']}),
+    ({'template': 'vlog', 'text': {'text': 'FIXED'}}, {'title': ['A', 'B']}),
+    ({'template': 'tutorial', 'background': '#000000'}, {'background': ['#111111', '#222222']}),
+    ({'template': 'gaming'}, {'background': '*'}),
+    ({'template': 'vlog'}, {'title': []}),
+])
+def test_axes_that_change_nothing_are_rejected(spec, vary):
+    with pytest.raises(SpecError):
+        list(expand(spec, vary))
+
+
+def test_spec_keys_vary_without_a_template():
+    variants = list(expand({'layers': []}, {'background': ['#000000', '#FFFFFF']}))
+    assert [spec['background'] for _, spec in variants] == ['#000000', '#FFFFFF']
+
+
+def test_jobs_and_manifest_round_trip(tmp_path):
+    path = tmp_path / 'ab.json'
+    path.write_text(json.dumps({'template': 'vlog', 'vary': {'layout': ['top', 'bottom']}, 'limit': 5}))
+    spec, vary, limit = load_variants(str(path))
+    jobs = list(variant_jobs(spec, vary, limit))
+    assert [job_id for job_id, _ in jobs] == ['vlog-000', 'vlog-001']
+    assert jobs[1][1]['output'] == 'vlog-001.jpg'
+    assert jobs[1][1]['variant'] == {'layout': 'bottom'}
@@ -0,0 +1,5 @@
+"""Rendering engine behind the YouTube Thumbnail Creator.
+
+Submodules are imported on demand so the GUI and the headless tools only pay
+for the pieces they use.
+"""
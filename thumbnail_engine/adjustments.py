@@ -0,0 +1,228 @@
+"""Non-destructive tonal adjustments.
+
+An ``AdjustmentStack`` is an immutable, ordered list of adjustments applied to
+a pristine base image.  Consecutive point operations (brightness, contrast,
+gamma, levels) are fused into one 256-entry table per channel and applied
+with a single ``Image.point`` call.  Saturation mixes channels, so it cannot
+be a per-channel table; it runs as one color-matrix ``convert`` between LUT
+passes (adjacent saturation steps are folded into one matrix).
+"""
+POINT_KINDS = ('brightness', 'contrast', 'gamma', 'levels')
+MATRIX_KINDS = ('saturation',)
+
+DEFAULTS = {
+    'brightness': {'factor': 1.0},
+    'contrast': {'factor': 1.0},
+    'saturation': {'factor': 1.0},
+    'gamma': {'value': 1.0},
+    'levels': {'black': 0, 'white': 255, 'gamma': 1.0, 'out_black': 0, 'out_white': 255},
+}
+
+# ITU-R 601-2 luma, as used by Image.convert('L') and ImageEnhance
+LUMA = (0.299, 0.587, 0.114)
+
+
+class Adjustment:
+    __slots__ = ('kind', 'params')
+
+    def __init__(self, kind, **params):
+        if kind not in DEFAULTS:
+            raise ValueError(f"Unknown adjustment: {kind}")
+        unknown = set(params) - set(DEFAULTS[kind])
+        if unknown:
+            raise ValueError(f"Unknown {kind} parameter(s): {', '.join(sorted(unknown))}")
+        merged = dict(DEFAULTS[kind])
+        merged.update(params)
+        self.kind = kind
+        self.params = tuple(sorted(merged.items()))
+
+    def __getitem__(self, name):
+        return dict(self.params)[name]
+
+    @property
+    def key(self):
+        return (self.kind, self.params)
+
+    @property
+    def is_identity(self):
+        return dict(self.params) == DEFAULTS[self.kind]
+
+    def to_dict(self):
+        data = {'kind': self.kind}
+        data.update(self.params)
+        return data
+
+    def __eq__(self, other):
+        return isinstance(other, Adjustment) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        params = ', '.join(f"{k}={v!r}" for k, v in self.params)
+        return f"Adjustment({self.kind!r}, {params})"
+
+
+class AdjustmentStack:
+    """Immutable ordered adjustments; editing methods return a new stack."""
+
+    def __init__(self, adjustments=()):
+        self.adjustments = tuple(adjustments)
+
+    @classmethod
+    def from_list(cls, items):
+        return cls(Adjustment(**item) for item in items)
+
+    def to_list(self):
+        return [adj.to_dict() for adj in self.adjustments]
+
+    def get(self, kind):
+        for adj in self.adjustments:
+            if adj.kind == kind:
+                return adj
+        return None
+
+    def set(self, kind, **params):
+        """Replace the adjustment of ``kind`` in place, or append it."""
+        new = Adjustment(kind, **params)
+        items = list(self.adjustments)
+        for i, adj in enumerate(items):
+            if adj.kind == kind:
+                items[i] = new
+                break
+        else:
+            items.append(new)
+        return AdjustmentStack(items)
+
+    def remove(self, kind):
+        return AdjustmentStack(adj for adj in self.adjustments if adj.kind != kind)
+
+    def move(self, kind, index):
+        items = [adj for adj in self.adjustments if adj.kind != kind]
+        adj = self.get(kind)
+        if adj is not None:
+            items.insert(index, adj)
+        return AdjustmentStack(items)
+
+    @property
+    def key(self):
+        return tuple(adj.key for adj in self.adjustments if not adj.is_identity)
+
+    def __bool__(self):
+        return bool(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, AdjustmentStack) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"AdjustmentStack({list(self.adjustments)!r})"
+
+    def apply(self, image):
+        """Return ``image`` with the stack applied (the input is not modified)."""
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        bands = len(image.getbands())
+        curves = _identity(bands)
+        histogram = None
+        saturation = 1.0
+        for adj in self.adjustments:
+            if adj.is_identity:
+                continue
+            if adj.kind in MATRIX_KINDS:
+                if not _is_identity(curves):
+                    image = image.point(build_lut(curves))
+                    curves = _identity(bands)
+                    histogram = None
+                saturation *= adj['factor']
+                continue
+            if saturation != 1.0:
+                image = _saturate(image, saturation)
+                saturation = 1.0
+                histogram = None
+            if adj.kind == 'contrast' and histogram is None:
+                histogram = image.histogram()
+            curves = _apply_point(adj, curves, histogram)
+        if not _is_identity(curves):
+            image = image.point(build_lut(curves))
+        if saturation != 1.0:
+            image = _saturate(image, saturation)
+        return image
+
+
+def build_lut(curves):
+    return [min(255, max(0, int(round(v)))) for curve in curves for v in curve]
+
+
+def _identity(bands):
+    return [list(range(256)) for _ in range(bands)]
+
+
+def _is_identity(curves):
+    identity = list(range(256))
+    return all(curve == identity for curve in curves)
+
+
+def _clamp(v):
+    return min(255.0, max(0.0, v))
+
+
+def _apply_point(adj, curves, histogram):
+    kind = adj.kind
+    if kind == 'brightness':
+        f = adj['factor']
+        return [[_clamp(v * f) for v in curve] for curve in curves]
+    if kind == 'contrast':
+        # Same pivot as ImageEnhance.Contrast: the mean luma of the image as
+        # it looks at this point of the stack, derived from the histogram of
+        # the segment's input mapped through the curves built so far.
+        f = adj['factor']
+        mean = _mean_luma(curves, histogram)
+        return [[_clamp(mean + (v - mean) * f) for v in curve] for curve in curves]
+    if kind == 'gamma':
+        inv = 1.0 / max(adj['value'], 1e-6)
+        return [[255 * (v / 255) ** inv for v in curve] for curve in curves]
+    if kind == 'levels':
+        black, white = adj['black'], adj['white']
+        inv = 1.0 / max(adj['gamma'], 1e-6)
+        out_black, out_white = adj['out_black'], adj['out_white']
+        span = max(1, white - black)
+        result = []
+        for curve in curves:
+            mapped = []
+            for v in curve:
+                t = min(1.0, max(0.0, (v - black) / span)) ** inv
+                mapped.append(out_black + (out_white - out_black) * t)
+            result.append(mapped)
+        return result
+    raise ValueError(f"Not a point adjustment: {kind}")
+
+
+def _mean_luma(curves, histogram):
+    if len(curves) == 1:
+        weights = (1.0,)
+    else:
+        weights = LUMA
+    total = 0.0
+    for band, (curve, weight) in enumerate(zip(curves, weights)):
+        hist = histogram[band * 256:(band + 1) * 256]
+        count = sum(hist) or 1
+        total += weight * sum(h * v for h, v in zip(hist, curve)) / count
+    return int(total + 0.5)
+
+
+def _saturate(image, factor):
+    if image.mode != 'RGB':
+        return image
+    # out = luma + (v - luma) * factor, expressed as a 3x4 color matrix
+    r, g, b = LUMA
+    k = 1 - factor
+    matrix = (
+        r * k + factor, g * k, b * k, 0,
+        r * k, g * k + factor, b * k, 0,
+        r * k, g * k, b * k + factor, 0,
+    )
+    return image.convert('RGB', matrix)
+
@@ -0,0 +1,159 @@
+"""Render a JSONL manifest of thumbnail specs across a process pool.
+
+Each manifest line is a spec (see ``render``) with optional ``id``,
+``output`` (relative to ``--out-dir``) and ``budget`` keys.  Workers render
+and write their own files, so only a small result record crosses the
+process boundary; records are streamed to stdout as JSON lines in
+completion order and a summary goes to stderr::
+
+    python -m thumbnail_engine.batch manifest.jsonl --out-dir out --workers 8
+"""
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .export import YOUTUBE_MAX_BYTES, export_image
+
+# Submitted but unfinished jobs per worker; keeps memory flat on huge manifests
+QUEUE_DEPTH = 2
+
+_renderer = None
+
+
+def worker_context():
+    """Start method for render workers: a fresh interpreter, never a fork.
+
+    A forked worker inherits whatever the parent holds at that moment,
+    including locks taken by its other threads (the service's event loop,
+    a GUI's export thread), which can deadlock the child.  ``forkserver``
+    forks from a clean single-threaded server; ``spawn`` is the fallback
+    where it does not exist.
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def _init_worker(base_dir):
+    global _renderer
+    from .render import Renderer
+    _renderer = Renderer(base_dir=base_dir)
+
+
+def render_job(job, out_dir, budget):
+    """Render and write one manifest entry; returns its result record."""
+    job_id, spec = job
+    record = {'id': job_id, 'ok': False}
+    start = time.perf_counter()
+    try:
+        if isinstance(spec, Exception):
+            raise spec
+        if _renderer is None:
+            _init_worker(None)
+        spec = dict(spec)
+        output = os.path.join(out_dir, spec.pop('output', f"{job_id}.jpg"))
+        job_budget = spec.pop('budget', budget)
+        spec.pop('id', None)
+        if 'variant' in spec:
+            record['variant'] = spec.pop('variant')
+        image = _renderer.render(spec)
+        rendered = time.perf_counter()
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        result = export_image(image, output, job_budget)
+        record.update(ok=True, output=result.path, bytes=result.best.size, fits=result.fits,
+                      format=result.best.format,
+                      render_ms=round((rendered - start) * 1000, 1),
+                      encode_ms=round((time.perf_counter() - rendered) * 1000, 1))
+    except Exception as exc:
+        record['error'] = f"{type(exc).__name__}: {exc}"
+    record['ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+def read_manifest(path):
+    """Yield ``(id, spec)``; unparsable lines yield the error as the spec."""
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                spec = json.loads(line)
+                if not isinstance(spec, dict):
+                    raise ValueError("manifest line is not a JSON object")
+            except ValueError as exc:
+                yield str(number), ValueError(f"line {number}: {exc}")
+                continue
+            yield str(spec.get('id', number)), spec
+
+
+def run(jobs, out_dir, workers=None, budget=YOUTUBE_MAX_BYTES, base_dir=None, on_result=None):
+    """Render ``jobs`` (``(id, spec)`` pairs) and return all result records."""
+    workers = workers or os.cpu_count() or 1
+    results = []
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context(),
+                             initializer=_init_worker, initargs=(base_dir,)) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers * QUEUE_DEPTH:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(render_job, job, out_dir, budget))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                results.append(record)
+                if on_result is not None:
+                    on_result(record)
+    return results
+
+
+def summarize(results, seconds):
+    ok = [r for r in results if r['ok']]
+    times = sorted(r['ms'] for r in ok)
+    summary = {
+        'jobs': len(results),
+        'ok': len(ok),
+        'failed': len(results) - len(ok),
+        'over_budget': sum(1 for r in ok if not r['fits']),
+        'seconds': round(seconds, 2),
+        'per_second': round(len(results) / seconds, 1) if seconds else None,
+    }
+    if times:
+        summary['p50_ms'] = times[len(times) // 2]
+        summary['p95_ms'] = times[min(len(times) - 1, int(len(times) * 0.95))]
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render thumbnails from a JSONL manifest of specs.")
+    parser.add_argument('manifest')
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--budget', type=int, default=YOUTUBE_MAX_BYTES,
+                        help="default byte budget per thumbnail (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    base_dir = os.path.dirname(os.path.abspath(args.manifest))
+    start = time.perf_counter()
+
+    def emit(record):
+        print(json.dumps(record), flush=True)
+
+    results = run(read_manifest(args.manifest), args.out_dir, args.workers, args.budget, base_dir, emit)
+    summary = summarize(results, time.perf_counter() - start)
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,471 @@
+"""Headless benchmarks for every rendering stage.
+
+Each case is timed at every requested canvas size (1280x720 and 3840x2160 by
+default): text across outline widths and font sizes, fitting a title to a
+box, gradients, blur, background ingest, mapping a persisted layer, preview
+downscaling, the YouTube display sizes (per-size LANCZOS versus the mipmap),
+emoji, full-scene composition, a text edit with the scene at preview scale
+versus full size, and export.  Cases measure cold-cache work
+(the caches are what make the editor feel fast, so warm timings would hide
+regressions in the code behind them).
+
+Every case runs in a fresh worker process so its peak RSS is its own.
+Results are latency percentiles plus peak and added memory, and can be saved
+as a JSON baseline and compared against a later run::
+
+    python -m thumbnail_engine.bench --save baseline.json
+    python -m thumbnail_engine.bench --compare baseline.json -k text
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import PIL
+from PIL import Image, ImageFilter
+
+BASELINE_VERSION = 1
+
+SIZES = {'720p': (1280, 720), '1080p': (1920, 1080), '4k': (3840, 2160)}
+DEFAULT_SIZES = ('720p', '4k')
+
+OUTLINE_WIDTHS = (0, 4, 8, 16, 32)
+FONT_SIZES = (60, 100, 200)
+BLUR_RADII = (5, 20, 60)
+
+# Timing stops after this many samples or seconds, whichever comes first
+DEFAULT_REPEAT = 20
+DEFAULT_MAX_SECONDS = 5.0
+MIN_SAMPLES = 3
+
+# Raster width of the editor's scene, which is built at preview scale
+PREVIEW_WIDTH = 640
+
+
+def _percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _rss_mb():
+    # Current resident set size; Linux only
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _reset_peak():
+    # Linux can reset the high-water mark, so setup allocations don't count
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def _scaled(size, value):
+    # Sizes in the cases are given for 720p and scale with the canvas height
+    return max(1, round(value * size[1] / 720))
+
+
+def _photo(size):
+    """A deterministic photo-like RGB image: smooth color plus grain."""
+    from .gradients import Gradient, render_gradient
+    base = render_gradient(Gradient(['#204080', '#e0a040', '#406020'], angle=30), size)
+    grain = Image.effect_noise(size, 40).convert('RGB')
+    return Image.blend(base.convert('RGB'), grain, 0.25)
+
+
+# -- cases ------------------------------------------------------------------
+# Each factory takes the canvas size and returns a zero-argument callable that
+# performs one timed iteration.
+
+def _text_case(outline_width, font_size):
+    def setup(size):
+        from .fonts import default_registry
+        from .scene import Scene, TextLayer
+        from .text_effects import TextEffectsEngine
+        engine = TextEffectsEngine()
+        scene = Scene(size, _photo(size), text_effects=engine)
+        scene.render()
+        px = _scaled(size, font_size)
+        default_registry().get_font('Arial', px, True, False)
+
+        def run():
+            # What "ADD TEXT" does with a new string: rasterize, add, recompose
+            engine.cache.clear()
+            layer = scene.add(TextLayer("EPIC MOMENT!", (_scaled(size, 40), _scaled(size, 200)),
+                                        size=px, outline_width=_scaled(size, outline_width)))
+            scene.render()
+            scene.remove(layer)
+            scene.render()
+        return run
+    return setup
+
+
+def _fit_setup(size):
+    import random
+    from .layout import TextFitter
+    from .render import text_box
+    words = ("the best worst ever tried every insane speedrun tutorial review ranked "
+             "epic fail win beginner guide secret nobody talks about this").split()
+    rng = random.Random(1)
+    fitter = TextFitter()
+    box = text_box('bottom', size, _scaled(size, 60))
+
+    def title():
+        return ' '.join(rng.choice(words) for _ in range(rng.randint(2, 14)))
+    fitter.fit(title(), box)
+
+    def run():
+        # A new title every run; face metrics stay warm as they do in a batch
+        fitter.fit(title(), box, max_size=_scaled(size, 160), outline_width=_scaled(size, 8))
+    return run
+
+
+def _gradient_case(kind, angle):
+    def setup(size):
+        from .gradients import Gradient, GradientRenderer
+        gradient = Gradient(['#1a0033', '#ff0066', '#ffcc00'], kind=kind, angle=angle)
+
+        def run():
+            GradientRenderer().render(gradient, size)
+        return run
+    return setup
+
+
+def _blur_case(radius, pyramid=True):
+    def setup(size):
+        from .blur import BlurPyramid
+        image = _photo(size)
+        r = _scaled(size, radius)
+        if pyramid:
+            return lambda: BlurPyramid(image).blur(r)
+        return lambda: image.filter(ImageFilter.GaussianBlur(r))
+    return setup
+
+
+def _ingest_case(fmt, fit):
+    def setup(size):
+        from .ingest import load_image
+        # A camera-sized source, about 24 megapixels; kept between runs
+        directory = os.path.join(tempfile.gettempdir(), 'thumbnail-bench')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"source-6000x4000-v{BASELINE_VERSION}.{fmt.lower()}")
+        if not os.path.exists(path):
+            _photo((6000, 4000)).save(path + '.tmp', fmt)
+            os.replace(path + '.tmp', path)
+        return lambda: load_image(path, size, fit)
+    return setup
+
+
+def _layer_map_setup(size):
+    from .layercache import LayerCache
+    # Its own directory: the shared layer cache is off while benchmarking
+    cache = LayerCache(os.path.join(tempfile.gettempdir(), 'thumbnail-bench', 'layers'))
+    key = cache.key('bench', size)
+    cache.put(key, _photo(size))
+    # A miss returns at once and would be timed as a very fast hit
+    if cache.get(key) is None:
+        raise RuntimeError(f"Layer cache in {cache.directory} did not store the benchmark layer")
+    return lambda: cache.get(key)
+
+
+def _preview_case(final):
+    def setup(size):
+        from .preview import scale_fast, scale_final
+        image = _photo(size)
+        scale = scale_final if final else scale_fast
+        return lambda: scale(image, (640, 360))
+    return setup
+
+
+def _sizes_case(mipmap):
+    # A text edit followed by every YouTube display size: a LANCZOS resize of
+    # the canvas per size, or the mipmap catching up and resampling its levels
+    def setup(size):
+        from .mipmap import DISPLAY_SIZES, MipmapPyramid
+        from .scene import Scene, TextLayer
+        scene = Scene(size, _photo(size))
+        layer = scene.add(TextLayer("READABLE?", (_scaled(size, 80), _scaled(size, 80)), size=_scaled(size, 100)))
+        pyramid = MipmapPyramid().sync(scene)
+
+        def run():
+            scene.move(layer, 1, 0)
+            canvas = scene.render()
+            if mipmap:
+                pyramid.sync(scene).views()
+            else:
+                for _, display in DISPLAY_SIZES:
+                    canvas.resize(display, Image.LANCZOS)
+        return run
+    return setup
+
+
+def _emoji_setup(size):
+    from .scene import Scene, StickerLayer
+    from .stickers import StickerCache
+    # In-memory atlases, emptied each run: the emoji is rasterized every time
+    # and nothing is written to the user's cache directory
+    stickers = StickerCache(directory=False)
+    scene = Scene(size, _photo(size))
+    scene.render()
+    px = _scaled(size, 150)
+
+    def run():
+        stickers.clear()
+        layer = scene.add(StickerLayer(stickers.emoji('\U0001F525', px), (px, px)))
+        scene.render()
+        scene.remove(layer)
+        scene.render()
+    return run
+
+
+def _compose_setup(size):
+    from .render import Renderer
+    renderer = Renderer()
+    spec = {'size': list(size), 'template': 'tutorial',
+            'layers': [{'type': 'text', 'position': 'bottom'}, {'type': 'shape', 'preset': 'arrow'},
+                       {'type': 'shape', 'preset': 'starburst'}]}
+    renderer.render(spec)
+    # Warm glyph caches, full recomposition
+    return lambda: renderer.render(spec)
+
+
+def _edit_case(preview):
+    # One text-size tick of a slider drag, each to a new size: the scene at
+    # preview scale (640 px wide whatever the layout size) or at full size
+    def setup(size):
+        from .render import Renderer
+        renderer = Renderer()
+        scale = PREVIEW_WIDTH / size[0] if preview else 1
+        scene = renderer.scene({'size': list(size), 'scale': scale, 'template': 'tutorial',
+                                'layers': [{'type': 'text', 'position': 'center', 'size': _scaled(size, 100)}]})
+        # The spec's own layer, above the template's title
+        layer = scene.layers_of('text')[-1]
+        scene.render()
+
+        def run():
+            scene.update(layer, size=layer.size + 1)
+            scene.render()
+        return run
+    return setup
+
+
+def _export_case(fmt, **options):
+    def setup(size):
+        from .export import encode
+        image = _photo(size)
+        return lambda: encode(image, fmt, **options)
+    return setup
+
+
+def _export_budget_setup(size):
+    from .export import YOUTUBE_MAX_BYTES, ExportEngine
+    engine = ExportEngine()
+    image = _photo(size)
+    return lambda: engine.export(image, YOUTUBE_MAX_BYTES)
+
+
+def cases():
+    """``{name: setup}`` for every benchmark."""
+    found = {}
+    for width in OUTLINE_WIDTHS:
+        for font_size in FONT_SIZES:
+            found[f"text.outline{width}.size{font_size}"] = _text_case(width, font_size)
+    found['layout.fit'] = _fit_setup
+    found['gradient.linear'] = _gradient_case('linear', 90)
+    found['gradient.angled'] = _gradient_case('linear', 30)
+    found['gradient.radial'] = _gradient_case('radial', 0)
+    for radius in BLUR_RADII:
+        found[f"blur.pyramid.r{radius}"] = _blur_case(radius)
+        found[f"blur.gaussian.r{radius}"] = _blur_case(radius, pyramid=False)
+    found['ingest.jpeg.cover'] = _ingest_case('JPEG', 'cover')
+    found['ingest.jpeg.contain'] = _ingest_case('JPEG', 'contain')
+    found['ingest.png.cover'] = _ingest_case('PNG', 'cover')
+    found['layers.map'] = _layer_map_setup
+    found['preview.fast'] = _preview_case(final=False)
+    found['preview.final'] = _preview_case(final=True)
+    found['preview.sizes.lanczos'] = _sizes_case(mipmap=False)
+    found['preview.sizes.mipmap'] = _sizes_case(mipmap=True)
+    found['emoji.add'] = _emoji_setup
+    found['compose.full'] = _compose_setup
+    found['edit.text.preview'] = _edit_case(preview=True)
+    found['edit.text.full'] = _edit_case(preview=False)
+    found['export.jpeg.q95'] = _export_case('JPEG', quality=95, optimize=True)
+    found['export.webp.q90'] = _export_case('WEBP', quality=90, method=4)
+    found['export.png'] = _export_case('PNG', compress_level=6)
+    found['export.budget'] = _export_budget_setup
+    return found
+
+
+# -- running -----------------------------------------------------------------
+
+def run_case(name, size, repeat=DEFAULT_REPEAT, max_seconds=DEFAULT_MAX_SECONDS):
+    """Time one case at ``size``; returns its result record."""
+    op = cases()[name](size)
+    op()  # warm-up: imports, lazily built tables
+    _reset_peak()
+    rss_before = _rss_mb()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < repeat and (len(samples) < MIN_SAMPLES or time.perf_counter() - started < max_seconds):
+        start = time.perf_counter()
+        op()
+        samples.append((time.perf_counter() - start) * 1000)
+    peak = _peak_mb()
+    return {
+        'case': name,
+        'size': list(size),
+        'samples': len(samples),
+        'min_ms': round(min(samples), 3),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'p50_ms': round(_percentile(samples, 50), 3),
+        'p90_ms': round(_percentile(samples, 90), 3),
+        'p99_ms': round(_percentile(samples, 99), 3),
+        'max_ms': round(max(samples), 3),
+        'peak_rss_mb': None if peak is None else round(peak, 1),
+        'added_mb': None if peak is None or rss_before is None else round(max(0.0, peak - rss_before), 1),
+    }
+
+
+def run(names, sizes, repeat=DEFAULT_REPEAT, max_seconds=DEFAULT_MAX_SECONDS, isolate=True, on_result=None):
+    results = {}
+    for size in sizes:
+        for name in names:
+            if isolate:
+                # A fresh process per case keeps peak RSS attributable
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    record = pool.submit(run_case, name, size, repeat, max_seconds).result()
+            else:
+                record = run_case(name, size, repeat, max_seconds)
+            results[f"{name}@{size[0]}x{size[1]}"] = record
+            if on_result is not None:
+                on_result(record)
+    return results
+
+
+def metadata():
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def save_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': BASELINE_VERSION, 'meta': metadata(), 'results': results}, f, indent=1)
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != BASELINE_VERSION:
+        raise ValueError(f"{path}: unsupported baseline version {data.get('version')}")
+    return data
+
+
+def compare(results, baseline, threshold=0.2, metric='p50_ms'):
+    """``(key, old, new, ratio, regressed)`` for cases present in both runs."""
+    rows = []
+    for key, record in results.items():
+        old = baseline['results'].get(key)
+        if old is None:
+            continue
+        ratio = record[metric] / old[metric] if old[metric] else float('inf')
+        rows.append((key, old[metric], record[metric], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def parse_size(text):
+    if text.lower() in SIZES:
+        return SIZES[text.lower()]
+    width, _, height = text.lower().partition('x')
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the thumbnail rendering stages.")
+    parser.add_argument('-k', dest='pattern', default='*',
+                        help="run cases matching this glob, e.g. 'text.*' (default: all)")
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES),
+                        help="comma-separated 720p, 1080p, 4k or WxH (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--max-seconds', type=float, default=DEFAULT_MAX_SECONDS,
+                        help="stop sampling a case after this long (at least %d samples)" % MIN_SAMPLES)
+    parser.add_argument('--in-process', action='store_true',
+                        help="skip the per-case worker process (faster, memory figures are cumulative)")
+    parser.add_argument('--save', metavar='PATH', help="write results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare p50 against a saved baseline")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="relative p50 slowdown counted as a regression (default: %(default)s)")
+    parser.add_argument('--list', action='store_true', help="list case names and exit")
+    args = parser.parse_args(argv)
+
+    names = [name for name in cases() if fnmatch.fnmatch(name, args.pattern)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+    if not names:
+        parser.error(f"no cases match {args.pattern!r}")
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s]
+    # Cases time the work itself, not reads of earlier results from disk
+    os.environ['THUMBNAIL_LAYER_CACHE_MB'] = '0'
+
+    print(f"{'case':<28} {'size':>10} {'n':>3} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'peak MB':>8} {'+MB':>7}")
+
+    def emit(r):
+        size = f"{r['size'][0]}x{r['size'][1]}"
+        peak = '' if r['peak_rss_mb'] is None else f"{r['peak_rss_mb']:.0f}"
+        added = '' if r['added_mb'] is None else f"{r['added_mb']:.1f}"
+        print(f"{r['case']:<28} {size:>10} {r['samples']:>3} {r['p50_ms']:>9.2f} {r['p90_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {peak:>8} {added:>7}", flush=True)
+
+    results = run(names, sizes, args.repeat, args.max_seconds, not args.in_process, emit)
+    if args.save:
+        save_baseline(args.save, results)
+
+    status = 0
+    if args.compare:
+        rows = compare(results, load_baseline(args.compare), args.threshold)
+        print(f"\n{'case':<40} {'base p50':>10} {'now p50':>10} {'ratio':>7}")
+        for key, old, new, ratio, regressed in rows:
+            print(f"{key:<40} {old:>10.2f} {new:>10.2f} {ratio:>7.2f}{'  REGRESSION' if regressed else ''}")
+        if any(row[4] for row in rows):
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
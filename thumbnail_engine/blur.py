@@ -0,0 +1,83 @@
+"""Large-radius Gaussian blur through an image pyramid.
+
+Blurring cost grows with the pixel count, and a wide blur throws away exactly
+the detail a smaller image cannot hold anyway.  So a radius-``r`` blur is done
+on the pyramid level ``2**k`` times smaller, with the radius scaled down to
+match, and the result is upsampled bilinearly.  ``k`` is chosen so the radius
+left at that level stays at least ``MIN_LEVEL_RADIUS`` pixels; below that the
+bilinear upsample would show, so small radii run at full resolution.
+
+The box-filtered downsample and the bilinear upsample each blur a little
+themselves; their variance is subtracted from the Gaussian applied at the
+level so the total matches a full-resolution ``GaussianBlur(r)``.
+
+A ``BlurPyramid`` keeps the reduced levels of one image and the last few
+blurred results, so dragging a radius control only blurs a small level.
+"""
+import math
+
+from PIL import Image, ImageFilter
+
+from .cache import LRUCache, image_weight
+
+# Smallest Gaussian radius (in level pixels) run on a reduced level
+MIN_LEVEL_RADIUS = 3.0
+MAX_LEVEL = 5
+
+
+def level_for_radius(radius, max_level=MAX_LEVEL):
+    """Pyramid level to blur ``radius`` at, and the radius to use there."""
+    level = 0
+    residual = radius
+    for k in range(1, max_level + 1):
+        scale = 2 ** k
+        # Variance of k box-halvings plus the bilinear upsample, in full-size pixels
+        inherent = (scale * scale - 1) / 12 + scale * scale / 6
+        if radius * radius <= inherent:
+            break
+        candidate = math.sqrt(radius * radius - inherent) / scale
+        if candidate < MIN_LEVEL_RADIUS:
+            break
+        level, residual = k, candidate
+    return level, residual
+
+
+class BlurPyramid:
+    """Reduced copies of one image, built lazily, plus cached blurs of it."""
+
+    def __init__(self, image, max_results=8):
+        self.image = image
+        self.levels = [image]
+        self.results = LRUCache(max_results, 4 * image_weight(image))
+
+    def level(self, k):
+        while len(self.levels) <= k:
+            previous = self.levels[-1]
+            if min(previous.size) < 2:
+                break
+            self.levels.append(previous.reduce(2))
+        return self.levels[min(k, len(self.levels) - 1)]
+
+    def blur(self, radius):
+        """``image`` blurred by ``radius``; the result is shared, don't draw on it."""
+        radius = round(float(radius), 1)
+        if radius <= 0:
+            return self.image
+        result = self.results.get(radius)
+        if result is None:
+            result = self._blur(radius)
+            self.results.put(radius, result, image_weight(result))
+        return result
+
+    def _blur(self, radius):
+        k, residual = level_for_radius(radius)
+        source = self.level(k)
+        blurred = source.filter(ImageFilter.GaussianBlur(residual)) if residual > 0 else source
+        if blurred.size == self.image.size:
+            return blurred
+        return blurred.resize(self.image.size, Image.BILINEAR)
+
+
+def fast_blur(image, radius):
+    """One-off pyramid blur of ``image`` (no caching)."""
+    return BlurPyramid(image, max_results=1).blur(radius)
@@ -0,0 +1,86 @@
+"""Small in-memory caches shared by the rendering subsystems."""
+from collections import OrderedDict
+import os
+import sys
+import threading
+
+
+class LRUCache:
+    """Bounded least-recently-used mapping.
+
+    ``max_entries`` caps the number of items; ``max_weight`` optionally caps the
+    sum of the weights passed to ``put`` (e.g. bytes of pixel data).
+    """
+
+    def __init__(self, max_entries=64, max_weight=None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, weight=0):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.weight -= old[1]
+            self._items[key] = (value, weight)
+            self.weight += weight
+            self._evict()
+        return value
+
+    def get_or_create(self, key, factory, weigh=None):
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value, weigh(value) if weigh else 0)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.weight = 0
+
+    def _evict(self):
+        while len(self._items) > self.max_entries or (
+            self.max_weight is not None and self.weight > self.max_weight and len(self._items) > 1
+        ):
+            _, (_, weight) = self._items.popitem(last=False)
+            self.weight -= weight
+
+
+def image_weight(image):
+    # Approximate decoded size in bytes
+    return image.width * image.height * len(image.getbands())
+
+
+def cache_dir(*parts):
+    """Per-user directory for on-disk caches, created on demand."""
+    root = os.environ.get('THUMBNAIL_CACHE_DIR')
+    if not root:
+        if sys.platform == 'win32':
+            base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        else:
+            base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        root = os.path.join(base, 'youtube-thumbnail-creator')
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,260 @@
+"""Size-budgeted export.
+
+Each format is searched for the best encoding that fits a byte budget:
+JPEG and WebP by a bracketed search over quality, PNG by trying lossless first
+and then palette quantization with fewer and fewer colors.  The format
+searches run concurrently (Pillow's encoders release the GIL) and encode
+into memory; only the winner is written out.  Candidates that fit are ranked
+by PSNR against the source, so formats compete on image quality rather than
+on their incomparable quality scales.
+
+Nothing here touches Tk::
+
+    result = export_image(scene.flatten(), 'thumb.jpg')
+    print('\\n'.join(result.report()))
+"""
+from concurrent.futures import ThreadPoolExecutor
+import io
+import math
+import os
+import time
+
+from PIL import Image, ImageChops, features
+
+from .profiling import span
+
+# YouTube rejects custom thumbnails larger than this
+YOUTUBE_MAX_BYTES = 2 * 1024 * 1024
+
+JPEG = 'JPEG'
+WEBP = 'WEBP'
+PNG = 'PNG'
+FORMATS = (JPEG, WEBP, PNG)
+
+EXTENSIONS = {JPEG: '.jpg', WEBP: '.webp', PNG: '.png'}
+
+MIN_QUALITY = 40
+MAX_QUALITY = 95
+PALETTE_SIZES = (256, 128, 64, 32)
+PNG_COMPRESS_LEVEL = 6
+PNG_OPTIMIZE_MARGIN = 1.1
+
+
+class Candidate:
+    """One in-memory encoding and what it cost."""
+
+    def __init__(self, format, options, data, seconds):
+        self.format = format
+        self.options = options
+        self.data = data
+        self.seconds = seconds
+        self.psnr = None
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def extension(self):
+        return EXTENSIONS[self.format]
+
+    def describe(self):
+        return ', '.join(f"{k}={v}" for k, v in sorted(self.options.items()))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+    def __repr__(self):
+        return f"<Candidate {self.format} {self.describe()} {self.size} bytes>"
+
+
+class ExportResult:
+    def __init__(self, best, candidates, budget, seconds):
+        self.best = best
+        self.candidates = candidates
+        self.budget = budget
+        self.seconds = seconds
+        self.path = None
+
+    @property
+    def fits(self):
+        return self.best is not None and self.best.size <= self.budget
+
+    def report(self):
+        lines = [f"{'format':<6} {'options':<34} {'bytes':>10} {'ms':>8} {'psnr':>7}"]
+        for c in self.candidates:
+            psnr = '' if c.psnr is None else ('inf' if math.isinf(c.psnr) else f"{c.psnr:.2f}")
+            mark = ' *' if c is self.best else ('' if c.size <= self.budget else ' over')
+            lines.append(f"{c.format:<6} {c.describe():<34} {c.size:>10} {c.seconds * 1000:>8.1f} {psnr:>7}{mark}")
+        lines.append(f"budget {self.budget} bytes, total {self.seconds * 1000:.1f} ms")
+        return lines
+
+    def save(self, path):
+        if self.best is None:
+            raise ValueError("Nothing was encoded to save")
+        self.best.save(path)
+        self.path = path
+        return path
+
+
+def encode(image, format, **options):
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    with span('export.encode', format=format):
+        image.save(buffer, format, **options)
+    return Candidate(format, options, buffer.getvalue(), time.perf_counter() - start)
+
+
+def psnr(image, data):
+    """Peak signal-to-noise ratio of encoded ``data`` against ``image``."""
+    with Image.open(io.BytesIO(data)) as decoded:
+        decoded = decoded.convert(image.mode)
+    histogram = ImageChops.difference(image, decoded).histogram()
+    squared = sum(count * (i % 256) ** 2 for i, count in enumerate(histogram))
+    mse = squared / (image.width * image.height * len(image.getbands()))
+    return math.inf if mse == 0 else 10 * math.log10(255 * 255 / mse)
+
+
+def available_formats(formats=FORMATS):
+    return tuple(f for f in formats if f != WEBP or features.check('webp'))
+
+
+class ExportEngine:
+    def __init__(self, max_workers=None, min_quality=MIN_QUALITY, max_quality=MAX_QUALITY):
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or len(FORMATS),
+                                           thread_name_prefix='export')
+
+    def export(self, image, budget=YOUTUBE_MAX_BYTES, formats=FORMATS):
+        """Search ``formats`` in parallel; return an ``ExportResult``.
+
+        ``best`` is the highest-PSNR candidate within ``budget``, or the
+        smallest candidate overall if nothing fits.
+        """
+        start = time.perf_counter()
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        searches = {JPEG: self._search_quality, WEBP: self._search_quality, PNG: self._search_png}
+        # Image.save stores its options on the image, so every search gets its own copy
+        futures = [self.executor.submit(searches[f], image.copy(), f, budget)
+                   for f in available_formats(formats)]
+        candidates = []
+        for future in futures:
+            candidates.extend(future.result())
+
+        # Within a format a weaker probe cannot win, so only each format's
+        # best fitting encoding is decoded and scored
+        best_fitting = {}
+        for c in candidates:
+            if c.size <= budget:
+                current = best_fitting.get(c.format)
+                if current is None or _fidelity(c) > _fidelity(current):
+                    best_fitting[c.format] = c
+        fitting = list(best_fitting.values())
+        if len(fitting) > 1:
+            for c in fitting:
+                c.psnr = psnr(image, c.data)
+        if fitting:
+            best = max(fitting, key=lambda c: (c.psnr or 0, -c.size))
+        else:
+            best = min(candidates, key=lambda c: c.size) if candidates else None
+        return ExportResult(best, candidates, budget, time.perf_counter() - start)
+
+    def _search_quality(self, image, format, budget):
+        options = {'optimize': True} if format == JPEG else {'method': 4}
+
+        def probe(quality):
+            candidate = encode(image, format, quality=quality, **options)
+            tried.append(candidate)
+            return candidate.size
+
+        tried = []
+        high, high_size = self.max_quality, probe(self.max_quality)
+        if high_size <= budget:
+            return tried
+        low, low_size = self.min_quality, probe(self.min_quality)
+        if low_size > budget:
+            return tried
+        # Highest quality that fits, between a fitting ``low`` and an
+        # oversized ``high``.  Size is close to exponential in quality, so
+        # interpolating on log(size) usually lands within a step or two;
+        # clamping to the inner third keeps the worst case near bisection.
+        while high - low > 1:
+            t = (math.log(budget) - math.log(low_size)) / (math.log(high_size) - math.log(low_size))
+            third = max(1, (high - low) // 3)
+            quality = min(high - third, max(low + third, round(low + t * (high - low))))
+            size = probe(quality)
+            if size <= budget:
+                low, low_size = quality, size
+            else:
+                high, high_size = quality, size
+        return tried
+
+    def _search_png(self, image, format, budget):
+        # zlib level 9 (optimize) is several times slower than the default
+        # for a few percent, so it is only tried when that could make it fit
+        tried = [encode(image, PNG, compress_level=PNG_COMPRESS_LEVEL)]
+        if tried[-1].size <= budget:
+            return tried
+        if tried[-1].size <= budget * PNG_OPTIMIZE_MARGIN:
+            tried.append(encode(image, PNG, optimize=True))
+            if tried[-1].size <= budget:
+                return tried
+        for colors in PALETTE_SIZES:
+            start = time.perf_counter()
+            quantized = image.quantize(colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.FLOYDSTEINBERG)
+            candidate = encode(quantized, PNG, optimize=True)
+            candidate.options['colors'] = colors
+            candidate.seconds = time.perf_counter() - start
+            tried.append(candidate)
+            if candidate.size <= budget:
+                break
+        return tried
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def formats_for_path(path):
+    """Formats implied by ``path``'s extension, or all of them if unknown."""
+    ext = os.path.splitext(path)[1].lower()
+    registered = Image.registered_extensions()
+    if ext in registered and registered[ext] in FORMATS:
+        return (registered[ext],)
+    return FORMATS
+
+
+_default_engine = None
+
+
+def default_engine():
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = ExportEngine()
+    return _default_engine
+
+
+def _fidelity(candidate):
+    # Higher is closer to the source: lossless PNG, then palette size or quality
+    options = candidate.options
+    return (options.get('quality', options.get('colors', math.inf)), -candidate.size)
+
+
+def export_image(image, path, budget=YOUTUBE_MAX_BYTES):
+    """Encode ``image`` within ``budget`` in the format ``path`` names and write it.
+
+    If the extension is not a known format, every format is searched and the
+    winner's extension is appended.  Returns the ``ExportResult``; the path
+    written is ``result.path``.  Raises ``ValueError`` if this Pillow build
+    can encode none of the formats (e.g. a ``.webp`` path without WebP).
+    """
+    formats = formats_for_path(path)
+    if not available_formats(formats):
+        raise ValueError(f"No supported format for {path}")
+    result = default_engine().export(image, budget, formats)
+    if len(formats) > 1:
+        path += result.best.extension
+    result.save(path)
+    return result
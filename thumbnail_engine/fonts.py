@@ -0,0 +1,239 @@
+"""Font discovery and a bounded cache of loaded faces.
+
+The system font directories are scanned once and every face is indexed by
+(family, bold, italic).  The index is persisted next to the other caches and
+only files whose size or mtime changed are re-parsed on the next start.
+Loaded ``FreeTypeFont`` objects live in an LRU keyed by (face, size).
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+
+from PIL import ImageFont
+
+from .cache import LRUCache, cache_dir
+from .profiling import span
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+INDEX_VERSION = 1
+
+# Used when the requested family is not installed (e.g. "Arial" on Linux)
+FALLBACK_FAMILIES = ['Arial', 'Helvetica', 'Liberation Sans', 'DejaVu Sans', 'Noto Sans', 'FreeSans']
+
+BOLD_WORDS = ('bold', 'black', 'heavy')
+ITALIC_WORDS = ('italic', 'oblique')
+
+
+def system_font_dirs():
+    home = os.path.expanduser('~')
+    if sys.platform == 'win32':
+        windir = os.environ.get('WINDIR', r'C:\Windows')
+        dirs = [os.path.join(windir, 'Fonts')]
+        local = os.environ.get('LOCALAPPDATA')
+        if local:
+            dirs.append(os.path.join(local, 'Microsoft', 'Windows', 'Fonts'))
+    elif sys.platform == 'darwin':
+        dirs = ['/System/Library/Fonts', '/Library/Fonts', os.path.join(home, 'Library', 'Fonts')]
+    else:
+        dirs = ['/usr/share/fonts', '/usr/local/share/fonts',
+                os.path.join(home, '.fonts'), os.path.join(home, '.local', 'share', 'fonts')]
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def parse_style(style):
+    style = style.lower()
+    return any(w in style for w in BOLD_WORDS), any(w in style for w in ITALIC_WORDS)
+
+
+class FontFace:
+    """One face inside a font file."""
+
+    __slots__ = ('path', 'index', 'family', 'style', 'bold', 'italic')
+
+    def __init__(self, path, index, family, style):
+        self.path = path
+        self.index = index
+        self.family = family
+        self.style = style
+        self.bold, self.italic = parse_style(style)
+
+    @property
+    def key(self):
+        return (self.path, self.index)
+
+    def __repr__(self):
+        return f"FontFace({self.family!r}, {self.style!r}, {self.path!r}#{self.index})"
+
+
+class FontRegistry:
+    def __init__(self, font_dirs=None, index_path=None, max_loaded=32):
+        self.font_dirs = font_dirs if font_dirs is not None else system_font_dirs()
+        self.index_path = index_path
+        self.loaded = LRUCache(max_loaded)
+        self._faces = None
+        self._by_family = {}
+        self._lock = threading.Lock()
+
+    # -- discovery ---------------------------------------------------------
+
+    def scan(self, force=False):
+        """Build the (family, bold, italic) index, reusing the on-disk copy."""
+        with self._lock:
+            if self._faces is not None and not force:
+                return self._faces
+
+            index_path = self.index_path
+            if index_path is None:
+                try:
+                    # One index per directory set so custom registries don't clobber it
+                    digest = hashlib.sha1('\n'.join(self.font_dirs).encode('utf-8')).hexdigest()[:12]
+                    index_path = os.path.join(cache_dir(), f'font-index-{digest}.json')
+                except OSError:
+                    index_path = None
+            previous = {} if force or index_path is None else _read_index(index_path)
+            files = {}
+            changed = False
+            for path in _walk_fonts(self.font_dirs):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entry = previous.get(path)
+                if entry is None or entry['mtime'] != st.st_mtime or entry['size'] != st.st_size:
+                    entry = {'mtime': st.st_mtime, 'size': st.st_size, 'faces': _read_faces(path)}
+                    changed = True
+                files[path] = entry
+            if index_path is not None and (changed or set(files) != set(previous)):
+                _write_index(index_path, files)
+
+            faces = []
+            for path, entry in files.items():
+                faces.extend(FontFace(path, index, family, style) for index, family, style in entry['faces'])
+            self._faces = faces
+            self._by_family = {}
+            for face in faces:
+                self._by_family.setdefault(face.family.lower(), []).append(face)
+            return faces
+
+    def families(self):
+        self.scan()
+        return sorted({face.family for face in self._faces}, key=str.lower)
+
+    def find(self, family, bold=False, italic=False, fallback=True):
+        """Return the best installed face for the request, or None.
+
+        Unless ``fallback`` is false, a missing family is replaced by the
+        first installed one of ``FALLBACK_FAMILIES``.
+        """
+        self.scan()
+        candidates = self._by_family.get(family.lower())
+        if not candidates and fallback:
+            for family_name in FALLBACK_FAMILIES:
+                candidates = self._by_family.get(family_name.lower())
+                if candidates:
+                    break
+        if not candidates:
+            return None
+        # Exact style first, then keep whichever attribute still matches
+        return min(candidates, key=lambda f: (
+            (f.bold != bold) + (f.italic != italic),
+            f.italic != italic,
+            len(f.style),
+        ))
+
+    # -- loading -----------------------------------------------------------
+
+    def get_font(self, family, size, bold=False, italic=False):
+        """Load a face at ``size``; falls back to Pillow's default font."""
+        size = int(size)
+        if os.path.isfile(family):
+            key = ((family, 0), size)
+        else:
+            face = self.find(family, bold, italic)
+            if face is None:
+                return _default_font(size)
+            key = (face.key, size)
+        font = self.loaded.get(key)
+        if font is None:
+            (path, index), _ = key
+            try:
+                with span('font.load'):
+                    font = ImageFont.truetype(path, size, index=index)
+            except OSError:
+                return _default_font(size)
+            self.loaded.put(key, font)
+        return font
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def default_registry():
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = FontRegistry()
+        return _default_registry
+
+
+def get_font(family, size, bold=False, italic=False):
+    return default_registry().get_font(family, size, bold, italic)
+
+
+def _default_font(size):
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1 has no scalable default font
+        return ImageFont.load_default()
+
+
+def _walk_fonts(dirs):
+    seen = set()
+    for root_dir in dirs:
+        for root, _, names in os.walk(root_dir):
+            for name in names:
+                if name.lower().endswith(FONT_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    if path not in seen:
+                        seen.add(path)
+                        yield path
+
+
+def _read_faces(path):
+    faces = []
+    index = 0
+    while True:
+        try:
+            family, style = ImageFont.truetype(path, 12, index=index).getname()
+        except (OSError, ValueError):
+            break
+        faces.append((index, family or os.path.splitext(os.path.basename(path))[0], style or 'Regular'))
+        if not path.lower().endswith('.ttc'):
+            break
+        index += 1
+    return faces
+
+
+def _read_index(path):
+    try:
+        with open(path, encoding='utf-8') as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != INDEX_VERSION:
+        return {}
+    return data.get('files', {})
+
+
+def _write_index(path, files):
+    tmp = path + '.tmp'
+    try:
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump({'version': INDEX_VERSION, 'files': files}, fh)
+        os.replace(tmp, path)
+    except OSError:
+        pass
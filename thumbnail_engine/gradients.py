@@ -0,0 +1,217 @@
+"""Vectorized gradient fills.
+
+A gradient is rendered as an 8-bit ramp image (``t`` from 0 to 255) built with
+whole-image operations (``Image.linear_gradient``/``radial_gradient``, resize,
+rotate), then colorized in a single ``Image.point`` pass through a lookup
+table interpolated from the color stops.  Rendered gradients are memoized by
+spec and size, in memory and in the persistent layer cache.
+"""
+import math
+
+from PIL import Image, ImageColor
+
+from .cache import LRUCache, image_weight
+from .layercache import cached_layer
+from .profiling import span
+
+LINEAR = 'linear'
+RADIAL = 'radial'
+
+RADIAL_EDGE = 255 / 181
+# Clamp margin on either side of the 256px ramp sampled by linear gradients
+RAMP_PAD = 4
+# Angled linear and radial ramps are sampled on grids this many times coarser
+LINEAR_STEP = 8
+RADIAL_STEP = 4
+
+
+class Gradient:
+    """Declarative gradient description.
+
+    ``stops`` is a list of colors (spaced evenly) or ``(position, color)``
+    pairs with positions in 0..1.  ``angle`` is in degrees, clockwise from the
+    positive x axis, so 0 runs left to right and 90 top to bottom.  Radial
+    gradients grow from ``center`` (fractions of the canvas) out to ``radius``
+    (a fraction of the canvas diagonal; default reaches the farthest corner).
+    """
+
+    def __init__(self, stops, kind=LINEAR, angle=90, center=(0.5, 0.5), radius=None):
+        if kind not in (LINEAR, RADIAL):
+            raise ValueError(f"Unknown gradient kind: {kind}")
+        if len(stops) < 2:
+            raise ValueError("A gradient needs at least two stops")
+        self.kind = kind
+        self.angle = float(angle) % 360
+        self.center = (float(center[0]), float(center[1]))
+        self.radius = None if radius is None else float(radius)
+        self.stops = _normalize_stops(stops)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['stops'], kind=data.get('kind', LINEAR), angle=data.get('angle', 90),
+                   center=tuple(data.get('center', (0.5, 0.5))), radius=data.get('radius'))
+
+    def to_dict(self):
+        data = {'kind': self.kind,
+                'stops': [[pos, '#' + ''.join('%02x' % c for c in color)] for pos, color in self.stops]}
+        if self.kind == LINEAR:
+            data['angle'] = self.angle
+        else:
+            data['center'] = list(self.center)
+            if self.radius is not None:
+                data['radius'] = self.radius
+        return data
+
+    @property
+    def key(self):
+        if self.kind == LINEAR:
+            return (LINEAR, self.angle, self.stops)
+        return (RADIAL, self.center, self.radius, self.stops)
+
+    @property
+    def mode(self):
+        return 'RGBA' if any(len(color) == 4 for _, color in self.stops) else 'RGB'
+
+    def __eq__(self, other):
+        return isinstance(other, Gradient) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"Gradient({self.to_dict()!r})"
+
+
+class GradientRenderer:
+    def __init__(self, max_entries=16, max_bytes=128 * 1024 * 1024):
+        self.cache = LRUCache(max_entries, max_bytes)
+
+    def render(self, gradient, size):
+        """Return the gradient at ``size``.
+
+        The image is shared through the cache: ``copy()`` it before drawing.
+        """
+        key = gradient_key(gradient, size)
+        image = self.cache.get(key)
+        if image is None:
+            image = cached_layer(key, lambda: self._render(gradient, size))
+            self.cache.put(key, image, image_weight(image))
+        return image
+
+    def _render(self, gradient, size):
+        with span('gradient.render'):
+            return colorize(ramp(gradient, size), gradient)
+
+
+def gradient_key(gradient, size):
+    """Identifies ``gradient`` rendered at ``size`` (also in the layer cache)."""
+    return ('gradient', gradient.key, tuple(size))
+
+
+def ramp(gradient, size):
+    """The gradient parameter ``t`` as an ``L`` image (0 at the first stop)."""
+    width, height = size
+    if gradient.kind == LINEAR:
+        return _linear_ramp(gradient.angle, width, height)
+    return _radial_ramp(gradient.center, gradient.radius, width, height)
+
+
+def colorize(ramp_image, gradient):
+    # The stop LUT becomes the palette of the ramp, so the conversion to
+    # RGB(A) is a single pass over the pixels
+    mode = gradient.mode
+    palette = [v for i in range(256) for v in _interpolate(gradient.stops, i / 255)]
+    indexed = ramp_image.copy()
+    indexed.putpalette(palette, rawmode=mode)
+    return indexed.convert(mode)
+
+
+def _linear_ramp(angle, width, height):
+    if angle in (0.0, 180.0):
+        row = _ramp_row(width)
+        ramp_image = row.resize((width, height), Image.NEAREST)
+        return ramp_image if angle == 0.0 else ramp_image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    if angle in (90.0, 270.0):
+        column = _ramp_row(height).transpose(Image.Transpose.TRANSPOSE)
+        ramp_image = column.resize((width, height), Image.NEAREST)
+        return ramp_image if angle == 90.0 else ramp_image.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+
+    # t is affine in (x, y): one AFFINE transform samples the ramp row for
+    # every pixel of a reduced grid, and bilinear upsampling reproduces an
+    # affine function exactly, so the full-size ramp is one resize away.
+    small_w = max(2, -(-width // LINEAR_STEP))
+    small_h = max(2, -(-height // LINEAR_STEP))
+    theta = math.radians(angle)
+    dx, dy = math.cos(theta), math.sin(theta)
+    scale = 255 / (abs(small_w * dx) + abs(small_h * dy))
+    a, b = dx * scale, dy * scale
+    c = RAMP_PAD + 128 - (small_w / 2 * a + small_h / 2 * b)
+    row = Image.new('L', (256 + 2 * RAMP_PAD, 1), 0)
+    row.paste(_ramp_row(256), (RAMP_PAD, 0))
+    row.paste(255, (256 + RAMP_PAD, 0, row.width, 1))
+    small = row.transform((small_w, small_h), Image.AFFINE, (a, b, c, 0, 0, 0.5), Image.BILINEAR)
+    return small.resize((width, height), Image.BILINEAR)
+
+
+def _ramp_row(length):
+    row = Image.linear_gradient('L').transpose(Image.Transpose.ROTATE_90).crop((0, 0, 256, 1))
+    return row if length == 256 else row.resize((length, 1), Image.BILINEAR)
+
+
+def _radial_ramp(center, radius, width, height):
+    # Built on a coarser grid like angled linear ramps; the distance field is
+    # smooth enough away from the center that bilinear upsampling is exact to
+    # within a level.
+    small_w = max(2, -(-width // RADIAL_STEP))
+    small_h = max(2, -(-height // RADIAL_STEP))
+    cx, cy = center[0] * small_w, center[1] * small_h
+    if radius is None:
+        r = max(math.hypot(x - cx, y - cy) for x in (0, small_w) for y in (0, small_h))
+    else:
+        r = radius * math.hypot(small_w, small_h)
+    r = max(1, int(round(r)))
+    small = Image.new('L', (small_w, small_h), 255)
+    # radial_gradient() only reaches 255 in its corners (value = 255 * d / 181);
+    # rescale so the inscribed circle is the full 0..255 ramp
+    disc = Image.radial_gradient('L').point(lambda v: min(255, round(v * RADIAL_EDGE)))
+    disc = disc.resize((2 * r, 2 * r), Image.BILINEAR)
+    small.paste(disc, (int(round(cx)) - r, int(round(cy)) - r))
+    return small.resize((width, height), Image.BILINEAR)
+
+
+def _normalize_stops(stops):
+    pairs = []
+    for i, stop in enumerate(stops):
+        # Color tuples have 3 or 4 entries, so a 2-sequence is (position, color)
+        if isinstance(stop, (list, tuple)) and len(stop) == 2:
+            pos, color = stop
+        else:
+            pos, color = i / (len(stops) - 1), stop
+        if isinstance(color, str):
+            color = ImageColor.getrgb(color)
+        pairs.append((min(1.0, max(0.0, float(pos))), tuple(int(c) for c in color)))
+    pairs.sort(key=lambda p: p[0])
+    if any(len(color) == 4 for _, color in pairs):
+        pairs = [(pos, color if len(color) == 4 else color + (255,)) for pos, color in pairs]
+    return tuple(pairs)
+
+
+def _interpolate(stops, t):
+    if t <= stops[0][0]:
+        return stops[0][1]
+    for (p0, c0), (p1, c1) in zip(stops, stops[1:]):
+        if t <= p1:
+            f = 0.0 if p1 == p0 else (t - p0) / (p1 - p0)
+            return tuple(int(round(a + (b - a) * f)) for a, b in zip(c0, c1))
+    return stops[-1][1]
+
+
+_default_renderer = None
+
+
+def render_gradient(gradient, size):
+    """Render through the shared, memoizing renderer."""
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = GradientRenderer()
+    return _default_renderer.render(gradient, size)
@@ -0,0 +1,281 @@
+"""Undo/redo history that stores only the tiles an operation changed.
+
+Each step keeps the before and after pixels of the changed tiles of the
+composite, zlib-compressed, plus a structural snapshot of the scene.  Undo and
+redo paste those tiles back, so their cost scales with the size of the edit
+rather than the canvas.  The total compressed size is held under a byte
+budget by dropping the oldest steps.
+"""
+from contextlib import contextmanager
+import zlib
+
+from PIL import Image
+
+from .profiling import span
+from .scene import Background, SceneState, intersect
+
+TILE_SIZE = 64
+COMPRESS_LEVEL = 1
+
+
+class TileDiff:
+    """Compressed before/after pixels for the tiles that differ."""
+
+    def __init__(self, mode, tiles):
+        self.mode = mode
+        self.tiles = tiles  # [(box, before_bytes, after_bytes)]
+
+    @property
+    def nbytes(self):
+        return sum(len(before) + len(after) for _, before, after in self.tiles)
+
+    @property
+    def boxes(self):
+        return [box for box, _, _ in self.tiles]
+
+    def apply(self, apply_tile, which):
+        index = 1 if which == 'before' else 2
+        for tile in self.tiles:
+            box = tile[0]
+            size = (box[2] - box[0], box[3] - box[1])
+            apply_tile(Image.frombytes(self.mode, size, zlib.decompress(tile[index])), box)
+
+
+def tile_boxes(size, regions, tile_size=TILE_SIZE):
+    """Grid-aligned tiles covering ``regions`` (each tile yielded once)."""
+    width, height = size
+    seen = set()
+    for region in regions:
+        region = intersect(region, (0, 0, width, height))
+        if region is None:
+            continue
+        for ty in range(region[1] // tile_size, (region[3] - 1) // tile_size + 1):
+            for tx in range(region[0] // tile_size, (region[2] - 1) // tile_size + 1):
+                if (tx, ty) in seen:
+                    continue
+                seen.add((tx, ty))
+                x, y = tx * tile_size, ty * tile_size
+                yield (x, y, min(x + tile_size, width), min(y + tile_size, height))
+
+
+def grab_tiles(image, boxes):
+    return [(box, image.crop(box).tobytes()) for box in boxes]
+
+
+def diff_tiles(mode, before_tiles, after_image):
+    tiles = []
+    for box, before in before_tiles:
+        after = after_image.crop(box).tobytes()
+        if after != before:
+            tiles.append((box, zlib.compress(before, COMPRESS_LEVEL), zlib.compress(after, COMPRESS_LEVEL)))
+    return TileDiff(mode, tiles)
+
+
+class PackedBackground:
+    """A compressed stand-in for an image background held only by history."""
+
+    def __init__(self, background):
+        image = background.source
+        self.mode = image.mode
+        self.size = image.size
+        self.adjustments = background.adjustments
+        self.blur = background.blur
+        self.data = zlib.compress(image.tobytes(), COMPRESS_LEVEL)
+
+    @property
+    def nbytes(self):
+        return len(self.data)
+
+    def unpack(self):
+        image = Image.frombytes(self.mode, self.size, zlib.decompress(self.data))
+        return Background(image, self.adjustments, self.blur)
+
+
+class HistoryEntry:
+    def __init__(self, label, diff, before, after):
+        self.label = label
+        self.diff = diff
+        self.before = before
+        self.after = after
+
+    @property
+    def nbytes(self):
+        total = self.diff.nbytes
+        for state in (self.before, self.after):
+            if isinstance(state.background, PackedBackground):
+                total += state.background.nbytes
+        return total
+
+
+class History:
+    """Undo/redo stacks of ``HistoryEntry`` objects under a byte budget."""
+
+    def __init__(self, budget_bytes=32 * 1024 * 1024, max_entries=200):
+        self.budget_bytes = budget_bytes
+        self.max_entries = max_entries
+        self.undo_stack = []
+        self.redo_stack = []
+        self.memory_used = 0
+
+    def push(self, entry):
+        for dropped in self.redo_stack:
+            self.memory_used -= dropped.nbytes
+        self.redo_stack = []
+        self.undo_stack.append(entry)
+        self.memory_used += entry.nbytes
+        self._evict()
+
+    def pop_undo(self):
+        entry = self.undo_stack.pop()
+        self.redo_stack.append(entry)
+        return entry
+
+    def pop_redo(self):
+        entry = self.redo_stack.pop()
+        self.undo_stack.append(entry)
+        return entry
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def set_budget(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._evict()
+
+    def stats(self):
+        return {
+            'undo_steps': len(self.undo_stack),
+            'redo_steps': len(self.redo_stack),
+            'memory_used': self.memory_used,
+            'budget_bytes': self.budget_bytes,
+        }
+
+    def _evict(self):
+        # Oldest undo steps go first; the most recent step is always kept
+        while self.undo_stack and (self.memory_used > self.budget_bytes or
+                                   len(self.undo_stack) + len(self.redo_stack) > self.max_entries):
+            if len(self.undo_stack) == 1 and not self.redo_stack:
+                break
+            if len(self.undo_stack) > 1 or not self.redo_stack:
+                dropped = self.undo_stack.pop(0)
+            else:
+                dropped = self.redo_stack.pop(0)
+            self.memory_used -= dropped.nbytes
+
+
+class SceneHistory:
+    """Records scene edits into a ``History`` and plays them back."""
+
+    def __init__(self, scene, history=None, tile_size=TILE_SIZE):
+        self.scene = scene
+        self.history = history or History()
+        self.tile_size = tile_size
+        self._open = None
+
+    @contextmanager
+    def record(self, label):
+        """Wrap one user operation::
+
+            with scene_history.record("Add text"):
+                scene.add(layer)
+
+        If the block raises, the scene is rolled back to where it started
+        and no step is recorded.
+        """
+        scene = self.scene
+        scene.render()
+        before = scene.snapshot()
+        try:
+            yield
+        except BaseException:
+            scene.restore(before)
+            raise
+        # The composite still holds the old pixels until the next render, so
+        # the "before" tiles are read from it only where the edit landed.
+        boxes = tile_boxes(scene.size, scene.dirty, self.tile_size)
+        self._push(label, before, grab_tiles(scene.canvas, boxes))
+
+    @property
+    def is_open(self):
+        return self._open is not None
+
+    def begin(self, label):
+        """Start a continuous edit such as a slider drag.
+
+        Intermediate renders are not recorded; ``commit`` stores one step for
+        the whole gesture.
+        """
+        if self._open is not None:
+            return
+        scene = self.scene
+        scene.render()
+        self._open = (label, scene.snapshot(), scene.canvas.copy())
+
+    def commit(self):
+        if self._open is None:
+            return
+        label, before, before_image = self._open
+        self._open = None
+        self.scene.render()
+        changed = [(0, 0) + self.scene.size] if not _same_state(before, self.scene.snapshot()) else []
+        self._push(label, before, grab_tiles(before_image, tile_boxes(self.scene.size, changed, self.tile_size)))
+
+    def _push(self, label, before, before_tiles):
+        composite = self.scene.render()
+        after = self.scene.snapshot()
+        with span('history.diff'):
+            diff = diff_tiles(composite.mode, before_tiles, composite)
+        if not diff.tiles and _same_state(before, after):
+            return
+        if before.background is not after.background:
+            before.background.release()
+        if before.background.source is not after.background.source:
+            # Only a replaced source image needs its own copy; adjustment
+            # changes share the source with the neighbouring steps
+            before = _pack_background(before)
+            after = _pack_background(after)
+        self.history.push(HistoryEntry(label, diff, before, after))
+
+    def undo(self):
+        self.commit()
+        if not self.history.can_undo():
+            return None
+        entry = self.history.pop_undo()
+        self._apply(entry, 'before', entry.before)
+        return entry.label
+
+    def redo(self):
+        if not self.history.can_redo():
+            return None
+        entry = self.history.pop_redo()
+        self._apply(entry, 'after', entry.after)
+        return entry.label
+
+    def _apply(self, entry, which, state):
+        scene = self.scene
+        scene.render()
+        if isinstance(state.background, PackedBackground):
+            state = SceneState(state.background.unpack(), state.layers)
+        previous = scene.background
+        scene.restore(state, mark_dirty=False)
+        if scene.background is not previous:
+            previous.release()
+        entry.diff.apply(scene.patch, which)
+
+    @property
+    def memory_used(self):
+        return self.history.memory_used
+
+
+def _same_state(a, b):
+    return a.background is b.background and a.layers == b.layers
+
+
+def _pack_background(state):
+    background = state.background
+    if isinstance(background, Background) and isinstance(background.source, Image.Image):
+        return SceneState(PackedBackground(background), state.layers)
+    return state
@@ -0,0 +1,178 @@
+"""Background image ingest.
+
+Photos are decoded at close to the size they will be shown at: JPEGs through
+``Image.draft`` (the decoder skips DCT detail in 1/2, 1/4 or 1/8 steps) and
+everything else through ``resize``'s ``reducing_gap``, which box-reduces by an
+integer factor before the final LANCZOS pass.  EXIF orientation is applied,
+and the result is fitted to the target without distorting it:
+
+``cover``
+    scale to fill the target and crop the overflow (the default)
+``contain``
+    scale to fit inside the target and pad with ``fill``
+``crop``
+    keep pixels 1:1 and cut the target out of the image, padding if smaller
+
+Fitted images are memoized by (path, mtime, target size, fit), so loading the
+same photo for several templates or batch variants decodes it once, and are
+kept in the persistent layer cache (see ``layercache``) so other processes
+and later sessions map the fitted pixels instead of decoding again.  An
+``ImageFile`` names a photo without decoding it, for backgrounds that are
+drawn at more than one size (a preview and a full-resolution export).
+"""
+import math
+import os
+
+from PIL import Image, ImageOps
+
+from .cache import LRUCache, image_weight
+from .layercache import cached_layer
+from .profiling import span
+
+COVER = 'cover'
+CONTAIN = 'contain'
+CROP = 'crop'
+FIT_MODES = (COVER, CONTAIN, CROP)
+
+# Let resize box-reduce until the image is within this factor of the target
+REDUCING_GAP = 2.0
+
+# EXIF orientations that swap width and height
+_TRANSPOSED = (5, 6, 7, 8)
+
+
+class ImageIngest:
+    def __init__(self, max_entries=16, max_bytes=256 * 1024 * 1024):
+        self.cache = LRUCache(max_entries, max_bytes)
+
+    def load(self, path, size, fit=COVER, focus=(0.5, 0.5), fill='#000000'):
+        """Decode ``path`` fitted to ``size`` as an RGB image.
+
+        The image is shared through the cache: ``copy()`` it before drawing.
+        Read back from the layer cache it is RGBX, the same pixels mapped.
+        """
+        key = fit_key(path, size, fit, focus, fill)
+        image = self.cache.get(key)
+        if image is None:
+            image = cached_layer(key, lambda: self._decode(key[1], size, fit, focus, fill))
+            self.cache.put(key, image, image_weight(image))
+        return image
+
+    def _decode(self, path, size, fit, focus, fill):
+        with span('ingest.decode'):
+            return load_image(path, size, fit, focus, fill)
+
+
+def fit_key(path, size, fit=COVER, focus=(0.5, 0.5), fill='#000000'):
+    """Identifies ``path`` fitted to ``size``, including the file's mtime and size."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return ('fit', path, stat.st_mtime_ns, stat.st_size, tuple(size), fit, tuple(focus), fill)
+
+
+class ImageFile:
+    """A background photo by path, decoded at whatever size it is drawn."""
+
+    def __init__(self, path, fit=COVER, focus=(0.5, 0.5), fill='#000000'):
+        if fit not in FIT_MODES:
+            raise ValueError(f"Unknown fit mode: {fit}")
+        self.path = os.path.abspath(path)
+        self.fit = fit
+        self.focus = tuple(focus)
+        self.fill = fill
+
+    def load(self, size):
+        return load_background(self.path, size, self.fit, self.focus, self.fill)
+
+    def layer_key(self, size):
+        return fit_key(self.path, size, self.fit, self.focus, self.fill)
+
+    def _key(self):
+        return (self.path, self.fit, self.focus, self.fill)
+
+    def __eq__(self, other):
+        return isinstance(other, ImageFile) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"ImageFile({self.path!r}, {self.fit!r})"
+
+
+def load_image(path, size, fit=COVER, focus=(0.5, 0.5), fill='#000000'):
+    """Uncached ingest of one file; see ``ImageIngest.load``."""
+    if fit not in FIT_MODES:
+        raise ValueError(f"Unknown fit mode: {fit}")
+    with Image.open(path) as image:
+        if fit != CROP:
+            _draft(image, size, fit)
+        image = ImageOps.exif_transpose(image)
+        return fit_image(_flatten(image, fill), size, fit, focus, fill)
+
+
+def fit_image(image, size, fit=COVER, focus=(0.5, 0.5), fill='#000000'):
+    """Fit an already decoded RGB image to ``size``."""
+    width, height = size
+    if image.size == (width, height):
+        return image
+    if fit == COVER:
+        scale = max(width / image.width, height / image.height)
+        crop_w, crop_h = width / scale, height / scale
+        left = (image.width - crop_w) * focus[0]
+        top = (image.height - crop_h) * focus[1]
+        return image.resize((width, height), Image.LANCZOS,
+                            box=(left, top, left + crop_w, top + crop_h), reducing_gap=REDUCING_GAP)
+    if fit == CONTAIN:
+        scale = min(width / image.width, height / image.height)
+        inner = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        canvas = Image.new('RGB', (width, height), fill)
+        canvas.paste(image.resize(inner, Image.LANCZOS, reducing_gap=REDUCING_GAP),
+                     ((width - inner[0]) // 2, (height - inner[1]) // 2))
+        return canvas
+    if fit == CROP:
+        left = round((image.width - width) * focus[0])
+        top = round((image.height - height) * focus[1])
+        if left >= 0 and top >= 0:
+            return image.crop((left, top, left + width, top + height))
+        canvas = Image.new('RGB', (width, height), fill)
+        canvas.paste(image, (-left, -top))
+        return canvas
+    raise ValueError(f"Unknown fit mode: {fit}")
+
+
+def _draft(image, size, fit):
+    # Ask the JPEG decoder for the smallest scale that still covers the
+    # target once fitted; other formats ignore draft()
+    if image.format != 'JPEG':
+        return
+    width, height = size
+    if image.getexif().get(0x0112) in _TRANSPOSED:
+        width, height = height, width
+    choose = max if fit == COVER else min
+    scale = choose(width / image.width, height / image.height)
+    if scale >= 1:
+        return
+    image.draft('RGB', (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+
+
+def _flatten(image, fill):
+    if image.mode == 'RGB':
+        return image
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        canvas = Image.new('RGB', image.size, fill)
+        canvas.paste(image, (0, 0), image)
+        return canvas
+    return image.convert('RGB')
+
+
+_default_ingest = None
+
+
+def load_background(path, size, fit=COVER, focus=(0.5, 0.5), fill='#000000'):
+    """Load through the shared, memoizing ingest."""
+    global _default_ingest
+    if _default_ingest is None:
+        _default_ingest = ImageIngest()
+    return _default_ingest.load(path, size, fit, focus, fill)
@@ -0,0 +1,205 @@
+"""Persistent cache of intermediate layers, memory-mapped on read.
+
+Fitted background photos, gradient fills and background blurs are
+deterministic functions of their inputs, so they are stored under a hash of
+those inputs (file paths with their mtime and size, gradient stops, raster
+size, blur radius) and shared by every process and session.  Files hold raw
+pixels behind a small header; a hit maps the file and wraps the mapping
+with ``Image.frombuffer``, with no decoding and no copy, so batch workers
+that reuse one background all read the same page cache.  RGB layers are
+stored padded to RGBX, Pillow's own four-byte layout for RGB, so they map
+the same way; they come back as RGBX images, which paste, crop, resize
+and blur like RGB ones.  Consumers that need RGB itself convert them.
+
+Mapped images are read-only (Pillow copies them on the first in-place
+edit); like every cached image, treat them as shared.  The directory is kept under ``max_bytes`` by deleting the least recently used
+files, with recency kept in the file mtimes so it is shared between
+processes too.
+
+``THUMBNAIL_LAYER_CACHE_MB`` sets the size cap of the shared cache; ``0``
+turns it off.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+from PIL import Image
+
+from .cache import cache_dir
+
+LAYER_VERSION = 3
+MAX_BYTES = 1024 * 1024 * 1024
+# Eviction deletes down to this fraction of the cap so it does not run on every write
+LOW_WATER = 0.9
+
+_MAGIC = b'THLAYER1'
+_HEADER = struct.Struct('<8s4sII')
+# Pixel data starts word aligned
+HEADER_SIZE = 32
+_EXTENSION = '.raw'
+
+# Stored bytes per pixel, in each mode's own raw layout
+_PIXEL_BYTES = {'RGBX': 4, 'RGBA': 4, 'L': 1}
+# Modes written in another layout so they can be mapped
+_STORED_AS = {'RGB': 'RGBX'}
+
+
+class LayerCache:
+    """Content-addressed raw-pixel files in ``directory`` (``None``: the shared cache directory)."""
+
+    def __init__(self, directory=None, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts):
+        """Hex digest naming the layer built from ``parts`` (reprs must be stable)."""
+        return hashlib.sha256(repr((LAYER_VERSION,) + parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """The cached layer mapped read-only, or None."""
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # Touched so eviction sees it as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        image = _map(mapped)
+        if image is None:
+            mapped.close()
+            self.misses += 1
+            return None
+        self.hits += 1
+        return image
+
+    def put(self, key, image):
+        path = self._path(key)
+        mode = _STORED_AS.get(image.mode, image.mode)
+        if path is None or mode not in _PIXEL_BYTES:
+            return image
+        header = _HEADER.pack(_MAGIC, mode.encode('ascii'), image.width, image.height)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(header.ljust(HEADER_SIZE, b'\0'))
+                f.write(image.tobytes('raw', mode))
+            os.replace(tmp, path)
+        except OSError:
+            _remove(tmp)
+            return image
+        self.trim()
+        return image
+
+    def get_or_create(self, key, factory):
+        image = self.get(key)
+        if image is None:
+            image = self.put(key, factory())
+        return image
+
+    def trim(self, max_bytes=None):
+        """Delete least recently used layers until the directory fits the cap."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total <= limit:
+                return total
+            target = limit * LOW_WATER if max_bytes is None else limit
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                # Fails on Windows while another process has it mapped; it goes next time
+                if _remove(path):
+                    total -= size
+            return total
+
+    def clear(self):
+        self.trim(0)
+
+    @property
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        directory = self._dir()
+        if directory is None:
+            return []
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith(_EXTENSION):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return entries
+
+    def _dir(self):
+        try:
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                return self.directory
+            return cache_dir('layers')
+        except OSError:
+            return None
+
+    def _path(self, key):
+        directory = self._dir()
+        return os.path.join(directory, key + _EXTENSION) if directory else None
+
+
+def _map(mapped):
+    try:
+        magic, mode, width, height = _HEADER.unpack_from(mapped)
+        mode = mode.rstrip(b'\0').decode('ascii')
+    except (struct.error, UnicodeDecodeError):
+        return None
+    if magic != _MAGIC or mode not in _PIXEL_BYTES:
+        return None
+    if len(mapped) != HEADER_SIZE + width * height * _PIXEL_BYTES[mode]:
+        return None
+    return Image.frombuffer(mode, (width, height), memoryview(mapped)[HEADER_SIZE:], 'raw', mode, 0, 1)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_layer_cache():
+    """The shared layer cache, or None if ``THUMBNAIL_LAYER_CACHE_MB`` is 0."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            try:
+                max_bytes = int(float(os.environ.get('THUMBNAIL_LAYER_CACHE_MB', MAX_BYTES / 2 ** 20)) * 2 ** 20)
+            except ValueError:
+                max_bytes = MAX_BYTES
+            _default_cache = LayerCache(max_bytes=max_bytes) if max_bytes > 0 else False
+        return _default_cache or None
+
+
+def cached_layer(parts, factory):
+    """``factory()``, through the shared layer cache when ``parts`` names it."""
+    cache = default_layer_cache() if parts is not None else None
+    if cache is None:
+        return factory()
+    return cache.get_or_create(LayerCache.key(*parts), factory)
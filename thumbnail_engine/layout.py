@@ -0,0 +1,241 @@
+"""Fitting text into a box: word wrapping and a font-size search.
+
+Widths come from per-face metrics measured once at ``REFERENCE_SIZE``: the
+advance of each character and the kerning of each adjacent pair, filled in
+as text uses them.  A word's width at any size is then a sum and a multiply,
+so the size search (a binary search over whole sizes, re-wrapping at each)
+never loads the face at a candidate size or calls ``textbbox``.  Only the
+chosen size is loaded, once, to measure the real ink box that places the
+text; hinting can make it a little wider than the scaled estimate, in which
+case the size is stepped down and measured again.
+
+Wrapped lines are balanced: with the line count fixed, the wrap width is
+narrowed as far as it goes without adding a line, so a title breaks into
+lines of similar length rather than a full line and an orphan.  Explicit
+newlines are kept as hard breaks.
+
+Sizes and boxes are in design units::
+
+    fit = default_fitter().fit("A VERY LONG VIDEO TITLE", (60, 60, 1220, 660), max_size=160)
+    scene.add(TextLayer(fit.text, fit.xy, size=fit.size, align=fit.align))
+"""
+import os
+import threading
+
+from PIL import Image, ImageDraw
+
+from .cache import LRUCache
+from .profiling import span
+
+# Faces are measured at this size; large enough that hinting rounding is noise
+REFERENCE_SIZE = 1000
+FACE_ENTRIES = 32
+WORD_ENTRIES = 4096
+# Steps down from the estimated size when the measured ink still overflows
+MAX_CORRECTIONS = 4
+
+ALIGNMENTS = ('left', 'center', 'right')
+
+
+class FaceMetrics:
+    """Advances and pair kerning of one face, in pixels at ``REFERENCE_SIZE``."""
+
+    def __init__(self, font):
+        self.font = font
+        self.advances = {}
+        self.kerning = {}
+        self.words = LRUCache(WORD_ENTRIES)
+        ascent, descent = font.getmetrics()
+        self.height = ascent + descent
+        # Pillow steps multiline text by the bottom of "A" plus stroke and spacing
+        self.line_step = font.getbbox('A')[3]
+        self.space = self.advance(' ')
+
+    def advance(self, char):
+        width = self.advances.get(char)
+        if width is None:
+            width = self.advances[char] = self.font.getlength(char)
+        return width
+
+    def kern(self, pair):
+        adjust = self.kerning.get(pair)
+        if adjust is None:
+            adjust = self.font.getlength(pair) - self.advance(pair[0]) - self.advance(pair[1])
+            self.kerning[pair] = adjust
+        return adjust
+
+    def width(self, word):
+        """Advance width of ``word`` (no spaces) at ``REFERENCE_SIZE``."""
+        width = self.words.get(word)
+        if width is None:
+            width = sum(self.advance(c) for c in word)
+            width += sum(self.kern(word[i:i + 2]) for i in range(len(word) - 1))
+            self.words.put(word, width)
+        return width
+
+
+class TextFit:
+    """Where and how large fitted text is drawn.
+
+    ``text`` has the chosen line breaks; ``xy`` is its draw origin, ``box``
+    its ink box and ``fits`` false if even ``min_size`` overflowed.
+    """
+
+    def __init__(self, text, size, xy, box, fits, align, spacing):
+        self.text = text
+        self.size = size
+        self.xy = xy
+        self.box = box
+        self.fits = fits
+        self.align = align
+        self.spacing = spacing
+
+    @property
+    def lines(self):
+        return self.text.split('\n')
+
+    def __repr__(self):
+        return f"TextFit({self.text!r}, size={self.size}, xy={self.xy}, fits={self.fits})"
+
+
+class TextFitter:
+    def __init__(self, fonts=None):
+        if fonts is None:
+            from .fonts import default_registry
+            fonts = default_registry()
+        self.fonts = fonts
+        self.faces = LRUCache(FACE_ENTRIES)
+        self._lock = threading.Lock()
+
+    def metrics(self, family, bold=False, italic=False):
+        # Keyed on the face the registry resolves to, as in ``get_font``
+        if os.path.isfile(family):
+            key = (family, 0)
+        else:
+            face = self.fonts.find(family, bold, italic)
+            key = face.key if face is not None else ('default', bold, italic)
+        with self._lock:
+            metrics = self.faces.get(key)
+            if metrics is None:
+                metrics = FaceMetrics(self.fonts.get_font(family, REFERENCE_SIZE, bold, italic))
+                self.faces.put(key, metrics)
+        return metrics
+
+    def fit(self, text, box, family='Arial', bold=True, italic=False, max_size=200, min_size=12,
+            max_lines=3, outline_width=0, spacing=4, align='center', valign=0.5):
+        """Largest size (at most ``max_size``) at which ``text`` wraps into ``box``.
+
+        ``box`` is ``(left, top, right, bottom)``; the text block is placed
+        in it by ``align`` horizontally and ``valign`` (0 top to 1 bottom)
+        vertically.  Returns a ``TextFit``; raises ``ValueError`` for text
+        with no words.
+        """
+        if align not in ALIGNMENTS:
+            raise ValueError(f"Unknown alignment: {align}")
+        if not text.split():
+            raise ValueError("No words to fit")
+        with span('text.fit'):
+            metrics = self.metrics(family, bold, italic)
+            paragraphs = [[(word, metrics.width(word)) for word in line.split()] for line in text.split('\n')]
+            width = box[2] - box[0] - 2 * outline_width
+            height = box[3] - box[1] - 2 * outline_width
+            min_size = max(1, min(min_size, max_size))
+
+            lo, hi = min_size, max_size
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                wrapped = _wrap(metrics, paragraphs, mid, width)
+                if _fits(metrics, wrapped, mid, width, height, max_lines, outline_width, spacing):
+                    lo = mid
+                else:
+                    hi = mid - 1
+            size = lo
+
+            draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+            for correction in range(MAX_CORRECTIONS + 1):
+                wrapped = _wrap(metrics, paragraphs, size, width)
+                fits = _fits(metrics, wrapped, size, width, height, max_lines, outline_width, spacing)
+                text = '\n'.join(_balance(metrics, paragraphs, wrapped))
+                font = self.fonts.get_font(family, size, bold, italic)
+                ink = draw.textbbox((0, 0), text, font=font, spacing=spacing, align=align,
+                                    stroke_width=outline_width)
+                over = max((ink[2] - ink[0]) / (box[2] - box[0]), (ink[3] - ink[1]) / (box[3] - box[1]))
+                if over <= 1 or size <= min_size or correction == MAX_CORRECTIONS:
+                    # At the minimum, or out of corrections, the text is kept
+                    # at the size just measured even though it overflows
+                    fits = fits and over <= 1
+                    break
+                size = max(min_size, min(size - 1, int(size / over)))
+
+        left = box[0] + (box[2] - box[0] - (ink[2] - ink[0])) * ALIGNMENTS.index(align) / 2
+        top = box[1] + (box[3] - box[1] - (ink[3] - ink[1])) * valign
+        xy = (round(left - ink[0]), round(top - ink[1]))
+        placed = (xy[0] + ink[0], xy[1] + ink[1], xy[0] + ink[2], xy[1] + ink[3])
+        return TextFit(text, size, xy, placed, fits, align, spacing)
+
+
+def _wrap(metrics, paragraphs, size, width):
+    # Greedy wrap at ``size``: a list of (words, width) lines per paragraph
+    limit = width * REFERENCE_SIZE / size
+    return [_greedy(words, metrics.space, limit) for words in paragraphs]
+
+
+def _fits(metrics, wrapped, size, width, height, max_lines, outline_width, spacing):
+    scale = size / REFERENCE_SIZE
+    lines = [line for paragraph in wrapped for line in paragraph]
+    if len(lines) > max_lines or any(line_width * scale > width for _, line_width in lines):
+        return False
+    step = metrics.line_step * scale + outline_width + spacing
+    return (len(lines) - 1) * step + metrics.height * scale <= height
+
+
+def _greedy(words, space, limit):
+    # ``words`` are (word, width) pairs; a word wider than ``limit`` gets a line of its own
+    if not words:
+        return [([], 0)]
+    lines = []
+    line, used = [words[0][0]], words[0][1]
+    for word, word_width in words[1:]:
+        if used + space + word_width <= limit:
+            line.append(word)
+            used += space + word_width
+        else:
+            lines.append((line, used))
+            line, used = [word], word_width
+    lines.append((line, used))
+    return lines
+
+
+def _balance(metrics, paragraphs, wrapped):
+    # Narrow each paragraph's wrap width as far as its line count holds
+    out = []
+    for words, lines in zip(paragraphs, wrapped):
+        if len(lines) > 1:
+            lo = max(word_width for _, word_width in words)
+            hi = max(line_width for _, line_width in lines)
+            while hi - lo >= 1:
+                mid = (lo + hi) / 2
+                if len(_greedy(words, metrics.space, mid)) <= len(lines):
+                    hi = mid
+                else:
+                    lo = mid
+            lines = _greedy(words, metrics.space, hi)
+        out.extend(' '.join(line) for line, _ in lines)
+    return out
+
+
+_default_fitter = None
+_default_lock = threading.Lock()
+
+
+def default_fitter():
+    global _default_fitter
+    with _default_lock:
+        if _default_fitter is None:
+            _default_fitter = TextFitter()
+        return _default_fitter
+
+
+def fit_text(text, box, **options):
+    """Fit through the shared fitter; see ``TextFitter.fit``."""
+    return default_fitter().fit(text, box, **options)
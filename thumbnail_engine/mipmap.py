@@ -0,0 +1,110 @@
+"""Mipmap pyramid of the canvas for previews at YouTube's display sizes.
+
+A thumbnail is mostly seen small: in search results, on the home grid, in
+the watch-next sidebar and in the mobile list.  Checking that a title is
+still readable at each of those sizes would take one LANCZOS pass over the
+whole canvas per size on every edit; instead the canvas is box-reduced by
+two, repeatedly, into a pyramid of levels, and each display size is
+resampled from a nearby level.  ``FAST`` views take the smallest level at
+least as large and finish with bilinear, the same split as ``preview``;
+``FINAL`` views run LANCZOS from one level further up, so the last octave
+gets its full filter rather than a 2x2 box and the result stays within a
+few levels of grey of a direct LANCZOS resize of the canvas.
+
+``MipmapPyramid.sync(scene)`` follows a scene through its change log: the
+pyramid is built once per scene (or when the log no longer reaches back far
+enough) and afterwards only the boxes each render changed are reduced again,
+grown to the 2x2 blocks they touch at every level.  Incremental updates give
+exactly the pixels of a full rebuild.
+"""
+from PIL import Image
+
+from .preview import FAST, FINAL
+from .profiling import span
+
+# (label, size) in CSS pixels at 100% zoom, largest first; the desktop sizes
+# vary a little with the window width
+DISPLAY_SIZES = (
+    ("Search results", (360, 202)),
+    ("Home grid", (320, 180)),
+    ("Watch next", (168, 94)),
+    ("Mobile list", (160, 90)),
+)
+
+# Levels stop once either side would drop below this
+MIN_LEVEL = 32
+
+
+class MipmapPyramid:
+    """Successive 2x box reductions of a canvas, level 0 being a copy of it."""
+
+    def __init__(self, min_size=MIN_LEVEL):
+        self.min_size = min_size
+        self.levels = []
+        self.revision = None
+        self.stats = {'builds': 0, 'updates': 0, 'regions': 0}
+        self._scene = None
+        self._views = {}
+
+    def sync(self, scene):
+        """Bring the levels up to date with ``scene``'s last rendered canvas."""
+        canvas = scene.canvas
+        boxes = None
+        if scene is self._scene and self.levels and self.levels[0].size == canvas.size:
+            boxes = scene.changes_since(self.revision)
+        if boxes is None:
+            self.build(canvas)
+        elif boxes:
+            self.update(canvas, boxes)
+        self._scene = scene
+        self.revision = scene.revision
+        return self
+
+    def build(self, image):
+        with span('mipmap.build', size=image.size):
+            levels = [image.convert('RGB') if image.mode != 'RGB' else image.copy()]
+            while min(levels[-1].size) >= 2 * self.min_size:
+                levels.append(levels[-1].reduce(2))
+        self.levels = levels
+        self._views = {}
+        self.stats['builds'] += 1
+
+    def update(self, image, boxes):
+        """Re-reduce the boxes of ``image`` (level 0 pixels) that changed."""
+        with span('mipmap.update', regions=len(boxes)):
+            for box in boxes:
+                self.levels[0].paste(image.crop(box), box[:2])
+                for above, level in zip(self.levels, self.levels[1:]):
+                    box = (box[0] // 2, box[1] // 2, -(-box[2] // 2), -(-box[3] // 2))
+                    # An odd last row or column reduces on its own, as in the full reduce
+                    source = (2 * box[0], 2 * box[1], min(2 * box[2], above.width), min(2 * box[3], above.height))
+                    level.paste(above.reduce(2, box=source), box[:2])
+        self._views = {}
+        self.stats['updates'] += 1
+        self.stats['regions'] += len(boxes)
+
+    def level_for(self, size, headroom=1):
+        """The smallest level covering ``headroom`` times ``size``, else level 0."""
+        for level in reversed(self.levels):
+            if level.width >= size[0] * headroom and level.height >= size[1] * headroom:
+                return level
+        return self.levels[0]
+
+    def view(self, size, quality=FINAL):
+        """The canvas at ``size``; shared until the next update, so copy before drawing."""
+        size = tuple(size)
+        key = (size, quality)
+        image = self._views.get(key)
+        if image is None:
+            level = self.level_for(size, 1 if quality == FAST else 2)
+            if level.size == size:
+                image = level.copy()
+            else:
+                with span('mipmap.view', size=size, quality=quality):
+                    image = level.resize(size, Image.BILINEAR if quality == FAST else Image.LANCZOS)
+            self._views[key] = image
+        return image
+
+    def views(self, sizes=DISPLAY_SIZES, quality=FINAL):
+        """``(label, image)`` for each display size."""
+        return [(label, self.view(size, quality)) for label, size in sizes]
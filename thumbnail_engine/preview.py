@@ -0,0 +1,168 @@
+"""Debounced, progressive preview scaling.
+
+Canvas updates are coalesced: however many arrive between two frames, only the
+latest is scaled (or, for a scene already rasterized at preview scale, only
+the latest is shown).  While a control is being dragged the preview is produced
+with a cheap ``reduce``/bilinear downscale; once input has been idle for
+``idle_ms`` a LANCZOS frame replaces it.  Scaling runs on a worker thread and
+finished frames are handed back to the Tk thread through ``after()`` polling,
+so the UI thread only copies the canvas and blits the result.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import sys
+import time
+import traceback
+
+from PIL import Image
+
+from .profiling import span
+
+FAST = 'fast'
+FINAL = 'final'
+
+
+def scale_fast(image, size):
+    # Integer box reduction does most of the work; a bilinear pass fixes up
+    # any remaining non-integer ratio
+    if image.size == size:
+        return image
+    factor = max(1, min(image.width // size[0], image.height // size[1]))
+    if factor > 1:
+        image = image.reduce(factor)
+    if image.size != size:
+        image = image.resize(size, Image.BILINEAR)
+    return image
+
+
+def scale_final(image, size):
+    if image.size == size:
+        return image
+    return image.resize(size, Image.LANCZOS)
+
+
+class PreviewPipeline:
+    """Turns a stream of canvas snapshots into preview frames.
+
+    ``scheduler`` is anything with Tk's ``after``/``after_cancel`` (usually the
+    root window).  ``deliver(image, quality)`` is called on the Tk thread with
+    a preview-sized image and ``FAST`` or ``FINAL``.  A frame that fails to
+    scale is passed to ``report(exc)`` instead (by default printed to
+    stderr); it is not retried, and the next request starts afresh.
+    """
+
+    def __init__(self, scheduler, deliver, size, idle_ms=150, frame_ms=16, poll_ms=8, report=None):
+        self.scheduler = scheduler
+        self.deliver = deliver
+        self.report = report or _print_error
+        self.size = tuple(size)
+        self.idle_ms = idle_ms
+        self.frame_ms = frame_ms
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='preview')
+        self.results = queue.Queue()
+        self.stats = {'requests': 0, 'frames': 0, 'dropped': 0, 'errors': 0, 'last_ms': 0.0}
+
+        self._pending = None  # (generation, image, quality)
+        self._generation = 0
+        self._delivered = 0
+        self._busy = False
+        self._frame_job = None
+        self._idle_job = None
+        self._poll_job = None
+        self._latest = None
+
+    def request(self, image, interactive=False):
+        """Queue a new canvas state; ``image`` is copied before returning."""
+        self.stats['requests'] += 1
+        self._generation += 1
+        snapshot = image.copy()
+        # A canvas already rasterized at preview size needs no settling frame
+        quality = FAST if interactive and snapshot.size != self.size else FINAL
+        self._latest = snapshot
+        self._pending = (self._generation, snapshot, quality)
+
+        if self._idle_job is not None:
+            self.scheduler.after_cancel(self._idle_job)
+            self._idle_job = None
+        if quality == FAST:
+            # Settle on a high-quality frame once the control stops moving
+            self._idle_job = self.scheduler.after(self.idle_ms, self._settle)
+        if self._frame_job is None:
+            delay = self.frame_ms if interactive else 0
+            self._frame_job = self.scheduler.after(delay, self._dispatch)
+
+    def _settle(self):
+        self._idle_job = None
+        if self._latest is not None:
+            self._pending = (self._generation, self._latest, FINAL)
+            if self._frame_job is None:
+                self._frame_job = self.scheduler.after(0, self._dispatch)
+
+    def _dispatch(self):
+        self._frame_job = None
+        if self._busy or self._pending is None:
+            return
+        generation, image, quality = self._pending
+        self._pending = None
+        if quality == FINAL:
+            self._latest = None
+        self._busy = True
+        self.executor.submit(self._work, generation, image, quality)
+        if self._poll_job is None:
+            self._poll_job = self.scheduler.after(self.poll_ms, self._poll)
+
+    def _work(self, generation, image, quality):
+        start = time.perf_counter()
+        try:
+            scale = scale_final if quality == FINAL else scale_fast
+            with span('preview.scale', quality=quality):
+                frame = scale(image, self.size)
+            self.results.put((generation, frame, quality, time.perf_counter() - start))
+        except Exception as exc:
+            self.results.put((generation, exc, quality, 0.0))
+
+    def _poll(self):
+        self._poll_job = None
+        try:
+            generation, frame, quality, elapsed = self.results.get_nowait()
+        except queue.Empty:
+            self._poll_job = self.scheduler.after(self.poll_ms, self._poll)
+            return
+
+        self._busy = False
+        failed = isinstance(frame, Exception)
+        try:
+            if failed:
+                self.stats['errors'] += 1
+                self.report(frame)
+            elif generation >= self._delivered:
+                self._delivered = generation
+                self.stats['frames'] += 1
+                self.stats['last_ms'] = elapsed * 1000
+                self.deliver(frame, quality)
+            else:
+                self.stats['dropped'] += 1
+        finally:
+            # A failure drops whatever was queued behind it rather than
+            # retrying; otherwise the next frame goes out even if deliver raised
+            if failed:
+                self._pending = None
+                self._latest = None
+            elif self._pending is not None and self._frame_job is None:
+                self._frame_job = self.scheduler.after(0, self._dispatch)
+
+    def render_now(self, image):
+        """Synchronous full-quality frame (e.g. before taking a screenshot)."""
+        self.deliver(scale_final(image, self.size), FINAL)
+
+    def close(self):
+        for job in (self._frame_job, self._idle_job, self._poll_job):
+            if job is not None:
+                self.scheduler.after_cancel(job)
+        self.executor.shutdown(wait=False)
+
+
+def _print_error(exc):
+    print("Preview frame failed:", file=sys.stderr)
+    traceback.print_exception(type(exc), exc, exc.__traceback__, file=sys.stderr)
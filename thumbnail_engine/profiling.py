@@ -0,0 +1,160 @@
+"""Timing spans for editor operations and the stages inside them.
+
+Instrumented code wraps its stages in ``span``::
+
+    with span('text.rasterize'):
+        ...
+
+and the editor wraps each user action in ``operation``.  Spans nest per
+thread and are kept in a bounded ring buffer that ``export_chrome_trace``
+writes in the Chrome trace-event format (load it in chrome://tracing or
+Perfetto).  ``profiler.last_operation`` summarizes the most recent operation
+for an on-screen overlay.
+
+Profiling is off unless ``THUMBNAIL_PROFILE`` is set or ``enable()`` is
+called; a disabled ``span`` is one attribute check returning a shared no-op
+context manager.
+"""
+from collections import deque
+import json
+import os
+import threading
+import time
+
+MAX_EVENTS = 200000
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'category', 'args', 'start', 'children')
+
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+        self.children = []
+
+    def __enter__(self):
+        self.profiler._stack().append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        stack = self.profiler._stack()
+        stack.pop()
+        if stack:
+            stack[-1].children.append((self.name, end - self.start))
+        self.profiler._record(self, end)
+        return False
+
+
+class OperationSummary:
+    """Total time of one operation and its direct stages, merged by name."""
+
+    def __init__(self, name, total_ms, stages):
+        self.name = name
+        self.total_ms = total_ms
+        self.stages = stages  # [(name, ms)], slowest first
+
+    def lines(self):
+        lines = [f"{self.name}  {self.total_ms:.1f} ms"]
+        lines.extend(f"  {name:<18}{ms:7.1f}" for name, ms in self.stages)
+        return lines
+
+
+class Profiler:
+    def __init__(self, enabled=False, max_events=MAX_EVENTS):
+        self.enabled = enabled
+        self.events = deque(maxlen=max_events)
+        self.last_operation = None
+        self.last = {}  # span name -> latest duration in ms
+        self._local = threading.local()
+        self._threads = {}
+        self._epoch = time.perf_counter_ns()
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return _NULL
+        return _Span(self, name, 'stage', args)
+
+    def operation(self, name, **args):
+        """A top-level user action; its stages feed ``last_operation``."""
+        if not self.enabled:
+            return _NULL
+        return _Span(self, name, 'operation', args)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.events.clear()
+        self.last.clear()
+        self.last_operation = None
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+            thread = threading.current_thread()
+            self._threads[thread.ident] = thread.name
+        return stack
+
+    def _record(self, span, end):
+        duration = end - span.start
+        self.events.append((span.name, span.category, span.start, duration,
+                            threading.get_ident(), span.args))
+        self.last[span.name] = duration / 1e6
+        if span.category == 'operation':
+            stages = {}
+            for name, child in span.children:
+                stages[name] = stages.get(name, 0) + child
+            other = duration - sum(stages.values())
+            ordered = sorted(((name, ns / 1e6) for name, ns in stages.items()), key=lambda s: -s[1])
+            if stages and other > 0:
+                ordered.append(('other', other / 1e6))
+            self.last_operation = OperationSummary(span.name, duration / 1e6, ordered)
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                  for tid, name in self._threads.items()]
+        for name, category, start, duration, tid, args in list(self.events):
+            events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': (start - self._epoch) / 1000, 'dur': duration / 1000, 'args': args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+profiler = Profiler(enabled=bool(os.environ.get('THUMBNAIL_PROFILE')))
+
+
+def span(name, **args):
+    """A timing span on the shared profiler (a no-op while it is disabled)."""
+    if not profiler.enabled:
+        return _NULL
+    return _Span(profiler, name, 'stage', args)
+
+
+def operation(name, **args):
+    return profiler.operation(name, **args)
@@ -0,0 +1,448 @@
+"""Headless rendering of declarative thumbnail specs.
+
+A spec is plain JSON-compatible data::
+
+    {
+        "size": [1280, 720],
+        "template": "gaming",
+        "background": {"image": "photo.jpg", "fit": "cover", "blur": 12,
+                       "adjustments": [{"kind": "contrast", "factor": 1.2}]},
+        "layers": [
+            {"type": "text", "text": "EPIC WIN", "position": "bottom"},
+            {"type": "text", "text": "A much longer title that wraps", "fit": true, "size": 140},
+            {"type": "shape", "preset": "arrow", "anchor": "bottom-right", "size": [300, 120],
+             "fill": "#FFFF00C0"},
+            {"type": "emoji", "emoji": "\\U0001F525", "xy": [1000, 80]},
+            {"type": "sticker", "path": "stickers/wow.png", "size": 200}
+        ]
+    }
+
+``background`` is a color string or a dict with one of ``color``,
+``gradient`` (``Gradient.to_dict`` form) or ``image``, plus optional ``blur``
+and ``adjustments``.  A ``template`` (see ``templates``), filled in with the
+spec's ``params``, supplies the background, any fixed layers (the built-in
+templates draw their title as a text layer) and the defaults for text
+layers (including the text itself); the spec's own keys override it.  Text
+is placed at ``xy``, centered at ``position``, or, with a ``box`` or
+``"fit": true`` (the band for ``position``), wrapped and sized to fill it:
+``size`` is then the largest size tried and ``min_size`` and ``max_lines``
+bound the search (see ``layout``).  The GUI builds its scenes
+through the same functions, so a spec renders identically with or without a
+display.
+
+Coordinates and sizes are in units of ``size``; an optional ``scale``
+rasterizes the same spec at that many pixels per unit, so ``"scale": 3``
+turns a 1280x720 layout into a 3840x2160 image with text, shapes and the
+background drawn at full resolution rather than upsampled.
+"""
+import json
+import math
+import os
+
+from PIL import Image, ImageDraw
+
+from .adjustments import AdjustmentStack
+from .cache import LRUCache
+from .gradients import Gradient
+from .ingest import COVER, ImageFile
+from .layout import TextFitter
+from .scene import Background, Scene, ShapeLayer, StickerLayer, TextLayer
+from .stickers import default_stickers
+from .templates import TemplateError, default_library
+from .text_effects import TextEffectsEngine
+
+DEFAULT_SIZE = (1280, 720)
+
+# Distinct backgrounds (with their blur pyramids) kept alive between specs
+BACKGROUND_CACHE_ENTRIES = 16
+
+TEXT_DEFAULTS = {
+    'text': '',
+    'position': 'center',
+    'family': 'Arial',
+    'size': 100,
+    'bold': True,
+    'italic': False,
+    'fill': '#FFFFFF',
+    'outline': '#000000',
+    'outline_width': 8,
+    'shadow': True,
+    'shadow_offset': 5,
+    'shadow_blur': 0,
+    'align': 'center',
+    'spacing': 4,
+    'fit': False,
+    'min_size': 24,
+    'max_lines': 3,
+}
+
+# Fitted text: side margin of the region for ``position``, and where in it the text sits
+TEXT_MARGIN = 60
+TEXT_VALIGN = {'top': 0, 'center': 0.5, 'bottom': 1}
+
+# Toolbar shapes: geometry, default box on the canvas and default style
+SHAPE_PRESETS = {
+    'circle': dict(shape='ellipse', box=(100, 100, 260, 260), fill='#FF000080', outline='#FFFFFF', width=5),
+    'rectangle': dict(shape='rectangle', box=(50, 50, 300, 150), fill='#0000FF80', outline='#FFFFFF', width=5),
+    'arrow': dict(shape='polygon', box=(100, 250, 350, 350), fill='#FFFF00', outline='#000000', width=3),
+    'starburst': dict(shape='polygon', box=(100, 100, 300, 300), fill='#FFFF00', outline='#FF0000', width=4),
+}
+SHAPE_STYLE = {'fill', 'outline', 'width', 'radius'}
+
+# Keys a layer of each type cannot be rendered without
+REQUIRED_KEYS = {'emoji': ('emoji',), 'sticker': ('path',), 'image': ('path',)}
+
+# The arrow in its unit box, pointing left
+ARROW_POINTS = [(0, 0.5), (0.4, 0), (0.4, 0.3), (1, 0.3), (1, 0.7), (0.4, 0.7), (0.4, 1)]
+
+# Placement of shapes by anchor, as fractions of the free space
+ANCHORS = {
+    'top-left': (0, 0), 'top': (0.5, 0), 'top-right': (1, 0),
+    'left': (0, 0.5), 'center': (0.5, 0.5), 'right': (1, 0.5),
+    'bottom-left': (0, 1), 'bottom': (0.5, 1), 'bottom-right': (1, 1),
+}
+SHAPE_MARGIN = 50
+
+
+# Top-level keys that affect the rendered image
+SPEC_KEYS = ('size', 'scale', 'template', 'params', 'background', 'layers', 'text')
+
+
+class SpecError(ValueError):
+    """A spec that cannot be rendered (unknown keys, types or references)."""
+
+
+def resolve(spec, library=None):
+    """Merge ``spec`` over its template; returns a new, template-free spec.
+
+    The template is instantiated with the spec's ``params``.
+    """
+    name = spec.get('template')
+    if name is None:
+        return dict(spec)
+    try:
+        template = (library or default_library()).get(name).instantiate(spec.get('params'))
+    except TemplateError as exc:
+        raise SpecError(str(exc)) from None
+    merged = {key: value for key, value in spec.items() if key not in ('template', 'params')}
+    merged.setdefault('background', template.get('background', '#FFFFFF'))
+    merged['layers'] = list(template.get('layers', ())) + list(spec.get('layers', ()))
+    text = dict(template.get('text', {}))
+    text.update(spec.get('text', {}))
+    merged['text'] = text
+    return merged
+
+
+def text_position(font, text, position, canvas_size, spacing=4, align='left'):
+    """Top-left corner for ``text`` centered horizontally at ``position``.
+
+    Multiline text is measured as a block, laid out with ``spacing`` and
+    ``align`` as the text layer draws it.
+    """
+    bbox = ImageDraw.Draw(Image.new('L', (1, 1))).multiline_textbbox((0, 0), text, font=font,
+                                                                    spacing=spacing, align=align)
+    # Centred lines can start on half pixels
+    text_width = math.ceil(bbox[2] - bbox[0])
+    text_height = math.ceil(bbox[3] - bbox[1])
+    width, height = canvas_size
+    x = (width - text_width) // 2
+    if position == 'top':
+        y = 100
+    elif position == 'center':
+        y = (height - text_height) // 2
+    elif position == 'bottom':
+        y = height - text_height - 100
+    else:
+        raise SpecError(f"Unknown text position: {position}")
+    return x, y
+
+
+def text_box(position, canvas_size, margin=TEXT_MARGIN):
+    """Region fitted text fills for ``position``: a full-width band."""
+    width, height = canvas_size
+    if position == 'top':
+        return (margin, margin, width - margin, height // 2)
+    if position == 'center':
+        return (margin, margin, width - margin, height - margin)
+    if position == 'bottom':
+        return (margin, height // 2, width - margin, height - margin)
+    raise SpecError(f"Unknown text position: {position}")
+
+
+def preset_shape(name, box=None, spikes=8, inner=0.5, **style):
+    """Keyword arguments for ``ShapeLayer`` for one of the toolbar shapes.
+
+    The shape fills ``box`` (``(left, top, right, bottom)``, default: where
+    the toolbar has always put it); ``style`` overrides its ``fill``,
+    ``outline``, ``width`` and ``radius``.  A starburst has ``spikes``
+    points with its inner corners at ``inner`` times the outer radius.
+    """
+    if name not in SHAPE_PRESETS:
+        raise SpecError(f"Unknown shape preset: {name}")
+    props = dict(SHAPE_PRESETS[name])
+    left, top, right, bottom = box or props.pop('box')
+    props.pop('box', None)
+    unknown = set(style) - SHAPE_STYLE
+    if unknown:
+        raise SpecError(f"Unknown shape option(s): {', '.join(sorted(unknown))}")
+    props.update(style)
+    if name == 'arrow':
+        unit = ARROW_POINTS
+    elif name == 'starburst':
+        unit = []
+        for i in range(spikes * 2):
+            angle = (i * math.pi / spikes) - math.pi / 2
+            r = 0.5 if i % 2 == 0 else 0.5 * inner
+            unit.append((0.5 + r * math.cos(angle), 0.5 + r * math.sin(angle)))
+    else:
+        unit = [(0, 0), (1, 1)]
+    width, height = right - left, bottom - top
+    props['points'] = [(left + u * width, top + v * height) for u, v in unit]
+    return props
+
+
+def shape_box(name, canvas_size, xy=None, size=None, anchor=None):
+    """The ``(left, top, right, bottom)`` a preset shape is drawn into.
+
+    ``size`` is a number (square) or ``[width, height]`` and defaults to
+    the preset's own; the box goes at ``xy`` or at one of ``ANCHORS``
+    inset by ``SHAPE_MARGIN``.  Without either the preset's box is used.
+    """
+    left, top, right, bottom = SHAPE_PRESETS[name]['box']
+    if size is None:
+        size = (right - left, bottom - top)
+    elif isinstance(size, (int, float)):
+        size = (size, size)
+    width, height = size
+    if xy is None and anchor is None:
+        if size == (right - left, bottom - top):
+            return left, top, right, bottom
+        xy = (left, top)
+    elif xy is None:
+        if anchor not in ANCHORS:
+            raise SpecError(f"Unknown anchor: {anchor}")
+        fx, fy = ANCHORS[anchor]
+        xy = (SHAPE_MARGIN + (canvas_size[0] - width - 2 * SHAPE_MARGIN) * fx,
+              SHAPE_MARGIN + (canvas_size[1] - height - 2 * SHAPE_MARGIN) * fy)
+    x, y = xy
+    return x, y, x + width, y + height
+
+
+def render_emoji(emoji, size=150):
+    """``emoji`` as a trimmed RGBA sticker about ``size`` pixels across."""
+    return default_stickers().emoji(emoji, size)
+
+
+def sticker_layer(image, xy, size, name=None, loader=None):
+    # Stickers are trimmed to their opaque area; center them in the
+    # ``size`` square at ``xy`` that specs and the editor place them by
+    x, y = xy
+    return StickerLayer(image, (x + (size - image.width) // 2, y + (size - image.height) // 2),
+                        loader=loader, name=name)
+
+
+class Renderer:
+    """Builds scenes from specs, sharing font and glyph caches between them.
+
+    Relative image paths in specs are resolved against ``base_dir``.
+    """
+
+    def __init__(self, fonts=None, text_effects=None, base_dir=None, library=None, stickers=None):
+        if fonts is None:
+            from .fonts import default_registry
+            fonts = default_registry()
+        self.fonts = fonts
+        self.text_effects = text_effects or TextEffectsEngine()
+        self.stickers = stickers or default_stickers()
+        self.base_dir = base_dir
+        self.library = library or default_library()
+        self.backgrounds = LRUCache(BACKGROUND_CACHE_ENTRIES)
+        self.fitter = TextFitter(fonts)
+
+    def scene(self, spec):
+        spec = resolve(spec, self.library)
+        scene = Scene(tuple(spec.get('size', DEFAULT_SIZE)), fonts=self.fonts, text_effects=self.text_effects,
+                      scale=spec.get('scale', 1))
+        self.populate(scene, spec)
+        return scene
+
+    def render(self, spec):
+        return self.scene(spec).flatten()
+
+    def populate(self, scene, spec):
+        """Set ``scene``'s background from ``spec`` and append its layers."""
+        spec = resolve(spec, self.library)
+        scene.set_background(self.background(spec.get('background', '#FFFFFF'), scene.size))
+        text_defaults = spec.get('text', {})
+        for index, item in enumerate(spec.get('layers', ())):
+            try:
+                layer = self.layer(item, scene, text_defaults)
+            except SpecError as exc:
+                raise SpecError(f"Layer {index}: {exc}") from None
+            scene.add(layer)
+        return scene
+
+    def preload(self, size=DEFAULT_SIZE, scale=1):
+        """Render each template's defaults once to warm the shared caches.
+
+        Fonts, glyph masks and backgrounds stay cached, so applying a
+        template afterwards only composites.  Returns the templates rendered.
+        """
+        names = []
+        for name in self.library.names():
+            try:
+                self.render({'template': name, 'size': list(size), 'scale': scale})
+            except (SpecError, TemplateError, OSError):
+                continue
+            names.append(name)
+        return names
+
+    def background(self, data, size):
+        """A ``Background`` for a background spec.
+
+        Backgrounds are shared between specs: the decoded or rendered base
+        and its blur are keyed on everything but the adjustments, and each
+        adjustment stack derives from that, so variants that only differ in
+        their layers or adjustments reuse the earlier work.
+        """
+        if isinstance(data, str):
+            data = {'color': data}
+        if not isinstance(data, dict):
+            raise SpecError(f"Background must be a color or an object, not {type(data).__name__}")
+        stage = {k: v for k, v in data.items() if k != 'adjustments'}
+        key = (json.dumps(stage, sort_keys=True), tuple(size))
+        if 'image' in data:
+            key += (os.stat(self.path(data['image'])).st_mtime_ns,)
+        background = self.backgrounds.get(key)
+        if background is None:
+            background = Background(self._source(data, size), blur=data.get('blur', 0))
+            self.backgrounds.put(key, background)
+        adjustments = AdjustmentStack.from_list(data.get('adjustments', ()))
+        if adjustments:
+            key += (adjustments.key,)
+            adjusted = self.backgrounds.get(key)
+            if adjusted is None:
+                adjusted = self.backgrounds.put(key, background.with_adjustments(adjustments))
+            background = adjusted
+        return background
+
+    def _source(self, data, size):
+        if 'image' in data:
+            # Decoded at the raster size when the scene first draws it
+            return ImageFile(self.path(data['image']), data.get('fit', COVER),
+                             tuple(data.get('focus', (0.5, 0.5))), data.get('pad', '#000000'))
+        if 'gradient' in data:
+            return Gradient.from_dict(data['gradient'])
+        if 'color' in data:
+            return data['color']
+        raise SpecError("Background needs one of 'color', 'gradient' or 'image'")
+
+    def layer(self, data, scene, text_defaults=None):
+        kind = data.get('type')
+        name = data.get('name')
+        missing = [key for key in REQUIRED_KEYS.get(kind, ()) if key not in data]
+        if missing:
+            raise SpecError(f"{kind.capitalize()} layer needs {', '.join(repr(k) for k in missing)}")
+        if kind == 'text':
+            props = dict(TEXT_DEFAULTS)
+            props.update(text_defaults or {})
+            props.update({k: v for k, v in data.items() if k not in ('type', 'name')})
+            unknown = set(props) - set(TEXT_DEFAULTS) - {'xy', 'box'}
+            if unknown:
+                raise SpecError(f"Unknown text option(s): {', '.join(sorted(unknown))}")
+            if not props['text']:
+                raise SpecError("Text layer without text")
+            offset = props['shadow_offset']
+            if isinstance(offset, (int, float)):
+                offset = (offset, offset)
+            text, size, xy = props['text'], props['size'], props.get('xy')
+            box = props.get('box')
+            if box is not None:
+                box = tuple(box)
+            if box is None and props['fit'] and xy is None:
+                box = text_box(props['position'], scene.design_size)
+            if box is not None:
+                if xy is not None:
+                    raise SpecError("Text layer takes 'xy' or 'box', not both")
+                if props['position'] not in TEXT_VALIGN:
+                    raise SpecError(f"Unknown text position: {props['position']}")
+                if props['shadow']:
+                    # Keep the drop shadow inside the box too
+                    box = (box[0] - min(0, offset[0]), box[1] - min(0, offset[1]),
+                           box[2] - max(0, offset[0]), box[3] - max(0, offset[1]))
+                try:
+                    fit = self.fitter.fit(text, box, props['family'], props['bold'], props['italic'],
+                                          max_size=size, min_size=props['min_size'],
+                                          max_lines=props['max_lines'], outline_width=props['outline_width'],
+                                          spacing=props['spacing'], align=props['align'],
+                                          valign=TEXT_VALIGN[props['position']])
+                except ValueError as exc:
+                    raise SpecError(str(exc)) from None
+                text, size, xy = fit.text, fit.size, fit.xy
+            elif xy is None:
+                font = self.fonts.get_font(props['family'], size, props['bold'], props['italic'])
+                xy = text_position(font, text, props['position'], scene.design_size,
+                                   props['spacing'], props['align'])
+            return TextLayer(text, xy, family=props['family'], size=size,
+                             bold=props['bold'], italic=props['italic'], fill=props['fill'],
+                             outline=props['outline'], outline_width=props['outline_width'],
+                             shadow=props['shadow'], shadow_offset=tuple(offset),
+                             shadow_blur=props['shadow_blur'], align=props['align'],
+                             spacing=props['spacing'], name=name)
+        if kind == 'shape':
+            placement = ('xy', 'size', 'anchor')
+            options = {k: v for k, v in data.items() if k not in ('type', 'name', 'preset') + placement}
+            if 'preset' in data:
+                preset = data['preset']
+                if preset not in SHAPE_PRESETS:
+                    raise SpecError(f"Unknown shape preset: {preset}")
+                box = shape_box(preset, scene.design_size, **{k: data[k] for k in placement if k in data})
+                props = preset_shape(preset, box, **options)
+            else:
+                props = options
+            if 'shape' not in props or 'points' not in props:
+                raise SpecError("Shape layer needs 'shape' and 'points' or a 'preset'")
+            unknown = set(props) - SHAPE_STYLE - {'shape', 'points'}
+            if unknown:
+                raise SpecError(f"Unknown shape option(s): {', '.join(sorted(unknown))}")
+            return ShapeLayer(name=name, **props)
+        if kind == 'emoji':
+            size = data.get('size', 150)
+            xy = data.get('xy', ((scene.design_size[0] - size) // 2, 50))
+            emoji, stickers = data['emoji'], self.stickers
+            return sticker_layer(stickers.emoji(emoji, size), xy, size, name=name or emoji,
+                                 loader=lambda scale: stickers.emoji(emoji, round(size * scale)))
+        if kind == 'sticker':
+            size = data.get('size', 150)
+            xy = data.get('xy', ((scene.design_size[0] - size) // 2, 50))
+            path, stickers = self.path(data['path']), self.stickers
+            return sticker_layer(stickers.image(path, size), xy, size,
+                                 name=name or os.path.splitext(os.path.basename(path))[0],
+                                 loader=lambda scale: stickers.image(path, round(size * scale)))
+        if kind == 'image':
+            with Image.open(self.path(data['path'])) as image:
+                image = image.convert('RGBA')
+            if 'size' in data:
+                image.thumbnail(tuple(data['size']), Image.LANCZOS)
+            return StickerLayer(image, data.get('xy', (0, 0)), name=name)
+        raise SpecError(f"Unknown layer type: {kind}")
+
+    def path(self, path):
+        if self.base_dir and not os.path.isabs(path):
+            return os.path.join(self.base_dir, path)
+        return path
+
+
+_default_renderer = None
+
+
+def default_renderer():
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = Renderer()
+    return _default_renderer
+
+
+def render_spec(spec):
+    """Render ``spec`` to an RGB image through the shared renderer."""
+    return default_renderer().render(spec)
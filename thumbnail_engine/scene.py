@@ -0,0 +1,593 @@
+"""Retained-mode scene graph.
+
+A scene is an opaque background plus an ordered stack of layers.  Every layer
+rasterizes itself once into an RGBA tile covering only its bounding box and
+keeps that tile until one of its properties changes.  Edits mark the old and
+new bounding boxes dirty, and ``Scene.render`` recomposes just those
+rectangles from the cached tiles.  Each render that changes pixels bumps
+``Scene.revision`` and logs the rectangles it changed, so derived images
+(the display-size mipmaps) can follow with ``changes_since``.
+
+Layers are described in design units (the scene's ``design_size``, e.g.
+1280x720) and rasterized at ``scale`` pixels per unit, so the same
+description renders a half-size preview or a 3840x2160 export directly,
+without resampling a full-size render.  ``Scene.at_scale`` makes such a
+copy; ``scene.size`` is always the raster size.
+"""
+import collections
+import copy
+import itertools
+import math
+
+from PIL import Image, ImageDraw
+
+from .adjustments import AdjustmentStack
+from .blur import BlurPyramid
+from .gradients import Gradient, gradient_key, render_gradient
+from .ingest import COVER, ImageFile, fit_image
+from .layercache import cached_layer
+from .profiling import span
+from .text_effects import TextEffectsEngine
+
+# Beyond this many separate dirty rectangles they are merged into one
+MAX_DIRTY_RECTS = 8
+# Renders whose changed rectangles are kept for ``Scene.changes_since``
+CHANGE_LOG = 32
+
+# Shapes are drawn this many times larger and box-reduced into their tile,
+# which antialiases their edges; large shapes use a lower factor
+SUPERSAMPLE = 4
+MAX_SUPERSAMPLED_PIXELS = 16 * 1024 * 1024
+
+_layer_ids = itertools.count(1)
+
+
+def union(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def intersect(a, b):
+    box = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    return box if box[0] < box[2] and box[1] < box[3] else None
+
+
+class Layer:
+    """Base class for everything stacked above the background.
+
+    Subclasses implement ``rasterize(scene)`` returning ``(tile, (x, y))``
+    where ``tile`` is an RGBA image and ``(x, y)`` its canvas position.
+    """
+
+    kind = 'layer'
+
+    def __init__(self, name=None, visible=True):
+        self.id = next(_layer_ids)
+        self.name = name or f"{self.kind} {self.id}"
+        self.visible = visible
+        self._tile = None
+        self._offset = None
+
+    def rasterize(self, scene):
+        raise NotImplementedError
+
+    def tile(self, scene):
+        if self._tile is None:
+            with span('layer.rasterize', kind=self.kind):
+                self._tile, self._offset = self.rasterize(scene)
+        return self._tile, self._offset
+
+    def bbox(self, scene):
+        tile, (x, y) = self.tile(scene)
+        return (x, y, x + tile.width, y + tile.height)
+
+    def invalidate(self):
+        self._tile = None
+        self._offset = None
+
+    def detached(self):
+        """A copy with its own tile cache, e.g. for a scene at another scale."""
+        layer = copy.copy(self)
+        layer.invalidate()
+        return layer
+
+    def properties(self):
+        # Everything that affects rasterization; private caches are excluded
+        return {name: value for name, value in vars(self).items()
+                if not name.startswith('_') and name != 'id'}
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name!r}>"
+
+
+class TextLayer(Layer):
+    kind = 'text'
+
+    def __init__(self, text, xy, family='Arial', size=100, bold=True, italic=False, fill='#FFFFFF',
+                 outline='#000000', outline_width=8, shadow=True, shadow_offset=(5, 5),
+                 shadow_blur=0, align='left', spacing=4, **kwargs):
+        super().__init__(**kwargs)
+        self.text = text
+        self.xy = tuple(xy)
+        self.family = family
+        self.size = size
+        self.bold = bold
+        self.italic = italic
+        self.fill = fill
+        self.outline = outline
+        self.outline_width = outline_width
+        self.shadow = shadow
+        self.shadow_offset = tuple(shadow_offset)
+        self.shadow_blur = shadow_blur
+        # Line alignment and extra line spacing of multiline text
+        self.align = align
+        self.spacing = spacing
+
+    def font(self, scene):
+        return scene.fonts.get_font(self.family, self.size, self.bold, self.italic)
+
+    def rasterize(self, scene):
+        k = scene.scale
+        if k == 1:
+            font = self.font(scene)
+        else:
+            font = scene.fonts.get_font(self.family, max(1, round(self.size * k)), self.bold, self.italic)
+        return scene.text_effects.render_tile(
+            _scaled(self.xy, k), self.text, font, fill=self.fill, outline=self.outline,
+            outline_width=_length(self.outline_width, k), shadow=self.shadow,
+            shadow_offset=_scaled(self.shadow_offset, k), shadow_blur=self.shadow_blur * k,
+            align=self.align, spacing=_length(self.spacing, k))
+
+
+class ShapeLayer(Layer):
+    """A rectangle, ellipse or polygon given in canvas coordinates.
+
+    Colors may carry alpha (``'#FF000080'``).  Fill and outline are drawn
+    into separate supersampled RGBA tiles covering the bounding box only and
+    composited there, so a translucent outline blends over the fill; the
+    scene then blends the tile into just that region of the canvas.
+    """
+
+    kind = 'shape'
+
+    def __init__(self, shape, points, fill=None, outline=None, width=0, radius=0, **kwargs):
+        super().__init__(**kwargs)
+        self.shape = shape
+        self.points = [tuple(p) for p in points]
+        self.fill = fill
+        self.outline = outline
+        self.width = width
+        self.radius = radius
+
+    def rasterize(self, scene):
+        if self.shape not in ('ellipse', 'rectangle', 'polygon'):
+            raise ValueError(f"Unknown shape: {self.shape}")
+        k = scene.scale
+        points = [(x * k, y * k) for x, y in self.points]
+        width = _length(self.width, k)
+        radius = self.radius * k
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        pad = width + 2
+        left, top = math.floor(min(xs)) - pad, math.floor(min(ys)) - pad
+        size = (math.ceil(max(xs)) + pad - left, math.ceil(max(ys)) + pad - top)
+
+        factor = SUPERSAMPLE
+        if self.shape == 'rectangle' and not radius and all(float(v).is_integer() for v in xs + ys):
+            factor = 1  # pixel-aligned edges need no antialiasing
+        while factor > 1 and size[0] * size[1] * factor * factor > MAX_SUPERSAMPLED_PIXELS:
+            factor -= 1
+        big = (size[0] * factor, size[1] * factor)
+        local = [((x - left) * factor, (y - top) * factor) for x, y in points]
+
+        tile = Image.new('RGBA', big, (0, 0, 0, 0))
+        if self.fill:
+            self._draw(ImageDraw.Draw(tile), local, radius * factor, fill=self.fill)
+        if self.outline and width:
+            stroke = Image.new('RGBA', big, (0, 0, 0, 0))
+            self._draw(ImageDraw.Draw(stroke), local, radius * factor, outline=self.outline, width=width * factor)
+            tile.alpha_composite(stroke)
+        if factor > 1:
+            # reduce() averages in premultiplied alpha, so edges keep their color
+            tile = tile.reduce(factor)
+        return tile, (left, top)
+
+    def _draw(self, draw, points, radius, fill=None, outline=None, width=0):
+        if self.shape == 'ellipse':
+            draw.ellipse(points[:2], fill=fill, outline=outline, width=width)
+        elif self.shape == 'rectangle' and radius:
+            draw.rounded_rectangle(points[:2], radius, fill=fill, outline=outline, width=width)
+        elif self.shape == 'rectangle':
+            draw.rectangle(points[:2], fill=fill, outline=outline, width=width)
+        else:
+            draw.polygon(points, fill=fill, outline=outline, width=width)
+
+
+class StickerLayer(Layer):
+    """A pre-rendered RGBA image (emoji, logo, cut-out).
+
+    ``image`` is at design scale.  At other scales ``loader(scale)``, if
+    given, supplies a sharper source (e.g. the emoji at a larger bucket);
+    otherwise ``image`` is resampled.
+    """
+
+    kind = 'sticker'
+
+    def __init__(self, image, xy, loader=None, **kwargs):
+        super().__init__(**kwargs)
+        self.image = image
+        self.xy = tuple(xy)
+        self.loader = loader
+
+    def rasterize(self, scene):
+        k = scene.scale
+        image = self.image
+        if k != 1:
+            size = (max(1, round(image.width * k)), max(1, round(image.height * k)))
+            if self.loader is not None:
+                image = self.loader(k)
+            if image.size != size:
+                image = image.resize(size, Image.LANCZOS)
+        image = image if image.mode == 'RGBA' else image.convert('RGBA')
+        return image, _scaled(self.xy, k)
+
+
+class Background:
+    """The opaque bottom of the stack: a color, a ``Gradient`` or an image.
+
+    Images are either decoded ``Image`` objects or an ``ImageFile``, which
+    is decoded straight at the raster size of each scene it is drawn in.
+    ``blur`` (a Gaussian radius in design units) and then ``adjustments``
+    (an ``AdjustmentStack``) are applied on top of the pristine base, which
+    stays cached together with its blur pyramid, so revising either never
+    re-decodes or re-renders the source.  Blurs of gradients and image files
+    also go to the persistent layer cache, so a background rebuilt in another
+    process finds its blur there without decoding the base at all.
+    """
+
+    def __init__(self, source='#FFFFFF', adjustments=None, blur=0):
+        self.source = source
+        self.adjustments = adjustments if adjustments is not None else AdjustmentStack()
+        self.blur = blur
+        self._base = None
+        self._pyramid = None
+        self._image = None
+
+    def base(self, scene):
+        if self._base is not None and self._base.size != scene.size:
+            # Drawn at another scale than the caches were built for
+            self.invalidate()
+        if self._base is None:
+            size = scene.size
+            source = self.source
+            with span('background.base'):
+                if isinstance(source, Gradient):
+                    image = render_gradient(source, size)
+                    if image.mode not in ('RGB', 'RGBX'):
+                        image = image.convert('RGB')
+                elif isinstance(source, ImageFile):
+                    image = source.load(size)
+                elif isinstance(source, Image.Image):
+                    image = source if source.mode == 'RGB' else source.convert('RGB')
+                    image = fit_image(image, size, COVER)
+                else:
+                    image = Image.new('RGB', size, source)
+            self._base = image
+        return self._base
+
+    def blurred(self, scene):
+        if not self.blur:
+            return self.base(scene)
+        radius = round(self.blur * scene.scale, 1)
+        if self._pyramid is None:
+            key = self._layer_key(scene.size)
+            if key is not None:
+                # Once the pyramid exists (e.g. while dragging the radius) it
+                # answers in memory and intermediate radii are not persisted
+                return cached_layer(key + ('blur', radius), lambda: self._blur(scene, radius))
+        return self._blur(scene, radius)
+
+    def _blur(self, scene, radius):
+        if self._pyramid is None:
+            self._pyramid = BlurPyramid(self.base(scene))
+        with span('background.blur'):
+            return self._pyramid.blur(radius)
+
+    def _layer_key(self, size):
+        # Decoded images and colors have no stable name (and colors are free)
+        if isinstance(self.source, Gradient):
+            return gradient_key(self.source, size)
+        if isinstance(self.source, ImageFile):
+            return self.source.layer_key(size)
+        return None
+
+    def image(self, scene):
+        if self._image is not None and self._image.size != scene.size:
+            self.invalidate()
+        if self._image is None:
+            image = self.blurred(scene)
+            if self.adjustments:
+                with span('background.adjust'):
+                    image = self.adjustments.apply(image)
+            self._image = image
+        return self._image
+
+    def with_adjustments(self, adjustments):
+        return self._derive(adjustments, self.blur)
+
+    def with_blur(self, radius):
+        return self._derive(self.adjustments, radius)
+
+    def detached(self):
+        """The same background without its caches, to draw at another scale."""
+        return Background(self.source, self.adjustments, self.blur)
+
+    def _derive(self, adjustments, blur):
+        background = Background(self.source, adjustments, blur)
+        background._base = self._base
+        background._pyramid = self._pyramid
+        return background
+
+    def invalidate(self):
+        self._base = None
+        self._pyramid = None
+        self._image = None
+
+    def release(self):
+        """Drop caches that can be rebuilt, e.g. once only history refers to it."""
+        self._image = None
+        self._pyramid = None
+        if not isinstance(self.source, Image.Image):
+            self._base = None
+
+
+def _scaled(xy, scale):
+    if scale == 1:
+        return tuple(xy)
+    return tuple(round(v * scale) for v in xy)
+
+
+def _length(value, scale):
+    # Stroke widths stay at least a pixel wide when scaled down
+    if not value or scale == 1:
+        return value
+    return max(1, round(value * scale))
+
+
+class SceneState:
+    """Structural snapshot of a scene: its background and layer properties.
+
+    Cached tiles are not part of the state; layers whose properties differ
+    on restore are re-rasterized lazily.
+    """
+
+    def __init__(self, background, layers):
+        self.background = background
+        self.layers = layers
+
+
+class Scene:
+    """Layers over a background, ``size`` design units rasterized at ``scale``."""
+
+    def __init__(self, size=(1280, 720), background='#FFFFFF', fonts=None, text_effects=None, scale=1):
+        if fonts is None:
+            from .fonts import default_registry
+            fonts = default_registry()
+        self.design_size = tuple(size)
+        self.scale = scale
+        self.size = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+        self.fonts = fonts
+        self.text_effects = text_effects or TextEffectsEngine()
+        self.background = Background(background)
+        self.layers = []
+        self._composite = None
+        self._dirty = []
+        self.revision = 0
+        self._changes = collections.deque(maxlen=CHANGE_LOG)
+
+    # -- editing -----------------------------------------------------------
+
+    def set_background(self, source, adjustments=None, blur=0):
+        """Replace the background; ``source`` may also be a ready ``Background``."""
+        if isinstance(source, Background):
+            self.background = source
+        else:
+            self.background = Background(source, adjustments, blur)
+        self.invalidate()
+
+    def set_adjustments(self, adjustments):
+        """Swap the background's adjustment stack, keeping its cached base."""
+        self.background = self.background.with_adjustments(adjustments)
+        self.invalidate()
+
+    def set_blur(self, radius):
+        """Blur the background by ``radius``, reusing its cached pyramid."""
+        self.background = self.background.with_blur(radius)
+        self.invalidate()
+
+    def add(self, layer, index=None):
+        if index is None:
+            self.layers.append(layer)
+        else:
+            self.layers.insert(index, layer)
+        self.mark_dirty(layer.bbox(self))
+        return layer
+
+    def remove(self, layer):
+        self.mark_dirty(layer.bbox(self))
+        self.layers.remove(layer)
+
+    def update(self, layer, **changes):
+        """Change layer properties and re-rasterize only that layer."""
+        old = layer.bbox(self)
+        for name, value in changes.items():
+            if not hasattr(layer, name):
+                raise AttributeError(f"{type(layer).__name__} has no property {name!r}")
+            setattr(layer, name, value)
+        layer.invalidate()
+        self.mark_dirty(old)
+        self.mark_dirty(layer.bbox(self))
+
+    def move(self, layer, dx, dy):
+        """Move ``layer`` by ``(dx, dy)`` design units.
+
+        A whole-pixel move reuses the cached tile; only its position changes.
+        """
+        tile, (x, y) = layer.tile(self)
+        old = layer.bbox(self)
+        px, py = dx * self.scale, dy * self.scale
+        if float(px).is_integer() and float(py).is_integer():
+            layer._offset = (x + int(px), y + int(py))
+        else:
+            layer.invalidate()
+        if hasattr(layer, 'xy'):
+            layer.xy = (layer.xy[0] + dx, layer.xy[1] + dy)
+        elif hasattr(layer, 'points'):
+            layer.points = [(px + dx, py + dy) for px, py in layer.points]
+        self.mark_dirty(old)
+        self.mark_dirty(layer.bbox(self))
+
+    def raise_layer(self, layer, steps=1):
+        index = self.layers.index(layer)
+        new_index = max(0, min(len(self.layers) - 1, index + steps))
+        self.layers.insert(new_index, self.layers.pop(index))
+        self.mark_dirty(layer.bbox(self))
+
+    def clear(self, background='#FFFFFF'):
+        self.layers = []
+        self.set_background(background)
+
+    def at_scale(self, scale):
+        """A copy of this scene rasterized at ``scale`` pixels per design unit.
+
+        The copy shares the layer and background descriptions but has its
+        own caches, so rendering it (e.g. a 3840x2160 export of a preview
+        scene) leaves this scene's tiles untouched.
+        """
+        scene = Scene(self.design_size, fonts=self.fonts, text_effects=self.text_effects, scale=scale)
+        scene.background = self.background.detached()
+        scene.layers = [layer.detached() for layer in self.layers]
+        return scene
+
+    def layers_of(self, kind):
+        return [layer for layer in self.layers if layer.kind == kind]
+
+    def snapshot(self):
+        return SceneState(self.background, [(layer, layer.properties()) for layer in self.layers])
+
+    def restore(self, state, mark_dirty=True):
+        """Return to ``state``.
+
+        With ``mark_dirty=False`` the caller is responsible for bringing the
+        composite up to date (e.g. by patching the pixels it already has).
+        """
+        changed = None
+        for layer, props in state.layers:
+            if layer.properties() != props:
+                if layer._tile is not None:
+                    changed = union(changed, layer.bbox(self))
+                for name, value in props.items():
+                    setattr(layer, name, value)
+                layer.invalidate()
+        restored = [layer for layer, _ in state.layers]
+        if mark_dirty:
+            for layer in set(self.layers) ^ set(restored):
+                changed = union(changed, layer.bbox(self))
+            for layer, _ in state.layers:
+                changed = union(changed, layer.bbox(self))
+        self.layers = restored
+        if self.background is not state.background:
+            self.background = state.background
+            if mark_dirty:
+                self.invalidate()
+        if mark_dirty and changed is not None:
+            self.mark_dirty(changed)
+
+    # -- composition -------------------------------------------------------
+
+    def invalidate(self):
+        self._dirty = [(0, 0) + self.size]
+
+    def mark_dirty(self, box):
+        box = intersect(box, (0, 0) + self.size)
+        if box is None:
+            return
+        merged = []
+        for other in self._dirty:
+            if intersect(box, other) is not None:
+                box = union(box, other)
+            else:
+                merged.append(other)
+        merged.append(box)
+        if len(merged) > MAX_DIRTY_RECTS:
+            total = None
+            for other in merged:
+                total = union(total, other)
+            merged = [total]
+        self._dirty = merged
+
+    @property
+    def dirty(self):
+        return list(self._dirty)
+
+    @property
+    def canvas(self):
+        """The composite as last rendered, without flushing pending edits."""
+        if self._composite is None:
+            self.render()
+        return self._composite
+
+    def render(self):
+        """Return the composited canvas, recomposing only dirty regions.
+
+        The returned image is owned by the scene and updated in place.
+        """
+        if self._composite is None:
+            self._composite = Image.new('RGB', self.size)
+            self.invalidate()
+        dirty, self._dirty = self._dirty, []
+        if dirty:
+            with span('scene.compose', regions=len(dirty)):
+                for box in dirty:
+                    self._composite.paste(self.compose_region(box), box[:2])
+            self._changed(dirty)
+        return self._composite
+
+    def changes_since(self, revision):
+        """Canvas boxes changed after ``revision``, or None if they are no longer all logged."""
+        if revision == self.revision:
+            return []
+        if revision > self.revision or not self._changes or self._changes[0][0] > revision + 1:
+            return None
+        return [box for rev, boxes in self._changes if rev > revision for box in boxes]
+
+    def _changed(self, boxes):
+        self.revision += 1
+        self._changes.append((self.revision, tuple(boxes)))
+
+    def compose_region(self, box):
+        region = self.background.image(self).crop(box)
+        for layer in self.layers:
+            if not layer.visible:
+                continue
+            tile, (x, y) = layer.tile(self)
+            overlap = intersect(box, (x, y, x + tile.width, y + tile.height))
+            if overlap is None:
+                continue
+            src = tile.crop((overlap[0] - x, overlap[1] - y, overlap[2] - x, overlap[3] - y))
+            region.paste(src, (overlap[0] - box[0], overlap[1] - box[1]), src)
+        return region
+
+    def patch(self, image, box):
+        """Paste already-composited pixels into the canvas without recomposing."""
+        if self._composite is None:
+            self.render()
+        self._composite.paste(image, box[:2])
+        self._changed([box])
+
+    def flatten(self):
+        """A standalone copy of the current composite."""
+        return self.render().copy()
@@ -0,0 +1,439 @@
+"""Local HTTP render service.
+
+Renders specs (see ``render``) on demand for other programs on the same
+machine::
+
+    python -m thumbnail_engine.service --port 8731 --workers 4
+
+    curl -s --data @spec.json 'http://127.0.0.1:8731/render?formats=JPEG,WEBP' -o thumb.jpg
+    curl -s http://127.0.0.1:8731/metrics
+
+Endpoints:
+
+``POST /render``
+    body is a JSON spec; ``formats`` (comma separated, default ``JPEG``) and
+    ``budget`` (bytes) query parameters pick the export.  Responds with the
+    encoded image and ``X-Spec-Hash``, ``X-Cache`` (``hit``, ``miss`` or
+    ``coalesced``) and ``X-Render-Ms`` headers.
+``GET /render/<hash>``
+    a cached result by its spec hash, or 404
+``GET /metrics``
+    queue depth, latency percentiles and cache hit rate as JSON
+``GET /health``
+
+Renders run in a bounded process pool (the same forkserver workers as
+``batch``); at most ``workers`` jobs are in the pool and up to
+``max_queue`` more wait for a slot.  Beyond that new renders are refused
+with 503 and a ``Retry-After`` header rather than queued without bound.
+The spec hash covers the resolved spec, the export options and the size
+and mtime of every file the spec references, so identical requests that
+arrive while a render is in flight share it, and later ones are served
+from an LRU of encoded results until a referenced file changes.
+
+The server is plain asyncio on the standard library and binds to
+127.0.0.1 by default; ``port=0`` picks a free port for tests.
+"""
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from .batch import worker_context
+from .cache import LRUCache
+from .export import FORMATS, JPEG, PNG, WEBP, YOUTUBE_MAX_BYTES
+from .render import SpecError, resolve
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8731
+
+# Renders waiting for a worker before new ones are refused
+MAX_QUEUE = 16
+CACHE_ENTRIES = 512
+CACHE_BYTES = 256 * 1024 * 1024
+MAX_BODY = 1024 * 1024
+# Requests kept for the latency percentiles in /metrics
+LATENCY_WINDOW = 1000
+RETRY_AFTER = 1
+
+CONTENT_TYPES = {JPEG: 'image/jpeg', WEBP: 'image/webp', PNG: 'image/png'}
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+_renderer = None
+
+
+def _init_worker(base_dir):
+    global _renderer
+    from .render import Renderer
+    _renderer = Renderer(base_dir=base_dir)
+
+
+def render_job(spec, formats, budget):
+    """Render and encode one spec in a worker; returns ``(format, data, render_ms)``."""
+    from .export import default_engine
+    if _renderer is None:
+        _init_worker(None)
+    start = time.perf_counter()
+    image = _renderer.render(spec)
+    result = default_engine().export(image, budget, formats)
+    return result.best.format, result.best.data, round((time.perf_counter() - start) * 1000, 1)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class ServiceMetrics:
+    """Counters and a sliding window of request latencies."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=window)
+        self.render_times = deque(maxlen=window)
+
+    def snapshot(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'requests': self.requests,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'hit_rate': round((self.hits + self.coalesced) / lookups, 3) if lookups else None,
+            'latency_ms': _percentiles(self.latencies),
+            'render_ms': _percentiles(self.render_times),
+        }
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return None
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))]
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': values[-1]}
+
+
+class RenderService:
+    """The asyncio server, its process pool and its result cache."""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, max_queue=MAX_QUEUE,
+                 cache_bytes=CACHE_BYTES, base_dir=None):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.base_dir = base_dir
+        self.cache = LRUCache(CACHE_ENTRIES, cache_bytes)
+        self.metrics = ServiceMetrics()
+        self.inflight = {}  # spec hash -> future of (format, data, render_ms)
+        self.running = 0
+        self.server = None
+        self.pool = None
+        self._slots = None
+        self._connections = {}  # handler task -> writer
+
+    @property
+    def pending(self):
+        return len(self.inflight)
+
+    @property
+    def queue_depth(self):
+        return self.pending - self.running
+
+    async def start(self):
+        self.pool = self._new_pool()
+        self._slots = asyncio.Semaphore(self.workers)
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            # Idle keep-alive connections would otherwise hold wait_closed open
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self.server.wait_closed()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context(),
+                                   initializer=_init_worker, initargs=(self.base_dir,))
+
+    # -- rendering -----------------------------------------------------------
+
+    def spec_hash(self, spec, formats, budget):
+        """Content hash of what a render of ``spec`` would produce."""
+        try:
+            resolved = resolve(spec)
+        except AttributeError:
+            raise SpecError("Spec must be a JSON object") from None
+        files = []
+        for path in _referenced_paths(resolved):
+            path = self._path(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                raise SpecError(f"No such file: {path}") from None
+            files.append([path, stat.st_mtime_ns, stat.st_size])
+        key = json.dumps({'spec': resolved, 'formats': list(formats), 'budget': budget, 'files': files},
+                         sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    async def render(self, spec, formats=(JPEG,), budget=YOUTUBE_MAX_BYTES):
+        """``(hash, (format, data, render_ms), cache state)`` for ``spec``."""
+        digest = self.spec_hash(spec, formats, budget)
+        cached = self.cache.get(digest)
+        if cached is not None:
+            self.metrics.hits += 1
+            return digest, cached, 'hit'
+        future = self.inflight.get(digest)
+        if future is not None:
+            self.metrics.coalesced += 1
+            return digest, await asyncio.shield(future), 'coalesced'
+        if self.pending >= self.workers + self.max_queue:
+            self.metrics.rejected += 1
+            raise HTTPError(503, "Render queue is full", {'Retry-After': str(RETRY_AFTER)})
+        self.metrics.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[digest] = future
+        try:
+            result = await self._run(spec, formats, budget)
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Retrieved here so a render nobody else waited on does not warn
+            future.exception()
+            raise
+        else:
+            self.cache.put(digest, result, len(result[1]))
+            self.metrics.render_times.append(result[2])
+            future.set_result(result)
+        finally:
+            del self.inflight[digest]
+        return digest, result, 'miss'
+
+    async def _run(self, spec, formats, budget):
+        async with self._slots:
+            self.running += 1
+            try:
+                loop = asyncio.get_running_loop()
+                pool = self.pool
+                try:
+                    return await loop.run_in_executor(pool, render_job, spec, formats, budget)
+                except BrokenProcessPool:
+                    # A worker died (e.g. out of memory); later renders get a fresh
+                    # pool.  Only the first render to notice replaces it, and the
+                    # broken one is shut down so its manager thread and the
+                    # surviving workers do not linger.
+                    if self.pool is pool:
+                        self.pool = self._new_pool()
+                        pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+            finally:
+                self.running -= 1
+
+    def _path(self, path):
+        if self.base_dir and not os.path.isabs(path):
+            path = os.path.join(self.base_dir, path)
+        return os.path.abspath(path)
+
+    def snapshot(self):
+        data = self.metrics.snapshot()
+        data.update(queue_depth=self.queue_depth, running=self.running, workers=self.workers,
+                    max_queue=self.max_queue, cache_entries=len(self.cache), cache_bytes=self.cache.weight)
+        return data
+
+    # -- HTTP ----------------------------------------------------------------
+
+    async def _serve(self, reader, writer):
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body, keep_alive = request
+                start = time.perf_counter()
+                status, response_headers, payload = await self._respond(method, target, body)
+                if method == 'POST' and target.startswith('/render'):
+                    self.metrics.latencies.append(round((time.perf_counter() - start) * 1000, 1))
+                writer.write(_response(status, response_headers, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HTTPError as exc:
+            # Malformed request framing; answer once and hang up
+            writer.write(_response(exc.status, exc.headers, _error_body(exc), False))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _respond(self, method, target, body):
+        self.metrics.requests += 1
+        url = urlsplit(target)
+        try:
+            if url.path == '/render':
+                if method != 'POST':
+                    raise HTTPError(405, "Use POST", {'Allow': 'POST'})
+                return await self._render(parse_qs(url.query), body)
+            if url.path.startswith('/render/'):
+                if method != 'GET':
+                    raise HTTPError(405, "Use GET", {'Allow': 'GET'})
+                cached = self.cache.get(url.path[len('/render/'):])
+                if cached is None:
+                    raise HTTPError(404, "Not cached")
+                return 200, _image_headers(url.path[len('/render/'):], cached, 'hit'), cached[1]
+            if url.path in ('/metrics', '/health'):
+                if method != 'GET':
+                    raise HTTPError(405, "Use GET", {'Allow': 'GET'})
+                data = self.snapshot() if url.path == '/metrics' else {'ok': True}
+                return 200, {'Content-Type': 'application/json'}, json.dumps(data).encode('utf-8')
+            raise HTTPError(404, f"No such endpoint: {url.path}")
+        except HTTPError as exc:
+            return exc.status, exc.headers, _error_body(exc)
+        except SpecError as exc:
+            return 400, {}, _error_body(exc)
+        except Exception as exc:
+            self.metrics.errors += 1
+            return 500, {}, _error_body(exc)
+
+    async def _render(self, query, body):
+        try:
+            spec = json.loads(body)
+        except ValueError as exc:
+            raise SpecError(f"Invalid JSON: {exc}") from None
+        if not isinstance(spec, dict):
+            raise SpecError("Spec must be a JSON object")
+        formats = []
+        for value in query.get('formats', [JPEG]):
+            formats.extend(f.strip().upper() for f in value.split(',') if f.strip())
+        unknown = [f for f in formats if f not in FORMATS]
+        if unknown or not formats:
+            raise SpecError(f"Unknown format(s): {', '.join(unknown) or '(none)'}")
+        try:
+            budget = int(query.get('budget', [YOUTUBE_MAX_BYTES])[0])
+        except ValueError:
+            raise SpecError("budget must be an integer") from None
+        digest, result, state = await self.render(spec, tuple(formats), budget)
+        return 200, _image_headers(digest, result, state), result[1]
+
+
+def _referenced_paths(spec):
+    background = spec.get('background')
+    if isinstance(background, dict) and 'image' in background:
+        yield background['image']
+    for layer in spec.get('layers', ()):
+        if isinstance(layer, dict) and layer.get('type') in ('sticker', 'image') and 'path' in layer:
+            yield layer['path']
+
+
+def _image_headers(digest, result, state):
+    format, _, render_ms = result
+    return {'Content-Type': CONTENT_TYPES.get(format, 'application/octet-stream'),
+            'X-Spec-Hash': digest, 'X-Cache': state, 'X-Render-Ms': str(render_ms)}
+
+
+def _error_body(exc):
+    return json.dumps({'error': str(exc)}).encode('utf-8')
+
+
+async def _read_request(reader):
+    """``(method, target, headers, body, keep_alive)``, or None at EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, "Bad Content-Length") from None
+    if length > MAX_BODY:
+        raise HTTPError(413, f"Body is over {MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b''
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+    return method.upper(), target, headers, body, keep_alive
+
+
+def _response(status, headers, payload, keep_alive):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    headers = dict(headers)
+    headers.setdefault('Content-Type', 'application/json')
+    headers['Content-Length'] = str(len(payload))
+    headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve thumbnail renders over HTTP on this machine.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--queue', type=int, default=MAX_QUEUE,
+                        help="renders that may wait for a worker (default: %(default)s)")
+    parser.add_argument('--cache-mb', type=int, default=CACHE_BYTES // (1024 * 1024),
+                        help="encoded results kept in memory (default: %(default)s)")
+    parser.add_argument('--base-dir', default='.',
+                        help="directory relative image paths in specs resolve against")
+    args = parser.parse_args(argv)
+
+    async def serve():
+        service = RenderService(args.host, args.port, args.workers, args.queue,
+                                args.cache_mb * 1024 * 1024, os.path.abspath(args.base_dir))
+        await service.start()
+        print(f"Serving on http://{service.host}:{service.port} with {service.workers} workers",
+              file=sys.stderr, flush=True)
+        try:
+            await service.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
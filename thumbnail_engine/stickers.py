@@ -0,0 +1,315 @@
+"""Emoji and PNG sticker atlas.
+
+Stickers are rasterized once per size bucket (the smallest of
+``SIZE_BUCKETS`` at least as large as the requested size) and packed into
+one atlas sheet per bucket.  Placing a sticker crops its cell out of the
+sheet and, for sizes between buckets, scales it down.  Sheets are saved as
+PNGs in the cache directory with their index in a text chunk, so each emoji
+is rasterized once per bucket ever, not once per click.
+
+Emoji come from the first installed color-emoji font.  Bitmap fonts (CBDT or
+sbix, e.g. Noto Color Emoji and Apple Color Emoji) only open at their fixed
+strike sizes, so the strikes in ``STRIKE_SIZES`` are tried in turn and the
+glyph is scaled to the bucket.
+
+PNG sticker packs are directories of images on ``THUMBNAIL_STICKER_PATH``
+(or picked in the editor).  Each image is trimmed to its opaque area and
+cached the same way, keyed on its path and mtime.
+"""
+import json
+import os
+import threading
+
+from PIL import Image, ImageDraw, ImageFont, PngImagePlugin
+
+from .cache import LRUCache, cache_dir, image_weight
+from .profiling import span
+
+SIZE_BUCKETS = (32, 64, 128, 256, 512)
+ATLAS_VERSION = 1
+
+# Sheets are this wide; rows are added as stickers arrive
+ATLAS_WIDTH = 2048
+# A full sheet is started over rather than grown without bound
+MAX_CELLS = 256
+# Stickers already scaled to a size between buckets
+SCALED_ENTRIES = 64
+
+# Installed families tried first (their file identifies the atlas entries),
+# then file names resolved by Pillow's own font search
+EMOJI_FAMILIES = ('Segoe UI Emoji', 'Apple Color Emoji', 'Noto Color Emoji', 'Twemoji Mozilla')
+EMOJI_FONTS = ('seguiemj.ttf', 'Apple Color Emoji.ttc', 'NotoColorEmoji.ttf')
+
+# Strike sizes of common bitmap emoji fonts (Noto: 109, Apple: 20-160)
+STRIKE_SIZES = (160, 109, 96, 64, 48, 40, 32, 20)
+
+STICKER_EXTENSIONS = ('.png', '.webp', '.gif')
+
+
+def size_bucket(size):
+    for bucket in SIZE_BUCKETS:
+        if size <= bucket:
+            return bucket
+    return SIZE_BUCKETS[-1]
+
+
+class AtlasSheet:
+    """Square cells of one bucket size packed row by row into one image."""
+
+    def __init__(self, cell):
+        self.cell = cell
+        self.columns = max(1, ATLAS_WIDTH // cell)
+        self.image = None
+        self.slots = {}  # key -> (index, width, height)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def get(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        index, width, height = slot
+        x, y = self._origin(index)
+        return self.image.crop((x, y, x + width, y + height))
+
+    def add(self, key, image):
+        """Pack ``image`` (at most ``cell`` x ``cell``) under ``key``."""
+        if len(self.slots) >= MAX_CELLS:
+            self.image = None
+            self.slots = {}
+        index = len(self.slots)
+        needed = (index // self.columns + 1) * self.cell
+        if self.image is None or self.image.height < needed:
+            height = max(needed, self.image.height * 2 if self.image else self.cell)
+            grown = Image.new('RGBA', (self.columns * self.cell, height), (0, 0, 0, 0))
+            if self.image is not None:
+                grown.paste(self.image, (0, 0))
+            self.image = grown
+        self.image.paste(image, self._origin(index))
+        self.slots[key] = (index, image.width, image.height)
+
+    def _origin(self, index):
+        row, column = divmod(index, self.columns)
+        return column * self.cell, row * self.cell
+
+    def save(self, path):
+        info = PngImagePlugin.PngInfo()
+        info.add_text('atlas', json.dumps({'version': ATLAS_VERSION, 'cell': self.cell,
+                                           'slots': {k: list(v) for k, v in self.slots.items()}}))
+        tmp = path + '.tmp'
+        try:
+            # Trim unused rows so the file only holds filled cells
+            rows = (len(self.slots) - 1) // self.columns + 1
+            self.image.crop((0, 0, self.image.width, rows * self.cell)).save(
+                tmp, 'PNG', pnginfo=info, compress_level=1)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    @classmethod
+    def load(cls, path, cell):
+        sheet = cls(cell)
+        try:
+            with Image.open(path) as image:
+                data = json.loads(image.text.get('atlas', '{}'))
+                if data.get('version') != ATLAS_VERSION or data.get('cell') != cell:
+                    return sheet
+                sheet.image = image.convert('RGBA')
+        except (OSError, ValueError, SyntaxError):
+            return sheet
+        sheet.slots = {key: tuple(slot) for key, slot in data['slots'].items()}
+        return sheet
+
+
+class StickerCache:
+    """Per-bucket atlases of emoji and sticker images.
+
+    ``directory`` holds the persisted sheets; ``None`` uses the shared cache
+    directory and ``False`` keeps the atlases in memory only.
+    """
+
+    def __init__(self, fonts=None, directory=None):
+        self.fonts = fonts
+        self.directory = directory
+        self.sheets = {}
+        self.scaled = LRUCache(SCALED_ENTRIES)
+        self._emoji_font = None
+        self._lock = threading.Lock()
+
+    def emoji(self, emoji, size=150):
+        """``emoji`` as an RGBA sticker whose longer side is about ``size``."""
+        identity, _ = self.emoji_font()
+        return self.sticker(f"emoji:{identity}:{emoji}", size,
+                            lambda bucket: self._rasterize_emoji(emoji, bucket))
+
+    def image(self, path, size=150):
+        """A sticker from an image file, trimmed and fitted inside ``size``."""
+        path = os.path.abspath(path)
+        key = f"file:{path}:{os.stat(path).st_mtime_ns}"
+        return self.sticker(key, size, lambda bucket: _open_rgba(path))
+
+    def sticker(self, key, size, rasterize):
+        """Crop ``key`` from the atlas, calling ``rasterize(bucket)`` on a miss."""
+        bucket = size_bucket(size)
+        if size != bucket:
+            tile = self.scaled.get((key, size))
+            if tile is not None:
+                return tile
+        with self._lock:
+            sheet = self._sheet(bucket)
+            tile = sheet.get(key)
+            if tile is None:
+                with span('sticker.rasterize', bucket=bucket):
+                    sheet.add(key, _fit(rasterize(bucket), bucket))
+                path = self._path(bucket)
+                if path is not None:
+                    sheet.save(path)
+                tile = sheet.get(key)
+        if size != bucket and tile.width > 1:
+            scale = size / bucket
+            tile = tile.resize((max(1, round(tile.width * scale)), max(1, round(tile.height * scale))),
+                               Image.LANCZOS)
+            self.scaled.put((key, size), tile, image_weight(tile))
+        return tile
+
+    def clear(self):
+        with self._lock:
+            self.sheets.clear()
+            self.scaled.clear()
+
+    def emoji_font(self):
+        """``(identity, source)`` of the emoji font; ``source`` is a path or name."""
+        if self._emoji_font is None:
+            self._emoji_font = _find_emoji_font(self.fonts)
+        return self._emoji_font
+
+    def _rasterize_emoji(self, emoji, bucket):
+        _, source = self.emoji_font()
+        font = _open_emoji_font(source, bucket)
+        left, top, right, bottom = (int(v) for v in font.getbbox(emoji))
+        image = Image.new('RGBA', (max(1, right - left + 1), max(1, bottom - top + 1)), (0, 0, 0, 0))
+        ImageDraw.Draw(image).text((-left, -top), emoji, font=font, fill='black', embedded_color=True)
+        return image
+
+    def _sheet(self, bucket):
+        sheet = self.sheets.get(bucket)
+        if sheet is None:
+            path = self._path(bucket)
+            sheet = AtlasSheet.load(path, bucket) if path and os.path.exists(path) else AtlasSheet(bucket)
+            self.sheets[bucket] = sheet
+        return sheet
+
+    def _path(self, bucket):
+        if self.directory is False:
+            return None
+        try:
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                directory = self.directory
+            else:
+                directory = cache_dir('stickers')
+        except OSError:
+            return None
+        return os.path.join(directory, f'atlas-{bucket}.png')
+
+
+def _find_emoji_font(fonts):
+    if fonts is None:
+        from .fonts import default_registry
+        fonts = default_registry()
+    for family in EMOJI_FAMILIES:
+        face = fonts.find(family, fallback=False)
+        if face is not None:
+            return f"{face.path}#{os.stat(face.path).st_mtime_ns}", face.path
+    for name in EMOJI_FONTS:
+        try:
+            ImageFont.truetype(name, SIZE_BUCKETS[0])
+        except OSError:
+            # Bitmap fonts refuse sizes other than their strikes
+            try:
+                ImageFont.truetype(name, STRIKE_SIZES[1])
+            except OSError:
+                continue
+        return name, name
+    return 'default', None
+
+
+def _open_emoji_font(source, size):
+    if source is None:
+        return ImageFont.load_default(size)
+    try:
+        return ImageFont.truetype(source, size)
+    except OSError:
+        pass
+    # Smallest strike that covers the bucket, else the largest there is
+    larger = sorted(s for s in STRIKE_SIZES if s >= size)
+    smaller = sorted((s for s in STRIKE_SIZES if s < size), reverse=True)
+    for strike in larger + smaller:
+        try:
+            return ImageFont.truetype(source, strike)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def _open_rgba(path):
+    with Image.open(path) as image:
+        return image.convert('RGBA')
+
+
+def _fit(image, bucket):
+    # Trim to the opaque area and scale so the longer side is the bucket
+    box = image.getchannel('A').getbbox()
+    if box is None:
+        return Image.new('RGBA', (1, 1), (0, 0, 0, 0))
+    image = image.crop(box)
+    scale = bucket / max(image.size)
+    if scale != 1:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                             Image.LANCZOS)
+    return image
+
+
+def sticker_dirs():
+    """Directories searched for sticker packs (``THUMBNAIL_STICKER_PATH``)."""
+    value = os.environ.get('THUMBNAIL_STICKER_PATH', '')
+    return [d for d in value.split(os.pathsep) if d and os.path.isdir(d)]
+
+
+def sticker_pack(directory):
+    """Sorted image paths of one pack directory."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(os.path.join(directory, name) for name in names
+                  if name.lower().endswith(STICKER_EXTENSIONS))
+
+
+def sticker_packs(dirs=None):
+    """``{pack name: [image paths]}`` for every pack under ``dirs``.
+
+    Each subdirectory is a pack; images directly inside a search
+    directory form a pack named after it.
+    """
+    packs = {}
+    for root in dirs if dirs is not None else sticker_dirs():
+        for path in [root] + sorted(os.path.join(root, d) for d in os.listdir(root)):
+            if os.path.isdir(path):
+                images = sticker_pack(path)
+                if images:
+                    packs.setdefault(os.path.basename(os.path.normpath(path)), images)
+    return packs
+
+
+_default_stickers = None
+_default_lock = threading.Lock()
+
+
+def default_stickers():
+    global _default_stickers
+    with _default_lock:
+        if _default_stickers is None:
+            _default_stickers = StickerCache()
+        return _default_stickers
@@ -0,0 +1,146 @@
+"""Templates as data files with parameter slots.
+
+A template is a JSON file with a ``spec`` (see ``render``) whose strings may
+refer to ``params``.  A string that is exactly ``"{name}"`` is replaced by the
+parameter's value, whatever its type (a color, a gradient object, a list of
+points); ``{name}`` inside a longer string is replaced by its text.  Each
+param is either its default value or ``{"default": ..., "choices": [...]}``
+when it has a known set of alternatives.  The ``text`` block only sets
+defaults for text layers; a template draws its title with a text layer of
+its own, which takes them::
+
+    {
+        "name": "vlog",
+        "params": {"title": "MY DAY VLOG!",
+                   "background": {"default": "#FFE66D", "choices": ["#FF6B6B", "#4ECDC4"]}},
+        "spec": {"background": "{background}",
+                 "layers": [{"type": "text", "name": "title"}],
+                 "text": {"text": "{title}"}}
+    }
+
+Built-in templates ship in ``data/templates/``; directories listed in
+``THUMBNAIL_TEMPLATE_PATH`` are searched first, so a user file overrides a
+built-in of the same name.
+"""
+import json
+import os
+import re
+
+BUILTIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'templates')
+
+_SLOT = re.compile(r'\{(\w+)\}')
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class Template:
+    def __init__(self, name, spec, params=None, description=''):
+        self.name = name
+        self.spec = spec
+        self.description = description
+        self.defaults = {}
+        self.choices = {}
+        for param, value in (params or {}).items():
+            if isinstance(value, dict) and 'default' in value:
+                self.defaults[param] = value['default']
+                if 'choices' in value:
+                    self.choices[param] = list(value['choices'])
+            else:
+                self.defaults[param] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        try:
+            return cls(data['name'], data['spec'], data.get('params'), data.get('description', ''))
+        except KeyError as exc:
+            raise TemplateError(f"Template is missing {exc.args[0]!r}") from None
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        data.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+        return cls.from_dict(data)
+
+    def instantiate(self, values=None):
+        """The template's spec with every slot filled in."""
+        values = values or {}
+        unknown = set(values) - set(self.defaults)
+        if unknown:
+            raise TemplateError(f"Template {self.name!r} has no parameter(s): {', '.join(sorted(unknown))}")
+        params = dict(self.defaults)
+        params.update(values)
+        return _substitute(self.spec, params, self.name)
+
+    def __repr__(self):
+        return f"<Template {self.name!r} params={sorted(self.defaults)}>"
+
+
+def _substitute(value, params, name):
+    if isinstance(value, str):
+        match = _SLOT.fullmatch(value)
+        if match:
+            return _lookup(params, match.group(1), name)
+        return _SLOT.sub(lambda m: str(_lookup(params, m.group(1), name)), value)
+    if isinstance(value, dict):
+        return {key: _substitute(item, params, name) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_substitute(item, params, name) for item in value]
+    return value
+
+
+def _lookup(params, key, name):
+    try:
+        return params[key]
+    except KeyError:
+        raise TemplateError(f"Template {name!r} refers to undeclared parameter {key!r}") from None
+
+
+def template_dirs():
+    dirs = [d for d in os.environ.get('THUMBNAIL_TEMPLATE_PATH', '').split(os.pathsep) if d]
+    dirs.append(BUILTIN_DIR)
+    return dirs
+
+
+class TemplateLibrary:
+    """Templates found in ``dirs``, loaded on first use and reloaded on change."""
+
+    def __init__(self, dirs=None):
+        self.dirs = list(dirs) if dirs is not None else template_dirs()
+        self._loaded = {}  # path -> (mtime_ns, Template)
+
+    def paths(self):
+        found = {}
+        for directory in reversed(self.dirs):
+            if not os.path.isdir(directory):
+                continue
+            for entry in sorted(os.listdir(directory)):
+                if entry.endswith('.json'):
+                    found[os.path.splitext(entry)[0]] = os.path.join(directory, entry)
+        return found
+
+    def names(self):
+        return sorted(self.paths())
+
+    def get(self, name):
+        path = self.paths().get(name)
+        if path is None:
+            raise TemplateError(f"Unknown template: {name}")
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._loaded.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, Template.load(path))
+            self._loaded[path] = cached
+        return cached[1]
+
+
+_default_library = None
+
+
+def default_library():
+    global _default_library
+    if _default_library is None:
+        _default_library = TemplateLibrary()
+    return _default_library
@@ -0,0 +1,180 @@
+"""Mask-based text effects.
+
+The glyphs are rasterized once into an ``L`` mask (plus one stroked mask for
+the outline).  Outline, drop shadow and fill are then composited from those
+masks with solid colors, so changing a color never touches the rasterizer.
+Text with newlines is laid out by Pillow's multiline drawing with the given
+``align`` and ``spacing``.
+"""
+import math
+
+from PIL import Image, ImageColor, ImageDraw, ImageFilter
+
+from .cache import LRUCache, image_weight
+from .profiling import span
+
+
+def font_key(font):
+    # FreeType fonts are identified by file, face index and size; anything
+    # else (e.g. the bitmap default font) falls back to object identity.
+    path = getattr(font, 'path', None)
+    if isinstance(path, str):
+        return (path, getattr(font, 'index', 0), getattr(font, 'size', None))
+    return ('id', id(font))
+
+
+_ALIGN_SHIFT = {'left': 0, 'center': 0.5, 'right': 1}
+
+
+class TextMasks:
+    """Cached masks for one piece of text.
+
+    ``origin`` is the position of the text draw origin inside every mask, so a
+    mask pasted at ``(x - origin[0], y - origin[1])`` lines up with
+    ``ImageDraw.text((x, y), ...)``.
+    """
+
+    def __init__(self, fill, outline, shadow, origin):
+        self.fill = fill
+        self.outline = outline
+        self.shadow = shadow
+        self.origin = origin
+
+    @property
+    def size(self):
+        return self.fill.size
+
+    def box(self, x, y):
+        left, top = x - self.origin[0], y - self.origin[1]
+        return (left, top, left + self.fill.width, top + self.fill.height)
+
+
+class TextEffectsEngine:
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024):
+        self.cache = LRUCache(max_entries, max_bytes)
+
+    def masks(self, text, font, outline_width=0, shadow_blur=0, align='left', spacing=4):
+        key = (text, font_key(font), outline_width, shadow_blur, align, spacing)
+        masks = self.cache.get(key)
+        if masks is None:
+            with span('text.rasterize'):
+                masks = self._rasterize(text, font, outline_width, shadow_blur, align, spacing)
+            weight = sum(image_weight(m) for m in (masks.fill, masks.outline, masks.shadow) if m is not None)
+            self.cache.put(key, masks, weight)
+        return masks
+
+    def _rasterize(self, text, font, outline_width, shadow_blur, align, spacing):
+        lines = _layout_lines(text, font, outline_width, align, spacing)
+        left, top, right, bottom = _lines_bbox(lines, font, outline_width)
+        # Leave room for the blur kernel to fade out
+        pad = int(shadow_blur * 3) + 1
+        size = (right - left + 2 * pad, bottom - top + 2 * pad)
+        origin = (pad - left, pad - top)
+
+        fill = Image.new('L', size, 0)
+        draw = ImageDraw.Draw(fill)
+        for line, (dx, dy) in lines:
+            draw.text((origin[0] + dx, origin[1] + dy), line, font=font, fill=255)
+
+        outline = None
+        if outline_width > 0:
+            outline = Image.new('L', size, 0)
+            draw = ImageDraw.Draw(outline)
+            for line, (dx, dy) in lines:
+                draw.text((origin[0] + dx, origin[1] + dy), line, font=font, fill=255,
+                          stroke_width=outline_width, stroke_fill=255)
+
+        shadow = outline if outline is not None else fill
+        if shadow_blur > 0:
+            shadow = shadow.filter(ImageFilter.GaussianBlur(shadow_blur))
+
+        return TextMasks(fill, outline, shadow, origin)
+
+    def draw(self, canvas, xy, text, font, fill='#FFFFFF', outline='#000000', outline_width=0,
+             shadow=False, shadow_offset=(5, 5), shadow_color='#000000', shadow_opacity=136,
+             shadow_blur=0, align='left', spacing=4):
+        """Composite text with outline and drop shadow onto ``canvas``.
+
+        Returns the bounding box of the touched region.
+        """
+        x, y = xy
+        masks = self.masks(text, font, outline_width, shadow_blur if shadow else 0, align, spacing)
+        box = masks.box(x, y)
+        left, top = box[:2]
+
+        if shadow and shadow_opacity > 0:
+            dx, dy = shadow_offset
+            shadow_mask = masks.shadow
+            if shadow_opacity < 255:
+                shadow_mask = shadow_mask.point(lambda v: v * shadow_opacity // 255)
+            canvas.paste(shadow_color, (box[0] + dx, box[1] + dy), shadow_mask)
+            box = (min(box[0], box[0] + dx), min(box[1], box[1] + dy),
+                   max(box[2], box[2] + dx), max(box[3], box[3] + dy))
+
+        if masks.outline is not None:
+            canvas.paste(outline, (left, top), masks.outline)
+        canvas.paste(fill, (left, top), masks.fill)
+        return box
+
+    def render_tile(self, xy, text, font, fill='#FFFFFF', outline='#000000', outline_width=0,
+                    shadow=False, shadow_offset=(5, 5), shadow_color='#000000', shadow_opacity=136,
+                    shadow_blur=0, align='left', spacing=4):
+        """Render the same effects into a transparent RGBA tile.
+
+        Returns ``(tile, (left, top))`` with the tile's canvas position.
+        """
+        x, y = xy
+        masks = self.masks(text, font, outline_width, shadow_blur if shadow else 0, align, spacing)
+        left, top, right, bottom = masks.box(x, y)
+        dx, dy = shadow_offset if shadow else (0, 0)
+        tile_left, tile_top = min(left, left + dx), min(top, top + dy)
+        size = (max(right, right + dx) - tile_left, max(bottom, bottom + dy) - tile_top)
+
+        with span('text.composite'):
+            tile = Image.new('RGBA', size, (0, 0, 0, 0))
+            text_pos = (left - tile_left, top - tile_top)
+            if shadow and shadow_opacity > 0:
+                _over(tile, shadow_color, masks.shadow, (text_pos[0] + dx, text_pos[1] + dy), shadow_opacity)
+            if masks.outline is not None:
+                _over(tile, outline, masks.outline, text_pos)
+            _over(tile, fill, masks.fill, text_pos)
+        return tile, (tile_left, tile_top)
+
+
+def _over(tile, color, mask, dest, opacity=255):
+    # Straight-alpha "over" of a solid color through a mask
+    rgba = ImageColor.getrgb(color) if isinstance(color, str) else tuple(color)
+    alpha = opacity * (rgba[3] if len(rgba) == 4 else 255) // 255
+    if alpha < 255:
+        mask = mask.point(lambda v: v * alpha // 255)
+    layer = Image.new('RGBA', mask.size, rgba[:3] + (0,))
+    layer.putalpha(mask)
+    tile.alpha_composite(layer, dest)
+
+
+def _layout_lines(text, font, stroke_width=0, align='left', spacing=4):
+    # Each line with its offset from the draw origin, placed as Pillow's
+    # multiline text places them with this stroke.  Fill and outline are
+    # drawn line by line at these offsets; drawn whole, the fill (no stroke)
+    # would get tighter line spacing than its outline.
+    lines = text.split('\n')
+    if len(lines) == 1:
+        return [(text, (0, 0))]
+    if align not in _ALIGN_SHIFT:
+        raise ValueError(f"Unknown alignment: {align}")
+    step = font.getbbox('A', stroke_width=stroke_width)[3] + stroke_width + spacing
+    widths = [font.getlength(line) for line in lines]
+    widest = max(widths)
+    return [(line, ((widest - width) * _ALIGN_SHIFT[align], i * step))
+            for i, (line, width) in enumerate(zip(lines, widths))]
+
+
+def _lines_bbox(lines, font, stroke_width=0):
+    scratch = ImageDraw.Draw(Image.new('L', (1, 1)))
+    boxes = [scratch.textbbox(offset, line, font=font, stroke_width=stroke_width)
+             for line, offset in lines if line or len(lines) == 1]
+    if not boxes:
+        return 0, 0, 1, 1
+    return (int(min(b[0] for b in boxes)), int(min(b[1] for b in boxes)),
+            math.ceil(max(b[2] for b in boxes)), math.ceil(max(b[3] for b in boxes)))
+
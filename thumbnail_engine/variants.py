@@ -0,0 +1,159 @@
+"""A/B variant generation: the cross product of template parameters.
+
+A variant file is a spec plus a ``vary`` object mapping template parameters
+(or, for specs without a template, top-level spec keys) to the values to
+try; ``"*"`` means all of a parameter's declared ``choices``.  An axis that
+cannot change the image (an unknown key, a parameter the template never
+uses or the spec overrides, repeated values) is rejected rather than
+rendered as duplicate variants::
+
+    {
+        "template": "vlog",
+        "vary": {"title": ["MY DAY VLOG!", "24 HOURS IN TOKYO"],
+                 "background": "*", "layout": ["top", "bottom"]},
+        "limit": 12
+    }
+
+Variants are ordered so those sharing a background are adjacent, and all of
+them go through one ``Renderer``, whose background cache decodes, renders and
+blurs each distinct background once::
+
+    python -m thumbnail_engine.variants ab.json --out-dir out
+    python -m thumbnail_engine.variants ab.json --manifest jobs.jsonl  # for batch
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+from .export import YOUTUBE_MAX_BYTES, export_image
+from .render import SPEC_KEYS, Renderer, SpecError, resolve
+from .templates import default_library
+
+# Axes that feed the background go outermost so equal backgrounds are adjacent
+BACKGROUND_AXES = ('background',)
+
+# Spec keys a variant may vary: everything that reaches the image, and the budget
+VARY_KEYS = SPEC_KEYS + ('budget',)
+
+
+def expand(spec, vary, limit=None, library=None):
+    """Yield ``(values, spec)`` for each combination of the ``vary`` axes."""
+    template = None
+    if 'template' in spec:
+        template = (library or default_library()).get(spec['template'])
+    axes = []
+    for key, values in vary.items():
+        if values == '*':
+            if template is None or key not in template.choices:
+                raise SpecError(f"Parameter {key!r} has no declared choices")
+            values = template.choices[key]
+        if not isinstance(values, list) or not values:
+            raise SpecError(f"Values for {key!r} must be a non-empty list or '*'")
+        _check_axis(spec, template, key, values, library)
+        axes.append((key, values))
+    axes.sort(key=lambda axis: axis[0] not in BACKGROUND_AXES)
+
+    keys = [key for key, _ in axes]
+    combinations = itertools.product(*(values for _, values in axes))
+    for combination in itertools.islice(combinations, limit):
+        values = dict(zip(keys, combination))
+        yield values, _apply(spec, template, values)
+
+
+def _apply(spec, template, values):
+    variant = dict(spec)
+    if template is None:
+        variant.update(values)
+        return variant
+    params = dict(spec.get('params', {}))
+    for key, value in values.items():
+        if key in template.defaults:
+            params[key] = value
+        else:
+            variant[key] = value
+    variant['params'] = params
+    return variant
+
+
+def _check_axis(spec, template, key, values, library):
+    # Each value must resolve to a different spec, or variants repeat
+    if (template is None or key not in template.defaults) and key not in VARY_KEYS:
+        raise SpecError(f"Cannot vary {key!r}: not a template parameter or spec key")
+    resolved = {json.dumps(resolve(_apply(spec, template, {key: value}), library), sort_keys=True)
+                for value in values}
+    if len(resolved) < len(values):
+        if len(resolved) == 1:
+            raise SpecError(f"Varying {key!r} does not change the output")
+        raise SpecError(f"Values for {key!r} repeat an output")
+
+
+def load_variants(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    vary = data.pop('vary', {})
+    limit = data.pop('limit', None)
+    return data, vary, limit
+
+
+def variant_jobs(spec, vary, limit=None, prefix=None, library=None):
+    """``(id, spec)`` pairs with ``output`` set, ready for ``batch.run``."""
+    prefix = prefix or spec.get('template', 'variant')
+    for index, (values, variant) in enumerate(expand(spec, vary, limit, library)):
+        job_id = f"{prefix}-{index:03d}"
+        variant.setdefault('output', f"{job_id}.jpg")
+        variant['id'] = job_id
+        variant['variant'] = values
+        yield job_id, variant
+
+
+def render_variants(spec, vary, out_dir, limit=None, renderer=None, budget=YOUTUBE_MAX_BYTES, on_result=None):
+    """Render every variant in-process, sharing background work between them."""
+    renderer = renderer or Renderer()
+    results = []
+    for job_id, variant in variant_jobs(spec, vary, limit, library=renderer.library):
+        start = time.perf_counter()
+        output = os.path.join(out_dir, variant.pop('output'))
+        values = variant.pop('variant')
+        variant.pop('id')
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        result = export_image(renderer.render(variant), output, variant.pop('budget', budget))
+        record = {'id': job_id, 'variant': values, 'output': result.path, 'bytes': result.best.size,
+                  'ms': round((time.perf_counter() - start) * 1000, 1)}
+        results.append(record)
+        if on_result is not None:
+            on_result(record)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render A/B variants of a thumbnail spec.")
+    parser.add_argument('variants', help="JSON spec with a 'vary' object")
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--manifest', help="write a JSONL manifest for thumbnail_engine.batch instead of rendering")
+    args = parser.parse_args(argv)
+
+    spec, vary, limit = load_variants(args.variants)
+    limit = args.limit if args.limit is not None else limit
+    if args.manifest:
+        with open(args.manifest, 'w', encoding='utf-8') as f:
+            for _, variant in variant_jobs(spec, vary, limit):
+                f.write(json.dumps(variant) + '\n')
+        return 0
+
+    renderer = Renderer(base_dir=os.path.dirname(os.path.abspath(args.variants)))
+    start = time.perf_counter()
+    results = render_variants(spec, vary, args.out_dir, limit, renderer,
+                              on_result=lambda record: print(json.dumps(record), flush=True))
+    backgrounds = renderer.backgrounds
+    print(json.dumps({'variants': len(results), 'seconds': round(time.perf_counter() - start, 2),
+                      'background_hits': backgrounds.hits, 'background_misses': backgrounds.misses}),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,29 +1,51 @@
-import tkinter as tk
-from tkinter import ttk, colorchooser, filedialog, messagebox, font
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
-import os
+import time
+
+# Startup timings count from here, so the clock starts before the remaining
+# imports (tkinter alone is a measurable part of startup); hence the noqa
+_STARTED = time.perf_counter()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+import tkinter as tk  # noqa: E402
+from tkinter import ttk, colorchooser, filedialog, messagebox  # noqa: E402
+
+# Only tkinter and the profiler load before the window is up; PIL and the
+# engine modules are imported in load_engine() or where they are first used
+from thumbnail_engine.profiling import profiler, span  # noqa: E402
+
+# Delay before fonts and template assets are preloaded in the background,
+# and how often the Tk thread checks whether the preload has finished
+WARM_START_DELAY_MS = 200
+WARM_START_POLL_MS = 50
+
+# How often the Tk thread checks on a running export
+EXPORT_POLL_MS = 50
+
+# Range of the background blur slider; the Blur button stops at its end
+MAX_BACKGROUND_BLUR = 60
+
+# Space between the thumbnails in the display sizes window
+SIZES_GAP = 16
 
 class YouTubeThumbnailCreator:
-    def __init__(self, root):
+    def __init__(self, root, warm_start=True):
         self.root = root
         self.root.title("YouTube Thumbnail Creator Pro")
         self.root.geometry("1400x900")
         self.root.configure(bg='#1a1a1a')
 
-        # Canvas setup (YouTube thumbnail size: 1280x720)
+        # Canvas setup: layouts are in 1280x720 units (YouTube's thumbnail
+        # size); the editor rasterizes them at preview scale and exports
+        # re-rasterize at the chosen resolution
         self.canvas_width = 1280
         self.canvas_height = 720
         self.display_scale = 0.5
 
-        # Initialize canvas image
-        self.canvas_image = Image.new('RGB', (self.canvas_width, self.canvas_height), '#FFFFFF')
-        self.canvas_draw = ImageDraw.Draw(self.canvas_image)
-
-        # Layers
-        self.layers = []
-        self.background_image = None
-        self.text_elements = []
-        self.shape_elements = []
+        # Milliseconds since the script started, per startup stage
+        self.startup = {}
 
         # Current settings
         self.current_text = ""
@@ -35,14 +57,96 @@ class YouTubeThumbnailCreator:
         self.current_outline_width = 8
         self.shadow_enabled = True
         self.shadow_offset = 5
+        self.shadow_blur = 0
         self.text_bold = True
         self.text_italic = False
         self.gradient_enabled = False
 
-        self.setup_ui()
+        # Map the (empty) window first, then load the engine and the panels
+        self.photo = None
+        self.syncing_scales = False
+        self.setup_window()
+        self.root.update()
+        self.mark_startup('window')
+        with span('startup.engine'):
+            self.load_engine()
+        self.mark_startup('engine')
+        with span('startup.ui'):
+            self.setup_ui()
+        self.mark_startup('ui')
         self.render_canvas()
+        if warm_start:
+            self.root.after(WARM_START_DELAY_MS, self.warm_start)
+
+    def mark_startup(self, stage):
+        self.startup.setdefault(stage, round((time.perf_counter() - _STARTED) * 1000, 1))
+
+    def load_engine(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from thumbnail_engine.fonts import default_registry
+        from thumbnail_engine.history import History, SceneHistory
+        from thumbnail_engine.mipmap import MipmapPyramid
+        from thumbnail_engine.preview import PreviewPipeline
+        from thumbnail_engine.render import Renderer
+        from thumbnail_engine.scene import Scene
+        from thumbnail_engine.text_effects import TextEffectsEngine
+
+        # Glyph masks are cached so re-adding text with new colors is a composite
+        self.text_effects = TextEffectsEngine()
+        self.fonts = default_registry()
+
+        # Scene graph: background plus text, shape and sticker layers. Each
+        # layer keeps its own tile and edits only recompose dirty regions.
+        self.scene = Scene((self.canvas_width, self.canvas_height), '#FFFFFF',
+                           fonts=self.fonts, text_effects=self.text_effects, scale=self.display_scale)
+        self.canvas_image = self.scene.render()
+
+        # Layers and templates are built from the same specs the batch
+        # renderer uses
+        self.renderer = Renderer(self.fonts, self.text_effects)
+
+        # Undo/redo keeps compressed diffs of the changed tiles only
+        self.history = SceneHistory(self.scene, History(budget_bytes=64 * 1024 * 1024))
+
+        self.preview = PreviewPipeline(
+            self.root, self.show_preview_frame,
+            (int(self.canvas_width * self.display_scale), int(self.canvas_height * self.display_scale))
+        )
 
-    def setup_ui(self):
+        # The display sizes window resamples from a mipmap of the canvas that
+        # follows the scene's dirty regions
+        self.mipmap = MipmapPyramid()
+        self.sizes_job = None
+
+        # Exports rasterize and encode off the Tk thread, one at a time
+        self.exporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+
+    def warm_start(self):
+        # Font index, template backgrounds and glyph masks load off the Tk
+        # thread once the window is up, so the first template or text is quick.
+        # Backgrounds are not safe to share while they build their caches, so
+        # the preload fills a renderer of its own that the Tk thread adopts
+        from thumbnail_engine.render import Renderer
+        renderer = Renderer(self.fonts, self.text_effects, library=self.renderer.library,
+                            stickers=self.renderer.stickers)
+        thread = threading.Thread(target=self._preload, args=(renderer,), name='warm-start', daemon=True)
+        thread.start()
+        self.root.after(WARM_START_POLL_MS, self._adopt_renderer, thread, renderer)
+
+    def _preload(self, renderer):
+        with span('startup.preload'):
+            import thumbnail_engine.export  # noqa: F401  (first save)
+            self.fonts.scan()
+            renderer.preload((self.canvas_width, self.canvas_height), self.display_scale)
+        self.mark_startup('warm')
+
+    def _adopt_renderer(self, thread, renderer):
+        if thread.is_alive():
+            self.root.after(WARM_START_POLL_MS, self._adopt_renderer, thread, renderer)
+            return
+        self.renderer = renderer
+
+    def setup_window(self):
         # Main container
         main_frame = tk.Frame(self.root, bg='#1a1a1a')
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -88,6 +192,10 @@ class YouTubeThumbnailCreator:
         # Title
         title = tk.Label(scrollable_frame, text="🎨 THUMBNAIL CREATOR", bg='#2a2a2a', fg='#FF0000', font=('Arial', 16, 'bold'))
         title.pack(pady=15)
+        self.controls_frame = scrollable_frame
+
+    def setup_ui(self):
+        scrollable_frame = self.controls_frame
 
         # Background Section
         self.create_section(scrollable_frame, "📷 BACKGROUND", [
@@ -95,15 +203,48 @@ class YouTubeThumbnailCreator:
             ("Solid Color", self.set_background_color),
             ("Gradient", self.apply_gradient_background),
             ("Blur Background", self.blur_background),
-            ("Brightness", None)
+            ("Reset Adjustments", self.reset_adjustments)
         ])
 
-        self.brightness_scale = tk.Scale(
-            scrollable_frame, from_=0.5, to=2.0, resolution=0.1, orient=tk.HORIZONTAL,
-            label="Brightness", bg='#3a3a3a', fg='white', command=self.adjust_brightness
+        fit_frame = tk.Frame(scrollable_frame, bg='#2a2a2a')
+        fit_frame.pack(pady=5)
+        tk.Label(fit_frame, text="Image Fit:", bg='#2a2a2a', fg='white').pack(side=tk.LEFT)
+        self.fit_var = tk.StringVar(value="cover")
+        for text, value in [("Cover", "cover"), ("Contain", "contain"), ("Crop", "crop")]:
+            tk.Radiobutton(fit_frame, text=text, variable=self.fit_var, value=value,
+                          bg='#2a2a2a', fg='white', selectcolor='#1a1a1a').pack(side=tk.LEFT, padx=5)
+
+        # Non-destructive adjustments: (label, kind, parameter, from, to)
+        self.adjustment_scales = {}
+        adjustments = [
+            ("Brightness", "brightness", "factor", 0.5, 2.0),
+            ("Contrast", "contrast", "factor", 0.5, 2.0),
+            ("Saturation", "saturation", "factor", 0.0, 2.0),
+            ("Gamma", "gamma", "value", 0.5, 2.5),
+        ]
+        for label, kind, param, low, high in adjustments:
+            scale = tk.Scale(
+                scrollable_frame, from_=low, to=high, resolution=0.05, orient=tk.HORIZONTAL,
+                label=label, bg='#3a3a3a', fg='white',
+                command=self.slider_command(label, lambda value, k=kind, p=param: self.adjust_background(k, p, float(value)))
+            )
+            scale.set(1.0)
+            scale.pack(fill=tk.X, padx=20, pady=5)
+            # One undo step per drag rather than per tick
+            scale.bind('<ButtonPress-1>', lambda e, l=label: self.history.begin(l))
+            scale.bind('<ButtonRelease-1>', lambda e: self.history.commit())
+            self.adjustment_scales[kind] = (scale, param)
+        self.brightness_scale = self.adjustment_scales['brightness'][0]
+
+        self.blur_scale = tk.Scale(
+            scrollable_frame, from_=0, to=MAX_BACKGROUND_BLUR, resolution=1, orient=tk.HORIZONTAL,
+            label="Background Blur", bg='#3a3a3a', fg='white',
+            command=self.slider_command("Background Blur", lambda value: self.set_background_blur(float(value)))
         )
-        self.brightness_scale.set(1.0)
-        self.brightness_scale.pack(fill=tk.X, padx=20, pady=5)
+        self.blur_scale.set(0)
+        self.blur_scale.pack(fill=tk.X, padx=20, pady=5)
+        self.blur_scale.bind('<ButtonPress-1>', lambda e: self.history.begin("Blur background"))
+        self.blur_scale.bind('<ButtonRelease-1>', lambda e: self.history.commit())
 
         # Text Section
         self.create_section(scrollable_frame, "📝 TEXT", [])
@@ -171,6 +312,14 @@ class YouTubeThumbnailCreator:
         self.shadow_scale.set(5)
         self.shadow_scale.pack(fill=tk.X, padx=20, pady=5)
 
+        tk.Label(scrollable_frame, text="Shadow Blur:", bg='#2a2a2a', fg='white').pack()
+        self.shadow_blur_scale = tk.Scale(
+            scrollable_frame, from_=0, to=20, resolution=1, orient=tk.HORIZONTAL,
+            bg='#3a3a3a', fg='white', command=self.update_shadow_blur
+        )
+        self.shadow_blur_scale.set(0)
+        self.shadow_blur_scale.pack(fill=tk.X, padx=20, pady=5)
+
         # Text Position
         tk.Label(scrollable_frame, text="Text Position:", bg='#2a2a2a', fg='white', font=('Arial', 10, 'bold')).pack(pady=10)
 
@@ -189,88 +338,338 @@ class YouTubeThumbnailCreator:
                           bg='#2a2a2a', fg='white', selectcolor='#1a1a1a',
                           command=self.update_text_position).pack(side=tk.LEFT, padx=10)
 
+        # Long titles wrap and shrink (from the size above) to fit their band
+        self.fit_text_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(scrollable_frame, text="Wrap & Fit to Width", variable=self.fit_text_var,
+                       bg='#2a2a2a', fg='white', selectcolor='#1a1a1a').pack(pady=5)
+
         # Add Text Button
-        tk.Button(scrollable_frame, text="➕ ADD TEXT", command=self.add_text_to_canvas,
+        tk.Button(scrollable_frame, text="➕ ADD TEXT", command=self.profiled("Add Text", self.add_text_to_canvas),
                  bg='#FF0000', fg='white', font=('Arial', 12, 'bold'), pady=10).pack(pady=15, padx=20, fill=tk.X)
 
-        # Shapes Section
+        # Shapes, emoji, templates and profiling are built when first opened
         self.create_section(scrollable_frame, "⭐ SHAPES & EFFECTS", [
             ("Add Circle", lambda: self.add_shape("circle")),
             ("Add Rectangle", lambda: self.add_shape("rectangle")),
             ("Add Arrow", lambda: self.add_shape("arrow")),
             ("Add Starburst", self.add_starburst)
-        ])
+        ], build=self.build_shape_panel, collapsed=True)
 
         # Stickers/Emoji Section
-        self.create_section(scrollable_frame, "😊 EMOJI & STICKERS", [])
+        self.create_section(scrollable_frame, "😊 EMOJI & STICKERS", [], build=self.build_emoji_panel,
+                            collapsed=True)
 
-        emoji_frame = tk.Frame(scrollable_frame, bg='#2a2a2a')
-        emoji_frame.pack(pady=10)
+        # Export Section
+        self.create_section(scrollable_frame, "💾 EXPORT", [
+            ("Save Thumbnail", self.save_thumbnail),
+            ("Clear Canvas", self.clear_canvas),
+            ("Undo Last", self.undo_last),
+            ("Redo", self.redo_last),
+            ("Preview Display Sizes", self.show_display_sizes)
+        ])
+
+        size_frame = tk.Frame(scrollable_frame, bg='#2a2a2a')
+        size_frame.pack(pady=5)
+        tk.Label(size_frame, text="Export Size:", bg='#2a2a2a', fg='white').pack(side=tk.LEFT)
+        self.export_width_var = tk.IntVar(value=self.canvas_width)
+        for text, width in [("720p", 1280), ("1080p", 1920), ("4K", 3840)]:
+            tk.Radiobutton(size_frame, text=text, variable=self.export_width_var, value=width,
+                           bg='#2a2a2a', fg='white', selectcolor='#1a1a1a').pack(side=tk.LEFT, padx=5)
+
+        self.history_label = tk.Label(scrollable_frame, text="", bg='#2a2a2a', fg='#888888')
+        self.history_label.pack()
+        self.root.bind('<Control-z>', lambda e: self.undo_last())
+        self.root.bind('<Control-y>', lambda e: self.redo_last())
+
+        # Templates: one button per template file
+        self.create_section(scrollable_frame, "🎨 QUICK TEMPLATES", [], build=self.build_template_panel,
+                            collapsed=True)
+
+        # Profiling: per-operation stage timings on the canvas and as a trace
+        self.create_section(scrollable_frame, "⏱ PROFILING", [
+            ("Export Trace…", self.export_trace)
+        ], build=self.build_profiling_panel, collapsed=not profiler.enabled)
+
+    def build_shape_panel(self, parent):
+        # Placement and style for the next shape; colors default to the preset's
+        from thumbnail_engine.render import ANCHORS
+        self.shape_fill = None
+        self.shape_outline = None
+        tk.Label(parent, text="Position:", bg='#3a3a3a', fg='white').pack()
+        self.shape_anchor_var = tk.StringVar(value="default")
+        ttk.Combobox(parent, textvariable=self.shape_anchor_var, values=["default"] + list(ANCHORS),
+                     state='readonly').pack(pady=3)
+        self.shape_size_scale = tk.Scale(parent, from_=40, to=600, resolution=10, orient=tk.HORIZONTAL,
+                                         label="Size", bg='#3a3a3a', fg='white')
+        self.shape_size_scale.set(250)
+        self.shape_size_scale.pack(fill=tk.X)
+        self.shape_width_scale = tk.Scale(parent, from_=0, to=20, orient=tk.HORIZONTAL,
+                                          label="Outline Width", bg='#3a3a3a', fg='white')
+        self.shape_width_scale.set(5)
+        self.shape_width_scale.pack(fill=tk.X)
+        self.shape_radius_scale = tk.Scale(parent, from_=0, to=60, orient=tk.HORIZONTAL,
+                                           label="Corner Radius", bg='#3a3a3a', fg='white')
+        self.shape_radius_scale.pack(fill=tk.X)
+        self.shape_opacity_scale = tk.Scale(parent, from_=10, to=100, resolution=5, orient=tk.HORIZONTAL,
+                                            label="Fill Opacity %", bg='#3a3a3a', fg='white')
+        self.shape_opacity_scale.set(100)
+        self.shape_opacity_scale.pack(fill=tk.X)
+        color_frame = tk.Frame(parent, bg='#3a3a3a')
+        color_frame.pack(pady=3)
+        tk.Button(color_frame, text="Fill", command=self.choose_shape_fill,
+                  bg='#4a4a4a', fg='white', width=7).pack(side=tk.LEFT, padx=2)
+        tk.Button(color_frame, text="Outline", command=self.choose_shape_outline,
+                  bg='#4a4a4a', fg='white', width=7).pack(side=tk.LEFT, padx=2)
+        tk.Button(color_frame, text="Preset", command=self.reset_shape_colors,
+                  bg='#4a4a4a', fg='white', width=7).pack(side=tk.LEFT, padx=2)
+
+    def build_emoji_panel(self, parent):
+        emoji_frame = tk.Frame(parent, bg='#3a3a3a')
+        emoji_frame.pack(pady=5)
 
         emojis = ["🔥", "👍", "😱", "💯", "⚡", "✅", "❌", "⭐", "💪", "🎯", "🚀", "💰", "👉", "🔴", "📈", "⏰"]
         row_frame = None
         for i, emoji in enumerate(emojis):
             if i % 4 == 0:
-                row_frame = tk.Frame(emoji_frame, bg='#2a2a2a')
+                row_frame = tk.Frame(emoji_frame, bg='#3a3a3a')
+                row_frame.pack()
+            tk.Button(row_frame, text=emoji, font=('Arial', 20),
+                     command=self.profiled("Add Emoji", lambda e=emoji: self.add_emoji(e)),
+                     bg='#4a4a4a', width=3).pack(side=tk.LEFT, padx=2, pady=2)
+
+        # PNG sticker packs: THUMBNAIL_STICKER_PATH plus any loaded here
+        from thumbnail_engine.stickers import sticker_packs
+        self.sticker_frame = tk.Frame(parent, bg='#3a3a3a')
+        self.sticker_frame.pack(fill=tk.X)
+        self.sticker_thumbs = []
+        for pack, paths in sticker_packs().items():
+            self.add_sticker_pack(pack, paths)
+        tk.Button(parent, text="Load Sticker Pack…", command=self.load_sticker_pack,
+                  bg='#4a4a4a', fg='white', width=25, pady=5).pack(pady=3)
+
+    def add_sticker_pack(self, pack, paths):
+        from PIL import ImageTk
+        tk.Label(self.sticker_frame, text=pack, bg='#3a3a3a', fg='white').pack(pady=(5, 0))
+        row_frame = None
+        for i, path in enumerate(paths):
+            if i % 6 == 0:
+                row_frame = tk.Frame(self.sticker_frame, bg='#3a3a3a')
                 row_frame.pack()
-            tk.Button(row_frame, text=emoji, font=('Arial', 20), command=lambda e=emoji: self.add_emoji(e),
-                     bg='#3a3a3a', width=3).pack(side=tk.LEFT, padx=2, pady=2)
+            try:
+                thumb = ImageTk.PhotoImage(self.renderer.stickers.image(path, 32))
+            except OSError:
+                continue
+            self.sticker_thumbs.append(thumb)
+            tk.Button(row_frame, image=thumb, bg='#4a4a4a', width=36, height=36,
+                      command=self.profiled("Add Sticker", lambda p=path: self.add_sticker(p))
+                      ).pack(side=tk.LEFT, padx=2, pady=2)
+
+    def load_sticker_pack(self):
+        from thumbnail_engine.stickers import sticker_pack
+        directory = filedialog.askdirectory(title="Choose a folder of PNG stickers")
+        if not directory:
+            return
+        paths = sticker_pack(directory)
+        if not paths:
+            messagebox.showinfo("Info", "No PNG, WebP or GIF images in that folder")
+            return
+        self.add_sticker_pack(os.path.basename(directory), paths)
 
-        # Export Section
-        self.create_section(scrollable_frame, "💾 EXPORT", [
-            ("Save Thumbnail", self.save_thumbnail),
-            ("Clear Canvas", self.clear_canvas),
-            ("Undo Last", self.undo_last)
-        ])
+    def build_template_panel(self, parent):
+        for name in self.renderer.library.names():
+            tk.Button(parent, text=f"{name.title()} Style",
+                      command=self.profiled(f"{name.title()} Style", lambda n=name: self.apply_template(n, n.title())),
+                      bg='#4a4a4a', fg='white', width=25, pady=5).pack(pady=3)
 
-        # Templates
-        self.create_section(scrollable_frame, "🎨 QUICK TEMPLATES", [
-            ("Gaming Style", self.apply_gaming_template),
-            ("Tutorial Style", self.apply_tutorial_template),
-            ("Vlog Style", self.apply_vlog_template),
-            ("Reaction Style", self.apply_reaction_template)
-        ])
+    def build_profiling_panel(self, parent):
+        self.profiler_var = tk.BooleanVar(value=profiler.enabled)
+        tk.Checkbutton(parent, text="Show Profiler Overlay", variable=self.profiler_var,
+                       bg='#3a3a3a', fg='white', selectcolor='#1a1a1a',
+                       command=self.toggle_profiler).pack(pady=3)
 
-    def create_section(self, parent, title, buttons):
+    def create_section(self, parent, title, buttons, build=None, collapsed=False):
         section_frame = tk.LabelFrame(parent, text=title, bg='#3a3a3a', fg='#FF0000',
                                      font=('Arial', 11, 'bold'), padx=10, pady=10)
         section_frame.pack(fill=tk.X, padx=15, pady=10)
 
-        for btn_text, btn_command in buttons:
-            if btn_command:
-                tk.Button(section_frame, text=btn_text, command=btn_command,
-                         bg='#4a4a4a', fg='white', width=25, pady=5).pack(pady=3)
-
-    def render_canvas(self):
-        # Resize for display
-        display_image = self.canvas_image.resize(
-            (int(self.canvas_width * self.display_scale),
-             int(self.canvas_height * self.display_scale)),
-            Image.LANCZOS
-        )
+        def populate():
+            for btn_text, btn_command in buttons:
+                if btn_command:
+                    tk.Button(section_frame, text=btn_text, command=self.profiled(btn_text, btn_command),
+                             bg='#4a4a4a', fg='white', width=25, pady=5).pack(pady=3)
+            if build is not None:
+                build(section_frame)
+
+        if not collapsed:
+            populate()
+            return section_frame
+
+        # Collapsed sections hold a single button until they are first opened
+        def expand():
+            toggle.destroy()
+            with span('ui.build_section', title=title):
+                populate()
+
+        toggle = tk.Button(section_frame, text="Show ▾", command=expand,
+                           bg='#2a2a2a', fg='white', width=25, pady=2)
+        toggle.pack(pady=3)
+        return section_frame
+
+    def render_canvas(self, interactive=False):
+        self.canvas_image = self.scene.render()
+        if hasattr(self, 'history_label'):
+            self.update_history_label()
+        if not interactive and hasattr(self, 'adjustment_scales'):
+            # Undo, redo and new backgrounds can change what the sliders show
+            self.sync_adjustment_scales()
+
+        # Scaling happens off the Tk thread; bursts of updates are coalesced
+        # and interactive ones get a fast frame until input goes idle
+        self.preview.request(self.canvas_image, interactive=interactive)
+        if hasattr(self, 'size_photos'):
+            self.update_display_sizes(interactive)
+
+    def show_preview_frame(self, display_image, quality):
+        with span('preview.photoimage', quality=quality):
+            if self.photo is None:
+                from PIL import ImageTk
+                self.photo = ImageTk.PhotoImage(display_image)
+                self.canvas.delete("all")
+                self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+            else:
+                self.photo.paste(display_image)
+        self.mark_startup('first_frame')
+        if profiler.enabled:
+            self.update_profiler_overlay()
 
+    def show_display_sizes(self):
+        """Side-by-side window of the thumbnail at YouTube's display sizes."""
         from PIL import ImageTk
-        self.photo = ImageTk.PhotoImage(display_image)
-        self.canvas.delete("all")
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        from thumbnail_engine.mipmap import DISPLAY_SIZES
+        if hasattr(self, 'size_photos'):
+            self.sizes_window.lift()
+            return
+        self.sizes_window = tk.Toplevel(self.root)
+        self.sizes_window.title("Display Sizes")
+        self.sizes_window.configure(bg='#0f0f0f')
+        self.sizes_window.protocol("WM_DELETE_WINDOW", self.close_display_sizes)
+        width = sum(size[0] for _, size in DISPLAY_SIZES) + SIZES_GAP * (len(DISPLAY_SIZES) + 1)
+        height = max(size[1] for _, size in DISPLAY_SIZES) + 2 * SIZES_GAP + 20
+        canvas = tk.Canvas(self.sizes_window, width=width, height=height, bg='#0f0f0f', highlightthickness=0)
+        canvas.pack()
+
+        self.size_photos = []
+        x = SIZES_GAP
+        for label, (w, h) in DISPLAY_SIZES:
+            photo = ImageTk.PhotoImage('RGB', (w, h))
+            self.size_photos.append(photo)
+            canvas.create_image(x, SIZES_GAP, anchor=tk.NW, image=photo)
+            # YouTube draws the duration over the bottom-right corner
+            badge = canvas.create_text(x + w - 8, SIZES_GAP + h - 6, anchor=tk.SE, text="10:24",
+                                       fill='white', font=('Arial', 8, 'bold'))
+            bx0, by0, bx1, by1 = canvas.bbox(badge)
+            canvas.tag_lower(canvas.create_rectangle(bx0 - 3, by0 - 1, bx1 + 3, by1 + 1,
+                                                     fill='#000000', outline=''), badge)
+            canvas.tag_raise(badge)
+            canvas.create_text(x, SIZES_GAP + h + 6, anchor=tk.NW, text=f"{label}  {w}x{h}",
+                               fill='#aaaaaa', font=('Arial', 9))
+            x += w + SIZES_GAP
+        self.update_display_sizes()
+
+    def close_display_sizes(self):
+        if self.sizes_job is not None:
+            self.root.after_cancel(self.sizes_job)
+            self.sizes_job = None
+        del self.size_photos
+        self.sizes_window.destroy()
+
+    def update_display_sizes(self, interactive=False):
+        # Drags get bilinear views from the mipmap; LANCZOS ones follow once input is idle
+        from thumbnail_engine.preview import FAST, FINAL
+        if self.sizes_job is not None:
+            self.root.after_cancel(self.sizes_job)
+            self.sizes_job = None
+        if interactive:
+            self.sizes_job = self.root.after(self.preview.idle_ms, self.update_display_sizes)
+        quality = FAST if interactive else FINAL
+        with span('preview.sizes', quality=quality):
+            views = self.mipmap.sync(self.scene).views(quality=quality)
+            for photo, (_, image) in zip(self.size_photos, views):
+                photo.paste(image)
+
+    def slider_command(self, name, command):
+        """A slider's command, ignored while the slider only reflects the scene."""
+        command = self.profiled(name, command)
+
+        def run(value):
+            if not self.syncing_scales:
+                command(value)
+        return run
+
+    def profiled(self, name, command):
+        """Wrap a control's command so it is timed as one operation."""
+        def run(*args):
+            with profiler.operation(name):
+                return command(*args)
+        return run
+
+    def toggle_profiler(self):
+        if self.profiler_var.get():
+            profiler.enable()
+            self.update_profiler_overlay()
+        else:
+            profiler.disable()
+            self.canvas.delete('profiler')
+
+    def update_profiler_overlay(self):
+        summary = profiler.last_operation
+        lines = summary.lines() if summary else ["(no operation yet)"]
+        for name in ('preview.scale', 'preview.photoimage'):
+            if name in profiler.last:
+                lines.append(f"{name:<20}{profiler.last[name]:7.1f}")
+        self.canvas.delete('profiler')
+        text = self.canvas.create_text(8, 8, anchor=tk.NW, text="\n".join(lines), fill='#00FF00',
+                                       font=('Courier', 9), tags='profiler')
+        x0, y0, x1, y1 = self.canvas.bbox(text)
+        self.canvas.create_rectangle(x0 - 4, y0 - 4, x1 + 4, y1 + 4, fill='#000000', outline='',
+                                     stipple='gray50', tags='profiler')
+        self.canvas.tag_raise(text)
+
+    def export_trace(self):
+        if not profiler.events:
+            messagebox.showinfo("Profiler", "Nothing recorded yet. Enable the profiler overlay first.")
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("Chrome trace", "*.json")]
+        )
+        if file_path:
+            profiler.export_chrome_trace(file_path)
+            messagebox.showinfo("Profiler", f"Trace saved to:\n{file_path}\n\nOpen it in chrome://tracing or Perfetto.")
 
     def load_background_image(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("Image files", "*.jpg *.jpeg *.png *.bmp *.gif")]
+            filetypes=[("Image files", "*.jpg *.jpeg *.png *.bmp *.gif *.webp")]
         )
         if file_path:
-            img = Image.open(file_path)
-            img = img.resize((self.canvas_width, self.canvas_height), Image.LANCZOS)
-            self.canvas_image = img
-            self.canvas_draw = ImageDraw.Draw(self.canvas_image)
+            from thumbnail_engine.ingest import ImageFile
+            # Kept by path so exports decode it at their own resolution
+            image = ImageFile(file_path, self.fit_var.get())
+            try:
+                image.load(self.scene.size)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not open image: {e}")
+                return
+            with self.history.record("Load image"):
+                self.scene.set_background(image)
             self.render_canvas()
 
     def set_background_color(self):
         color = colorchooser.askcolor(title="Choose Background Color")
         if color[1]:
             self.current_bg_color = color[1]
-            self.canvas_image = Image.new('RGB', (self.canvas_width, self.canvas_height), color[1])
-            self.canvas_draw = ImageDraw.Draw(self.canvas_image)
+            with self.history.record("Solid color"):
+                self.scene.set_background(color[1])
             self.render_canvas()
 
     def apply_gradient_background(self):
@@ -281,35 +680,59 @@ class YouTubeThumbnailCreator:
         if not color2[1]:
             return
 
-        from PIL import Image
-        img = Image.new('RGB', (self.canvas_width, self.canvas_height))
-        draw = ImageDraw.Draw(img)
+        from thumbnail_engine.gradients import Gradient
+        with self.history.record("Gradient"):
+            self.scene.set_background(Gradient([color1[1], color2[1]], angle=90))
+        self.render_canvas()
 
-        r1, g1, b1 = int(color1[1][1:3], 16), int(color1[1][3:5], 16), int(color1[1][5:7], 16)
-        r2, g2, b2 = int(color2[1][1:3], 16), int(color2[1][3:5], 16), int(color2[1][5:7], 16)
+    def blur_background(self):
+        self.set_background_blur(min(MAX_BACKGROUND_BLUR, self.scene.background.blur + 10))
 
-        for y in range(self.canvas_height):
-            ratio = y / self.canvas_height
-            r = int(r1 + (r2 - r1) * ratio)
-            g = int(g1 + (g2 - g1) * ratio)
-            b = int(b1 + (b2 - b1) * ratio)
-            draw.line([(0, y), (self.canvas_width, y)], fill=(r, g, b))
+    def set_background_blur(self, radius):
+        if radius == self.scene.background.blur:
+            return
+        if self.history.is_open:
+            self.scene.set_blur(radius)
+        else:
+            with self.history.record("Blur background"):
+                self.scene.set_blur(radius)
+        self.render_canvas(interactive=self.history.is_open)
+
+    def adjust_background(self, kind, param, value):
+        stack = self.scene.background.adjustments
+        current = stack.get(kind)
+        if current is not None and current[param] == value or current is None and value == 1.0:
+            return
+        stack = stack.set(kind, **{param: value})
+        if self.history.is_open:
+            self.scene.set_adjustments(stack)
+        else:
+            with self.history.record(kind.capitalize()):
+                self.scene.set_adjustments(stack)
+        self.render_canvas(interactive=self.history.is_open)
 
-        self.canvas_image = img
-        self.canvas_draw = ImageDraw.Draw(self.canvas_image)
-        self.render_canvas()
+    def adjust_brightness(self, value):
+        self.adjust_background('brightness', 'factor', float(value))
 
-    def blur_background(self):
-        self.canvas_image = self.canvas_image.filter(ImageFilter.GaussianBlur(radius=10))
-        self.canvas_draw = ImageDraw.Draw(self.canvas_image)
+    def reset_adjustments(self):
+        with self.history.record("Reset adjustments"):
+            from thumbnail_engine.adjustments import AdjustmentStack
+            self.scene.set_adjustments(AdjustmentStack())
         self.render_canvas()
 
-    def adjust_brightness(self, value):
-        if hasattr(self, 'original_image'):
-            enhancer = ImageEnhance.Brightness(self.original_image)
-            self.canvas_image = enhancer.enhance(float(value))
-            self.canvas_draw = ImageDraw.Draw(self.canvas_image)
-            self.render_canvas()
+    def sync_adjustment_scales(self):
+        # Tk runs a slider's command for set() on its next redraw, an idle
+        # callback queued ahead of the one that ends the sync
+        self.syncing_scales = True
+        background = self.scene.background
+        for kind, (scale, param) in self.adjustment_scales.items():
+            adjustment = background.adjustments.get(kind)
+            scale.set(adjustment[param] if adjustment is not None else 1.0)
+        self.blur_scale.set(background.blur)
+        self.root.after_idle(self.end_scale_sync)
+
+    def end_scale_sync(self):
+        self.syncing_scales = False
 
     def choose_text_color(self):
         color = colorchooser.askcolor(title="Choose Text Color")
@@ -340,6 +763,9 @@ class YouTubeThumbnailCreator:
     def update_shadow(self, value):
         self.shadow_offset = int(value)
 
+    def update_shadow_blur(self, value):
+        self.shadow_blur = int(value)
+
     def update_text_position(self):
         pass  # Position will be used when adding text
 
@@ -350,210 +776,193 @@ class YouTubeThumbnailCreator:
             return
 
         try:
-            # Try to use system fonts
-            font_style = ""
-            if self.text_bold and self.text_italic:
-                font_style = "bold italic"
-            elif self.text_bold:
-                font_style = "bold"
-            elif self.text_italic:
-                font_style = "italic"
-
-            try:
-                if font_style:
-                    test_font = ImageFont.truetype(f"{self.current_font_family}.ttf", self.current_font_size)
-                else:
-                    test_font = ImageFont.truetype(f"{self.current_font_family}.ttf", self.current_font_size)
-            except:
-                # Fallback to default font with size approximation
-                test_font = ImageFont.load_default()
-
-            # Calculate text position
-            bbox = self.canvas_draw.textbbox((0, 0), text, font=test_font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-
-            x = (self.canvas_width - text_width) // 2
-
-            position = self.text_position_var.get()
-            if position == "top":
-                y = 100
-            elif position == "center":
-                y = (self.canvas_height - text_height) // 2
-            else:  # bottom
-                y = self.canvas_height - text_height - 100
-
-            # Draw shadow
-            if self.shadow_enabled:
-                shadow_x = x + self.shadow_offset
-                shadow_y = y + self.shadow_offset
-
-                # Draw outline for shadow
-                for adj_x in range(-self.current_outline_width, self.current_outline_width + 1):
-                    for adj_y in range(-self.current_outline_width, self.current_outline_width + 1):
-                        self.canvas_draw.text((shadow_x + adj_x, shadow_y + adj_y), text,
-                                             font=test_font, fill='#00000088')
-
-            # Draw outline
-            for adj_x in range(-self.current_outline_width, self.current_outline_width + 1):
-                for adj_y in range(-self.current_outline_width, self.current_outline_width + 1):
-                    if adj_x * adj_x + adj_y * adj_y <= self.current_outline_width * self.current_outline_width:
-                        self.canvas_draw.text((x + adj_x, y + adj_y), text,
-                                             font=test_font, fill=self.current_outline_color)
-
-            # Draw main text
-            self.canvas_draw.text((x, y), text, font=test_font, fill=self.current_text_color)
+            # Same spec the headless renderer takes; position is resolved
+            # against the font registry's face for the current style
+            layer = self.renderer.layer({
+                'type': 'text',
+                'text': text,
+                'position': self.text_position_var.get(),
+                'fit': self.fit_text_var.get(),
+                'family': self.current_font_family,
+                'size': self.current_font_size,
+                'bold': self.text_bold,
+                'italic': self.text_italic,
+                'fill': self.current_text_color,
+                'outline': self.current_outline_color,
+                'outline_width': self.current_outline_width,
+                'shadow': self.shadow_enabled,
+                'shadow_offset': self.shadow_offset,
+                'shadow_blur': self.shadow_blur,
+            }, self.scene)
+            with self.history.record("Add text"):
+                self.scene.add(layer)
 
             self.render_canvas()
 
         except Exception as e:
             messagebox.showerror("Error", f"Error adding text: {str(e)}")
 
-    def add_shape(self, shape_type):
-        draw = ImageDraw.Draw(self.canvas_image)
-
-        if shape_type == "circle":
-            x, y = 100, 100
-            radius = 80
-            draw.ellipse([x, y, x + radius * 2, y + radius * 2],
-                        fill='#FF000080', outline='#FFFFFF', width=5)
-
-        elif shape_type == "rectangle":
-            draw.rectangle([50, 50, 300, 150], fill='#0000FF80', outline='#FFFFFF', width=5)
+    def choose_shape_fill(self):
+        color = colorchooser.askcolor(title="Choose Shape Fill")
+        if color[1]:
+            self.shape_fill = color[1]
 
-        elif shape_type == "arrow":
-            # Simple arrow pointing right
-            points = [(100, 300), (200, 250), (200, 280), (350, 280),
-                     (350, 320), (200, 320), (200, 350)]
-            draw.polygon(points, fill='#FFFF00', outline='#000000', width=3)
+    def choose_shape_outline(self):
+        color = colorchooser.askcolor(title="Choose Shape Outline")
+        if color[1]:
+            self.shape_outline = color[1]
+
+    def reset_shape_colors(self):
+        self.shape_fill = None
+        self.shape_outline = None
+
+    def shape_spec(self, shape_type):
+        from PIL import ImageColor
+        from thumbnail_engine.render import SHAPE_PRESETS
+        preset = SHAPE_PRESETS[shape_type]
+        spec = {'type': 'shape', 'preset': shape_type}
+        if not hasattr(self, 'shape_size_scale'):
+            return spec
+        # Size sets the longer side; the preset's aspect ratio is kept
+        left, top, right, bottom = preset['box']
+        scale = self.shape_size_scale.get() / max(right - left, bottom - top)
+        spec['size'] = [round((right - left) * scale), round((bottom - top) * scale)]
+        if self.shape_anchor_var.get() != "default":
+            spec['anchor'] = self.shape_anchor_var.get()
+        red, green, blue, alpha = ImageColor.getcolor(self.shape_fill or preset['fill'], 'RGBA')
+        alpha = round(alpha * self.shape_opacity_scale.get() / 100)
+        spec['fill'] = f"#{red:02X}{green:02X}{blue:02X}{alpha:02X}"
+        if self.shape_outline:
+            spec['outline'] = self.shape_outline
+        spec['width'] = self.shape_width_scale.get()
+        if shape_type == 'rectangle':
+            spec['radius'] = self.shape_radius_scale.get()
+        return spec
 
+    def add_shape(self, shape_type):
+        if shape_type not in ("circle", "rectangle", "arrow", "starburst"):
+            return
+        layer = self.renderer.layer(self.shape_spec(shape_type), self.scene)
+        with self.history.record(f"Add {shape_type}"):
+            self.scene.add(layer)
         self.render_canvas()
 
     def add_starburst(self):
-        draw = ImageDraw.Draw(self.canvas_image)
-        import math
-
-        cx, cy = 200, 200
-        outer_radius = 100
-        inner_radius = 50
-        points = []
-
-        for i in range(16):
-            angle = (i * math.pi * 2 / 16) - math.pi / 2
-            if i % 2 == 0:
-                x = cx + outer_radius * math.cos(angle)
-                y = cy + outer_radius * math.sin(angle)
-            else:
-                x = cx + inner_radius * math.cos(angle)
-                y = cy + inner_radius * math.sin(angle)
-            points.append((x, y))
-
-        draw.polygon(points, fill='#FFFF00', outline='#FF0000', width=4)
-        self.render_canvas()
+        self.add_shape("starburst")
 
     def add_emoji(self, emoji):
         try:
-            # Create a new layer for emoji
-            emoji_img = Image.new('RGBA', (150, 150), (255, 255, 255, 0))
-            draw = ImageDraw.Draw(emoji_img)
-
-            try:
-                emoji_font = ImageFont.truetype("seguiemj.ttf", 120)
-            except:
-                try:
-                    emoji_font = ImageFont.truetype("Apple Color Emoji.ttc", 120)
-                except:
-                    emoji_font = ImageFont.load_default()
-
-            draw.text((10, 10), emoji, font=emoji_font, fill='black', embedded_color=True)
-
-            # Paste onto main canvas
-            x = (self.canvas_width - 150) // 2
-            y = 50
-
-            self.canvas_image.paste(emoji_img, (x, y), emoji_img)
+            layer = self.renderer.layer({'type': 'emoji', 'emoji': emoji}, self.scene)
+            with self.history.record("Add emoji"):
+                self.scene.add(layer)
             self.render_canvas()
 
         except Exception as e:
             messagebox.showwarning("Info", f"Emoji rendering may not be fully supported: {str(e)}")
 
+    def add_sticker(self, path):
+        try:
+            layer = self.renderer.layer({'type': 'sticker', 'path': path}, self.scene)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not load sticker: {e}")
+            return
+        with self.history.record("Add sticker"):
+            self.scene.add(layer)
+        self.render_canvas()
+
     def save_thumbnail(self):
         file_path = filedialog.asksaveasfilename(
             defaultextension=".png",
-            filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg"), ("All files", "*.*")]
+            filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg"), ("WebP files", "*.webp"), ("All files", "*.*")]
         )
-        if file_path:
-            self.canvas_image.save(file_path, quality=95)
-            messagebox.showinfo("Success", f"Thumbnail saved to:\n{file_path}")
+        if not file_path:
+            return
+        from thumbnail_engine.export import YOUTUBE_MAX_BYTES, export_image
+        # The copy is taken here, so edits made while it exports are not in it
+        scene = self.scene.at_scale(self.export_width_var.get() / self.canvas_width)
+        future = self.exporter.submit(lambda: export_image(scene.flatten(), file_path, YOUTUBE_MAX_BYTES))
+        self.root.after(EXPORT_POLL_MS, self.finish_export, future)
+
+    def finish_export(self, future):
+        from thumbnail_engine.export import YOUTUBE_MAX_BYTES
+        if not future.done():
+            self.root.after(EXPORT_POLL_MS, self.finish_export, future)
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Error saving thumbnail: {str(e)}")
+            return
+        best = result.best
+        if not result.fits:
+            messagebox.showwarning("Warning", f"Could not get under {YOUTUBE_MAX_BYTES // 1024} KB; "
+                                              f"saved the smallest encoding ({best.size // 1024} KB)")
+        messagebox.showinfo("Success", f"Thumbnail saved to:\n{result.path}\n\n"
+                                       f"{best.format} {best.describe()}, {best.size / 1024:.0f} KB")
 
     def clear_canvas(self):
-        self.canvas_image = Image.new('RGB', (self.canvas_width, self.canvas_height), '#FFFFFF')
-        self.canvas_draw = ImageDraw.Draw(self.canvas_image)
+        with self.history.record("Clear canvas"):
+            self.scene.clear('#FFFFFF')
         self.render_canvas()
 
     def undo_last(self):
-        messagebox.showinfo("Info", "Undo feature - save states before each operation for full undo support")
-
-    def apply_gaming_template(self):
-        # Gaming style: Dark background with bright text
-        self.canvas_image = Image.new('RGB', (self.canvas_width, self.canvas_height), '#1a0033')
-        self.canvas_draw = ImageDraw.Draw(self.canvas_image)
-
-        # Add gradient effect
-        for y in range(self.canvas_height):
-            ratio = y / self.canvas_height
-            r = int(26 * (1 - ratio) + 255 * ratio * 0.3)
-            g = int(0 * (1 - ratio) + 0 * ratio)
-            b = int(51 * (1 - ratio) + 255 * ratio * 0.3)
-            self.canvas_draw.line([(0, y), (self.canvas_width, y)], fill=(r, g, b))
-
+        if self.history.undo() is None:
+            messagebox.showinfo("Info", "Nothing to undo")
+            return
         self.render_canvas()
-        self.text_entry.delete(0, tk.END)
-        self.text_entry.insert(0, "EPIC GAMING MOMENT!")
-        self.current_text_color = "#00FF00"
-        self.current_outline_color = "#000000"
-
-    def apply_tutorial_template(self):
-        # Tutorial style: Clean, professional
-        self.canvas_image = Image.new('RGB', (self.canvas_width, self.canvas_height), '#FFFFFF')
-        self.canvas_draw = ImageDraw.Draw(self.canvas_image)
-
-        # Add blue accent bar
-        self.canvas_draw.rectangle([0, 0, self.canvas_width, 150], fill='#0066CC')
 
+    def redo_last(self):
+        if self.history.redo() is None:
+            messagebox.showinfo("Info", "Nothing to redo")
+            return
         self.render_canvas()
-        self.text_entry.delete(0, tk.END)
-        self.text_entry.insert(0, "HOW TO: Step by Step")
-        self.current_text_color = "#FFFFFF"
-        self.current_outline_color = "#003366"
-
-    def apply_vlog_template(self):
-        # Vlog style: Bright and colorful
-        colors = ['#FF6B6B', '#4ECDC4', '#FFE66D', '#95E1D3']
-        self.canvas_image = Image.new('RGB', (self.canvas_width, self.canvas_height), '#FFE66D')
-        self.canvas_draw = ImageDraw.Draw(self.canvas_image)
 
-        self.render_canvas()
-        self.text_entry.delete(0, tk.END)
-        self.text_entry.insert(0, "MY DAY VLOG!")
-        self.current_text_color = "#FFFFFF"
-        self.current_outline_color = "#FF1744"
+    def update_history_label(self):
+        stats = self.history.history.stats()
+        self.history_label.config(text=f"History: {stats['undo_steps']} steps, "
+                                       f"{stats['memory_used'] / (1024 * 1024):.1f} MB")
 
-    def apply_reaction_template(self):
-        # Reaction style: Dramatic
-        self.canvas_image = Image.new('RGB', (self.canvas_width, self.canvas_height), '#FF0000')
-        self.canvas_draw = ImageDraw.Draw(self.canvas_image)
+    def apply_template(self, name, label):
+        # Templates are specs for the headless renderer and draw their own
+        # title; their text settings become the defaults for the next "Add Text"
+        with self.history.record(f"{label} template"):
+            self.scene.clear()
+            self.renderer.populate(self.scene, {'template': name})
 
         self.render_canvas()
-        self.text_entry.delete(0, tk.END)
-        self.text_entry.insert(0, "YOU WON'T BELIEVE THIS!")
-        self.current_text_color = "#FFFF00"
-        self.current_outline_color = "#000000"
+        from thumbnail_engine.render import resolve
+        # A template may leave out its text block or any key of it; whatever
+        # it does not set keeps its current value
+        text = resolve({'template': name}, self.renderer.library).get('text', {})
+        if 'text' in text:
+            self.text_entry.delete(0, tk.END)
+            self.text_entry.insert(0, text['text'])
+        self.current_text_color = text.get('fill', self.current_text_color)
+        self.current_outline_color = text.get('outline', self.current_outline_color)
+        self.text_position_var.set(text.get('position', self.text_position_var.get()))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="YouTube Thumbnail Creator")
+    parser.add_argument('--measure-startup', action='store_true',
+                        help="print startup timings (ms since launch) as JSON once warm and exit")
+    parser.add_argument('--no-warm-start', action='store_true',
+                        help="don't preload fonts and templates in the background")
+    args = parser.parse_args(argv)
 
-def main():
     root = tk.Tk()
-    app = YouTubeThumbnailCreator(root)
+    app = YouTubeThumbnailCreator(root, warm_start=not args.no_warm_start)
+    if args.measure_startup:
+        expected = ('first_frame',) if args.no_warm_start else ('first_frame', 'warm')
+
+        def report():
+            if not all(stage in app.startup for stage in expected):
+                root.after(10, report)
+                return
+            print(json.dumps(app.startup))
+            root.destroy()
+        root.after(0, report)
     root.mainloop()
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())